@@ -0,0 +1,322 @@
+# End-to-end agent benchmark: replays the gold and business queries through
+# build_graph() against the stand-ins at several concurrency levels
+#   python -m bench.agent_bench --profile azure --concurrency 1 8 32 --out data/bench/agent-$(git rev-parse --short HEAD).json
+#   python -m bench.agent_bench --out data/bench/new.json --compare data/bench/base.json   # exit 1 on a regression
+#
+# Queries: eval/gold_queries.json plus every bullet of eval/queries/business_queries.md
+# ("this month, or November 2025" gives both forms), each also asked by month /
+# grade / region / gender as the brief requires.
+#
+# Search and the LLM are the stand-ins; SQL is the stand-in warehouse, so the KPI
+# SQL really runs. Each client draws its delay from a LatencyProfile (lognormal
+# median/p95 plus an injected failure rate); PROFILES holds the named sets and
+# --time_scale shrinks them for quick runs. Turns go through graph.ainvoke with a
+# MemoryExporter tracer: node and client-call percentiles come from the spans,
+# end to end is measured around ainvoke. Each level runs --trials times and keeps
+# the median of every percentile, which damps scheduler noise. Results are JSON (git commit, params,
+# one entry per concurrency level) so two runs can be compared with --compare.
+#
+# --live swaps the stand-ins for the configured clients. With a cassette (see
+# rag_agent.cassette) that replays recorded Azure calls offline, optionally at
+# their recorded latency:
+#   EVAL_TODAY=2025-11-15 AGENT_CASSETTE=data/cassettes/agent.sqlite AGENT_CASSETTE_MODE=record python -m bench.agent_bench --live --concurrency 4 --trials 1
+#   EVAL_TODAY=2025-11-15 AGENT_CASSETTE=data/cassettes/agent.sqlite AGENT_CASSETTE_LATENCY=true python -m bench.agent_bench --live
+
+from __future__ import annotations
+import argparse, asyncio, json, pathlib, platform, re, subprocess, sys, time
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from rag_agent.graph import build_graph
+from rag_agent.standins import LatencyProfile, StandInSearch, StandInSynthesizer, StandInWarehouse
+from rag_agent.tracing import MemoryExporter, Tracer
+
+GOLD_PATH = "eval/gold_queries.json"
+BUSINESS_PATH = "eval/queries/business_queries.md"
+RESULT_VERSION = 1
+
+# (median_s, p95_s, error_rate) per client
+PROFILES: Dict[str, Dict[str, Tuple[float, float, float]]] = {
+    "zero":  {"search": (0.0, 0.0, 0.0),   "sql": (0.0, 0.0, 0.0),   "llm": (0.0, 0.0, 0.0)},    # agent overhead only
+    "azure": {"search": (0.12, 0.35, 0.0), "sql": (0.08, 0.30, 0.0), "llm": (1.2, 3.0, 0.0)},
+    "flaky": {"search": (0.12, 0.35, 0.02), "sql": (0.08, 0.30, 0.02), "llm": (1.2, 3.0, 0.01)},
+}
+PERCENTILES = (50, 95, 99)
+
+# ---- queries ----
+def _expand_alternative(bullet: str) -> List[str]:
+    # "How many upgrades last month, or Oct 2025" -> the month phrase swapped for the alternative
+    base, _, alt = bullet.partition(", or ")
+    if not alt:
+        return [base]
+    swapped, n = re.subn(r"\b(?:this|last) (?:month|year)$", alt.strip(), base)
+    return [base, swapped if n else f"{base} {alt.strip()}"]
+
+def load_queries(gold_path: str = GOLD_PATH, business_path: str = BUSINESS_PATH,
+                 breakdowns: bool = True) -> List[Tuple[str, str]]:
+    """(qid, query) pairs: the gold queries, then the business bullets and their breakdown variants."""
+    out = [(g["id"], g["query"]) for g in json.loads(pathlib.Path(gold_path).read_text(encoding="utf-8"))]
+    base: List[str] = []
+    dims: List[str] = []
+    for line in pathlib.Path(business_path).read_text(encoding="utf-8").splitlines():
+        if line.startswith("|"):
+            break                                       # the status table follows the bullets
+        m = re.match(r"(\s*)- (.+)", line)
+        if not m:
+            continue
+        text = " ".join(m.group(2).split())             # also folds the file's non-breaking spaces
+        if m.group(1):                                  # "   - By month / by grade / ..."
+            dims = [d.strip().lower() for d in text.split("/")]
+        elif "kpi" not in text.lower():                 # "for all Above kpi's ..." introduces the rules
+            text = re.sub(r"\s*\(\s*([^)]*)\)", r" \1", text)      # "admission( joins)" -> "admission joins"
+            base.extend(_expand_alternative(text))
+    for i, q in enumerate(base, start=1):
+        out.append((f"B{i}", q))
+        if breakdowns:
+            out.extend((f"B{i}-{d.split()[-1]}", f"{q} {d}") for d in dims)
+    return out
+
+# ---- stats ----
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linear interpolation between closest ranks (numpy's default)."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    v = sorted(values)
+    out = {f"p{q}": round(percentile(v, q), 3) for q in PERCENTILES}
+    out.update(mean=round(sum(v) / len(v), 3) if v else 0.0, n=len(v))
+    return out
+
+# ---- run ----
+def profiles(name: str, time_scale: float, error_rate: Optional[float], seed: int) -> Dict[str, LatencyProfile]:
+    out = {}
+    for i, (client, (median, p95, err)) in enumerate(PROFILES[name].items()):
+        out[client] = LatencyProfile(median * time_scale, p95 * time_scale,
+                                     err if error_rate is None else error_rate, seed=seed + i, name=client)
+    return out
+
+async def run_level(graph: Any, exporter: MemoryExporter, queries: List[Tuple[str, str]],
+                    concurrency: int, passes: int) -> Dict[str, Any]:
+    exporter.clear()
+    sem = asyncio.Semaphore(concurrency)
+    e2e: List[float] = []
+    ttft: List[float] = []
+    errors: Counter = Counter()
+
+    async def one(query: str) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                out = await graph.ainvoke({"user_query": query})
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                return
+            e2e.append((time.perf_counter() - t0) * 1000.0)
+            ttft.append(out.get("ttft_ms", 0.0))
+
+    work = [q for _ in range(passes) for _, q in queries]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in work))
+    wall = time.perf_counter() - t0
+
+    latency = {"e2e": summarize(e2e), "ttft": summarize(ttft)}
+    span_errors: Counter = Counter()
+    for name, spans in sorted(exporter.by_name().items()):
+        if name == "turn":
+            continue                                    # same as e2e, minus the ainvoke overhead
+        latency[name] = summarize([s.duration_ms for s in spans if s.error is None])
+        span_errors.update({name: sum(s.error is not None for s in spans)})
+    n_err = sum(errors.values())
+    return {"concurrency": concurrency, "requests": len(work), "ok": len(e2e), "errors": n_err,
+            "error_rate": round(n_err / len(work), 4) if work else 0.0,
+            "wall_s": round(wall, 3), "throughput_rps": round(len(e2e) / wall, 2) if wall else 0.0,
+            "errors_by_type": dict(errors), "span_errors": {k: v for k, v in span_errors.items() if v},
+            "latency_ms": latency}
+
+def median_of(trials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One level from repeated trials: counts summed, each percentile and throughput the median across trials."""
+    if len(trials) == 1:
+        return trials[0]
+    def med(xs: List[float]) -> float:
+        return sorted(xs)[len(xs) // 2]
+    out = dict(trials[0])
+    for k in ("requests", "ok", "errors", "wall_s"):
+        out[k] = round(sum(t[k] for t in trials), 3)
+    out["error_rate"] = round(out["errors"] / out["requests"], 4) if out["requests"] else 0.0
+    out["throughput_rps"] = med([t["throughput_rps"] for t in trials])
+    out["errors_by_type"] = dict(sum((Counter(t["errors_by_type"]) for t in trials), Counter()))
+    out["span_errors"] = dict(sum((Counter(t["span_errors"]) for t in trials), Counter()))
+    out["latency_ms"] = {}
+    for name in trials[0]["latency_ms"]:
+        stats = [t["latency_ms"][name] for t in trials if name in t["latency_ms"]]
+        out["latency_ms"][name] = {k: med([s[k] for s in stats]) for k in stats[0] if k != "n"}
+        out["latency_ms"][name]["n"] = sum(s["n"] for s in stats)
+    out["trials"] = len(trials)
+    return out
+
+def git_info() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD") or None,
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def agent_settings() -> Dict[str, Any]:
+    # the switches that change what a turn does; results are only comparable when they match
+    from rag_agent.config import get_settings
+    a = get_settings().agent
+    return {k: getattr(a, k) for k in ("kpi_cube", "sql_cache", "search_cache", "answer_mode", "sql_max_rows",
+                                       "cassette", "cassette_mode", "cassette_latency", "cassette_latency_scale")}
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    queries = load_queries(breakdowns=not args.no_breakdowns)
+    exporter = MemoryExporter()
+    if args.live:
+        # the process-wide clients: Azure, or a cassette when AGENT_CASSETTE is set
+        lat: Dict[str, LatencyProfile] = {}
+        graph = build_graph(tracer=Tracer(exporter))
+    else:
+        lat = profiles(args.profile, args.time_scale, args.error_rate, args.seed)
+        wh = StandInWarehouse(latency_s=lat["sql"], report_path=args.warehouse or ":memory:")
+        if not args.warehouse:
+            today = date.today()
+            wh.populate(n_rows=args.rows, seed=args.seed, start=date(today.year - 1, 1, 1), end=today)
+        graph = build_graph(search=StandInSearch(latency_s=lat["search"]), sql=wh,
+                            synth=StandInSynthesizer(latency_s=lat["llm"]), tracer=Tracer(exporter))
+
+    if args.warmup:
+        await run_level(graph, exporter, queries, max(args.concurrency), 1)
+    levels = []
+    clients = "live clients" if args.live else f"profile {args.profile} (time scale {args.time_scale})"
+    print(f"{len(queries)} queries x {args.passes} passes x {args.trials} trials, {clients}")
+    print(f"{'conc':>5}  {'req':>5}  {'err%':>5}  {'req/s':>7}  {'e2e p50':>8}  {'p95':>8}  {'p99':>8}  "
+          f"{'ttft p50':>8}")
+    for c in args.concurrency:
+        r = median_of([await run_level(graph, exporter, queries, c, args.passes) for _ in range(args.trials)])
+        e = r["latency_ms"]["e2e"]
+        print(f"{c:>5}  {r['requests']:>5}  {r['error_rate'] * 100:>5.1f}  {r['throughput_rps']:>7.1f}  "
+              f"{e['p50']:>8.1f}  {e['p95']:>8.1f}  {e['p99']:>8.1f}  {r['latency_ms']['ttft']['p50']:>8.1f}")
+        levels.append(r)
+
+    return {
+        "bench": "agent", "version": RESULT_VERSION,
+        "timestamp_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "git": git_info(), "python": platform.python_version(), "platform": platform.platform(),
+        "params": {"profile": "live" if args.live else args.profile, "time_scale": args.time_scale, "seed": args.seed,
+                   "passes": args.passes, "trials": args.trials, "rows": None if args.warehouse else args.rows,
+                   "warehouse": args.warehouse, "queries": len(queries), "breakdowns": not args.no_breakdowns,
+                   "latency": {k: v.to_dict() for k, v in lat.items()}, "agent": agent_settings()},
+        "levels": levels,
+    }
+
+def print_nodes(result: Dict[str, Any]) -> None:
+    for r in result["levels"]:
+        print(f"\nconcurrency {r['concurrency']}  (ms)")
+        print(f"  {'span':<22}  {'n':>6}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'errors':>6}")
+        for name, s in r["latency_ms"].items():
+            print(f"  {name:<22}  {s['n']:>6}  {s['p50']:>8.1f}  {s['p95']:>8.1f}  {s['p99']:>8.1f}  "
+                  f"{r['span_errors'].get(name, 0):>6}")
+        if r["errors_by_type"]:
+            print("  failed turns: " + ", ".join(f"{k} {v}" for k, v in r["errors_by_type"].items()))
+
+# ---- compare ----
+# Only end-to-end latency gates, and only at percentiles with enough samples
+# behind them: a p95 from ~80 turns rests on four values and moves 20% between
+# identical runs. Per-span and p99 changes are printed as notes.
+GATED = ("e2e",)
+MIN_SAMPLES = {50: 30, 95: 200}        # percentile -> turns needed (summed over trials) before it gates
+MIN_DELTA_FRAC = 0.05                  # slowdowns below this share of the baseline e2e p50 are noise
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], tolerance: float, min_delta_ms: float,
+            notes: Optional[List[str]] = None) -> List[str]:
+    """
+    Regressions of new against base: slower e2e p50/p95, lower throughput, more
+    errors. A slowdown must exceed `tolerance` and max(min_delta_ms, 5% of the
+    baseline e2e p50). Other spans and percentiles go to `notes`.
+    """
+    for k in ("profile", "time_scale", "passes", "trials", "queries", "agent"):
+        if base["params"].get(k) != new["params"].get(k):
+            print(f"warning: params.{k} differs ({base['params'].get(k)} vs {new['params'].get(k)}); "
+                  f"results may not be comparable")
+    problems: List[str] = []
+    notes = notes if notes is not None else []
+    base_levels = {r["concurrency"]: r for r in base["levels"]}
+    for r in new["levels"]:
+        b = base_levels.get(r["concurrency"])
+        if b is None:
+            continue
+        c = r["concurrency"]
+        floor = max(min_delta_ms, MIN_DELTA_FRAC * b["latency_ms"].get("e2e", {}).get("p50", 0.0))
+        for name, s in r["latency_ms"].items():
+            bs = b["latency_ms"].get(name)
+            if not bs or not s["n"]:
+                continue
+            for q in PERCENTILES:
+                old, cur = bs[f"p{q}"], s[f"p{q}"]
+                if not (cur > old * (1 + tolerance) and cur - old > floor):
+                    continue
+                msg = (f"c={c} {name} p{q}: {old:.1f} -> {cur:.1f} ms (+{(cur / old - 1) * 100:.0f}%)"
+                       if old else f"c={c} {name} p{q}: {old:.1f} -> {cur:.1f} ms")
+                gated = name in GATED and q in MIN_SAMPLES and min(s["n"], bs["n"]) >= MIN_SAMPLES[q]
+                (problems if gated else notes).append(msg)
+        if r["throughput_rps"] < b["throughput_rps"] * (1 - tolerance):
+            problems.append(f"c={c} throughput: {b['throughput_rps']:.1f} -> {r['throughput_rps']:.1f} req/s")
+        if r["error_rate"] > b["error_rate"] + 0.01:
+            problems.append(f"c={c} error rate: {b['error_rate']:.2%} -> {r['error_rate']:.2%}")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profile", choices=sorted(PROFILES), default="azure")
+    ap.add_argument("--live", action="store_true",
+                    help="use the configured clients instead of stand-ins (set AGENT_CASSETTE to record or replay)")
+    ap.add_argument("--time_scale", type=float, default=0.1, help="multiplies every profile latency")
+    ap.add_argument("--error_rate", type=float, default=None, help="overrides the profile's per-call failure rates")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--passes", type=int, default=1, help="times the query set is replayed per level")
+    ap.add_argument("--trials", type=int, default=3, help="runs per level; percentiles are the median across runs")
+    ap.add_argument("--no_breakdowns", action="store_true", help="skip the by month/grade/region/gender variants")
+    ap.add_argument("--rows", type=int, default=50000, help="stand-in warehouse fact rows")
+    ap.add_argument("--warehouse", default=None, help="SQLite file from seed_db.py --sqlite instead of random rows")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--no_warmup", dest="warmup", action="store_false")
+    ap.add_argument("--nodes", action="store_true", help="print per-node and per-call percentiles")
+    ap.add_argument("--out", default=None, help="write the results JSON here")
+    ap.add_argument("--compare", default=None, help="a previous results JSON; exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    ap.add_argument("--min_delta_ms", type=float, default=5.0,
+                    help="ignore slowdowns smaller than this (or 5%% of the baseline e2e p50, if larger)")
+    args = ap.parse_args()
+
+    result = asyncio.run(main_async(args))
+    if args.nodes:
+        print_nodes(result)
+    if args.out:
+        path = pathlib.Path(args.out)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"\nwrote {path}")
+    if args.compare:
+        base = json.loads(pathlib.Path(args.compare).read_text(encoding="utf-8"))
+        notes: List[str] = []
+        problems = compare(base, result, args.tolerance, args.min_delta_ms, notes)
+        print(f"\nvs {args.compare} ({(base.get('git') or {}).get('commit') or '?'}): "
+              f"{len(problems)} regression(s)")
+        for p in problems:
+            print("  " + p)
+        if notes:
+            print(f"not gated (per-span, p99 or too few samples): {len(notes)}")
+            for p in notes:
+                print("  " + p)
+        if problems:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
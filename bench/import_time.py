@@ -0,0 +1,78 @@
+# Import-time / startup regression guard
+#   python -m bench.import_time --runs 5 --budget_ms 250
+# Exits 1 if importing rag_agent.graph exceeds the budget, pulls in a heavy
+# dependency, or needs Azure credentials.
+
+from __future__ import annotations
+import argparse, json, os, statistics, subprocess, sys
+
+# must not be loaded by `import rag_agent.graph`
+HEAVY = ("pyodbc", "openai", "langgraph", "langchain_core", "numpy", "pandas", "httpx", "requests",
+         "pydantic_settings")
+
+_IMPORT_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+ms = (time.perf_counter() - t) * 1000.0
+print(json.dumps({{"ms": ms, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_STARTUP_PROBE = """
+import json, time
+t = time.perf_counter()
+from rag_agent.graph import build_graph
+from rag_agent.standins import StandInSearch, StandInSQL, StandInSynthesizer
+g = build_graph(search=StandInSearch(0), sql=StandInSQL(0), synth=StandInSynthesizer(0))
+compiled = (time.perf_counter() - t) * 1000.0
+t = time.perf_counter()
+g.invoke({"user_query": "How many active membership last month"})
+first = (time.perf_counter() - t) * 1000.0
+print(json.dumps({"build_ms": compiled, "first_turn_ms": first}))
+"""
+
+def _clean_env() -> dict:
+    # no Azure credentials: importing must not need them
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("AZURE_", "AGENT_"))}
+    env["PYTHONWARNINGS"] = "ignore"
+    return env
+
+def _probe(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=_clean_env())
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "probe failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="rag_agent.graph")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget_ms", type=float, default=250.0)
+    args = ap.parse_args()
+
+    failures = []
+    samples, loaded = [], set()
+    for _ in range(args.runs):
+        try:
+            r = _probe(_IMPORT_PROBE.format(module=args.module, heavy=HEAVY))
+        except RuntimeError as e:
+            print(f"import {args.module} failed: {e}")
+            sys.exit(1)
+        samples.append(r["ms"])
+        loaded.update(r["loaded"])
+    med = statistics.median(samples)
+    print(f"import {args.module}: median {med:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    if med > args.budget_ms:
+        failures.append(f"import time {med:.0f} ms > budget {args.budget_ms:.0f} ms")
+    if loaded:
+        failures.append(f"heavy modules loaded at import: {sorted(loaded)}")
+
+    s = _probe(_STARTUP_PROBE)
+    print(f"startup with stand-ins: build_graph {s['build_ms']:.0f} ms, first turn {s['first_turn_ms']:.0f} ms")
+
+    for f in failures:
+        print("FAIL: " + f)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# KPI cube parity + latency check against the SQLite stand-in warehouse
+#   python -m bench.kpi_cube --rows 50000
+#
+# Also checks multi-slice plans: the one-statement SQL, split per slice, and the
+# cube's answer_multi must both equal the single-slice SQL results.
+
+from __future__ import annotations
+import argparse, itertools, sys, time
+from typing import List
+from rag_agent.kpi_cube import KpiCube, METRICS, BREAKDOWNS, verify_parity
+from rag_agent.sql_templates import (MultiQueryPlan, QueryPlan, TimeWindow, build_kpi_multi_sql, build_kpi_sql,
+                                     month_bounds, sort_rows, table_name)
+from rag_agent.standins import StandInWarehouse
+
+def all_plans(years=(2023, 2024, 2025, 2026)) -> List[QueryPlan]:
+    windows = [month_bounds(y, m) for y in years for m in range(1, 13)]
+    windows += [TimeWindow(int(f"{y}0101"), int(f"{y}1231") + 1) for y in years]
+    return [
+        build_kpi_sql(metric=m, granularity="month", window=w, breakdown=b)
+        for m in METRICS for b in BREAKDOWNS for w in windows
+    ]
+
+def multi_plans(years=(2024, 2025)) -> List[MultiQueryPlan]:
+    windows = [month_bounds(y, m) for y in years for m in (1, 6, 12)]
+    windows += [TimeWindow(int(f"{y}0101"), int(f"{y}1231") + 1) for y in years]
+    dims = BREAKDOWNS[1:]
+    return [
+        build_kpi_multi_sql(ms, "month", w, bs, dialect="sqlite")
+        for w in windows
+        for ms in [c for k in (1, 2, len(METRICS)) for c in itertools.combinations(METRICS, k)]
+        for bs in [c for k in (0, 1, 2, len(dims)) for c in itertools.combinations(dims, k)]
+        if len(ms) > 1 or len(bs) > 1
+    ]
+
+def verify_multi(cube: KpiCube, wh: StandInWarehouse, plans: List[MultiQueryPlan]) -> List[str]:
+    problems: List[str] = []
+    for p in plans:
+        expected = {table_name(s.metric, s.breakdown): sort_rows(wh.query_dicts(s.sql, s.params), s.breakdown)
+                    for s in p.slices()}
+        if p.split(wh.query_dicts(p.sql, p.params)) != expected:
+            problems.append(f"{p.metrics}/{p.breakdowns}/{p.window}: split SQL differs")
+        if cube.answer_multi(p) != expected:
+            problems.append(f"{p.metrics}/{p.breakdowns}/{p.window}: cube differs")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    wh = StandInWarehouse().populate(n_rows=args.rows, seed=args.seed)
+    cube = KpiCube(wh)
+    cube.load()
+    plans = all_plans()
+
+    problems = verify_parity(cube, wh, plans)
+    print(f"plans checked: {len(plans)}  mismatches: {len(problems)}  cube load: {cube.snapshot()['load_ms']:.1f} ms")
+    for p in problems[:10]:
+        print("  " + p)
+
+    t0 = time.perf_counter()
+    for p in plans:
+        wh.query_dicts(p.sql, p.params)
+    t_sql = (time.perf_counter() - t0) / len(plans) * 1e6
+    t0 = time.perf_counter()
+    for p in plans:
+        cube.answer(p)
+    t_cube = (time.perf_counter() - t0) / len(plans) * 1e6
+    print(f"avg per plan: sqlite {t_sql:.0f} us  cube {t_cube:.0f} us")
+
+    mplans = multi_plans()
+    mproblems = verify_multi(cube, wh, mplans)
+    print(f"multi-slice plans checked: {len(mplans)}  mismatches: {len(mproblems)}")
+    for p in mproblems[:10]:
+        print("  " + p)
+    widest = build_kpi_multi_sql(METRICS, "month", TimeWindow(20250101, 20251232), BREAKDOWNS[1:], dialect="sqlite")
+    t0 = time.perf_counter()
+    wh.query_dicts(widest.sql, widest.params)
+    t_one = (time.perf_counter() - t0) * 1e3
+    t0 = time.perf_counter()
+    for p in widest.slices():
+        wh.query_dicts(p.sql, p.params)
+    t_many = (time.perf_counter() - t0) * 1e3
+    print(f"{len(widest.slices())} slices of 2025: one statement {t_one:.0f} ms  "
+          f"vs {len(widest.slices())} statements {t_many:.0f} ms")
+    sys.exit(1 if problems or mproblems else 0)
+
+if __name__ == "__main__":
+    main()
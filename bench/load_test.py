@@ -0,0 +1,80 @@
+# Load test: concurrent chats through the FastAPI app against local stand-ins
+#   python -m bench.load_test --concurrency 1 4 16 64 --requests 128
+#
+# The stand-ins only sleep, so throughput should grow with concurrency until the
+# level is wider than the request batch. Each level's speedup over the first is
+# compared with the ideal min(c, requests) / min(c1, requests); a level below
+# --min_efficiency of that is flagged and the exit code is 1.
+
+from __future__ import annotations
+import argparse, asyncio, sys, time
+from typing import List
+import httpx
+from rag_agent.api import create_app
+from rag_agent.graph import build_graph
+from rag_agent.standins import StandInSearch, StandInSQL, StandInSynthesizer
+
+QUERIES = [
+    "How many active membership last month by region",
+    "How many upgrades in September 2025",
+    "What does special pricing reason mean",
+]
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, n_requests: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            r = await client.post("/chat", json={"query": QUERIES[i % len(QUERIES)]})
+            r.raise_for_status()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return time.perf_counter() - t0
+
+async def main_async(levels: List[int], n_requests: int, search_s: float, sql_s: float, llm_s: float,
+                     min_efficiency: float) -> List[str]:
+    graph = build_graph(
+        search=StandInSearch(latency_s=search_s),
+        sql=StandInSQL(latency_s=sql_s),
+        synth=StandInSynthesizer(latency_s=llm_s),
+    )
+    app = create_app(graph)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://agent") as client:
+            print(f"{'concurrency':>11}  {'requests':>8}  {'wall_s':>7}  {'req/s':>8}  {'speedup':>7}  {'ideal':>5}")
+            problems: List[str] = []
+            base = None
+            for c in levels:
+                wall = await run_level(client, c, n_requests)
+                rps = n_requests / wall
+                base = base or (c, rps)
+                speedup = rps / base[1]
+                ideal = min(c, n_requests) / min(base[0], n_requests)
+                flag = speedup < min_efficiency * ideal
+                print(f"{c:>11}  {n_requests:>8}  {wall:>7.2f}  {rps:>8.1f}  {speedup:>7.1f}  {ideal:>5.0f}"
+                      + ("  NOT SCALING" if flag else ""))
+                if flag:
+                    problems.append(f"c={c}: {speedup:.1f}x over c={base[0]}, expected at least "
+                                    f"{min_efficiency * ideal:.1f}x")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--requests", type=int, default=128)
+    ap.add_argument("--search_latency", type=float, default=0.05)
+    ap.add_argument("--sql_latency", type=float, default=0.05)
+    ap.add_argument("--llm_latency", type=float, default=0.2)
+    ap.add_argument("--min_efficiency", type=float, default=0.5,
+                    help="flag a level whose speedup is below this share of the ideal")
+    args = ap.parse_args()
+    problems = asyncio.run(main_async(args.concurrency, args.requests, args.search_latency, args.sql_latency,
+                                      args.llm_latency, args.min_efficiency))
+    for p in problems:
+        print("throughput does not scale: " + p)
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
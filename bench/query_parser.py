@@ -0,0 +1,144 @@
+# Query understanding micro-benchmark: one-pass ParsedQuery vs the per-feature functions
+#   python -m bench.query_parser --n 20000
+#
+# The legacy implementations below are the pre-parser router/time/normalize code,
+# kept here as the parity reference. One deliberate change from the original:
+# plural "admissions"/"joiners" now select the admissions metric (the original
+# only matched admission/join/joins and answered "active"), so legacy_metric
+# below includes them.
+
+from __future__ import annotations
+import argparse, random, re, sys, time
+from datetime import date, timedelta
+from typing import Any, Callable, List, Tuple
+from rag_agent.query_parser import parse_query, _parse
+from rag_agent.sql_templates import TimeWindow, month_bounds
+
+TODAY = date(2025, 11, 5)
+
+# ---- legacy reference (four regex passes + normalisation) ----
+def legacy_metric(text: str) -> str:
+    t = text.lower()
+    if re.search(r"\bupgrade(s)?\b", t):
+        return "upgrades"
+    if re.search(r"\b(admission|admissions|join|joins|joiners)\b", t):   # plurals: see header
+        return "admissions"
+    if re.search(r"\b(left|leavers|attrition|resign(ed|ations)?)\b", t):
+        return "left"
+    return "active"
+
+def legacy_breakdown(text: str):
+    t = text.lower()
+    for b in ("month", "grade", "region", "gender"):
+        if f"by {b}" in t:
+            return b
+    return None
+
+def legacy_is_metric(text: str) -> bool:
+    t = text.lower()
+    return bool(re.search(r"\bhow many|count|number of|list|show\b", t)) or \
+           bool(re.search(r"\b(admission|join|upgrade|left|leaver|active)\b", t))
+
+def legacy_time(text: str, today: date) -> Tuple[str, TimeWindow]:
+    t = text.lower()
+    m = re.search(r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|january|february|march|april|june|july|august|september|october|november|december)\s+(\d{4})", t)
+    if m:
+        month_map = {"jan":1,"feb":2,"mar":3,"apr":4,"may":5,"jun":6,"jul":7,"aug":8,"sep":9,"oct":10,"nov":11,"dec":12}
+        return ("month", month_bounds(int(m.group(2)), month_map[m.group(1)[:3]]))
+    if "last month" in t:
+        lm = today.replace(day=1) - timedelta(days=1)
+        return ("month", month_bounds(lm.year, lm.month))
+    if "this month" in t or "current month" in t:
+        return ("month", month_bounds(today.year, today.month))
+    if "this year" in t or "current year" in t or re.search(r"\byear to date\b|\bytd\b", t):
+        return ("year", TimeWindow(int(f"{today.year:04d}0101"), int(f"{today.year:04d}1231") + 1))
+    lm = today.replace(day=1) - timedelta(days=1)
+    return ("month", month_bounds(lm.year, lm.month))
+
+def legacy_filter(metric: str) -> str:
+    return {"active": "membership_status_original eq 'Active'", "admissions": "membership_type_original eq 'Join'",
+            "upgrades": "membership_type_original eq 'Upgrade'",
+            "left": "(membership_status_original eq 'Resigned' or membership_status_original eq 'Deceased')"}[metric]
+
+def legacy_understand(text: str, today: date = TODAY) -> Tuple[Any, ...]:
+    """Router classification + eval normalisation, as run per turn/eval query before the parser."""
+    intent = "metrics" if legacy_is_metric(text) else "explain"
+    gran, tw = legacy_time(text, today)
+    metric = legacy_metric(text)
+    y, m = tw.start_fk // 10000, (tw.start_fk // 100) % 100
+    anchor = f"{y:04d}-{m:02d}" if gran == "month" else f"{y:04d}"
+    norm = (f"{text.strip()} {anchor}", f"{legacy_metric(text)} memberships in {anchor}", legacy_filter(metric))
+    return intent, metric, legacy_breakdown(text), gran, tw, anchor, norm
+
+def expected_understand(text: str, today: date = TODAY) -> Tuple[Any, ...]:
+    """The legacy result, except that naming two or more metrics now routes to metrics."""
+    e = legacy_understand(text, today)
+    if len(parse_query(text, today).metrics) > 1:
+        e = ("metrics",) + e[1:]
+    return e
+
+def parser_understand(text: str, today: date = TODAY) -> Tuple[Any, ...]:
+    p = parse_query(text, today)
+    return p.intent, p.metric, p.breakdown, p.granularity, p.window, p.anchor, p.retrieval()
+
+# ---- corpus ----
+FRAGMENTS = [
+    "how many", "count", "number of", "list", "show", "active", "leaver", "leavers", "left", "attrition",
+    "resigned", "resignations", "admission", "admissions", "join", "joins", "joined", "upgrade", "upgrades",
+    "members", "membership", "this month", "last month", "current month", "this year", "current year",
+    "year to date", "ytd", "by month", "by grade", "by region", "by gender", "by country", "in", "for",
+    "november 2025", "nov 2025", "sept 2024", "sep 2025", "may 2025", "dismay 2025", "march 2026",
+    "oct 2025", "account", "specialist", "shows", "explain", "what is", "why did", "policy", "fellow",
+    "and", "joiners", "and grade", ", region", "and by gender",
+]
+
+def corpus(n: int, seed: int = 0) -> List[str]:
+    from pathlib import Path
+    import json
+    r = random.Random(seed)
+    base = [q["query"] for q in json.load(open(Path("eval/gold_queries.json"), encoding="utf-8"))]
+    out = list(base)
+    while len(out) < n:
+        words = [r.choice(FRAGMENTS) for _ in range(r.randint(1, 7))]
+        q = " ".join(words)
+        out.append(q.capitalize() if r.random() < 0.5 else q.upper() if r.random() < 0.1 else q)
+    return out
+
+def _time_per_call(fn: Callable[[str], Any], queries: List[str]) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - t0) / len(queries) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000, help="corpus size")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    queries = corpus(args.n, args.seed)
+    mismatches = []
+    for q in queries:
+        _parse.cache_clear()
+        if parser_understand(q) != expected_understand(q):
+            mismatches.append(q)
+    print(f"queries checked: {len(queries)}  mismatches: {len(mismatches)}")
+    for q in mismatches[:10]:
+        print(f"  {q!r}: parser={parser_understand(q)} expected={expected_understand(q)}")
+
+    uncached = lambda q: _parse.__wrapped__(q, TODAY)
+    t_legacy = _time_per_call(legacy_understand, queries)
+    t_parse = _time_per_call(uncached, queries)
+    # cache hits: a working set that fits the memo, replayed several times
+    hot = queries[: _parse.cache_info().maxsize // 2] * 10
+    _parse.cache_clear()
+    for q in hot:
+        parse_query(q, TODAY)
+    t_cached = _time_per_call(lambda q: parse_query(q, TODAY), hot)
+    print(f"legacy per-feature passes: {t_legacy:.1f} us/query")
+    print(f"one-pass parse (uncached): {t_parse:.1f} us/query")
+    print(f"memoised parse (hit):      {t_cached:.2f} us/query")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
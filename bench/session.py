@@ -0,0 +1,44 @@
+# Follow-up detection check over scripted conversations (stand-in graph)
+#   python -m bench.session
+#
+# Each conversation is run turn by turn under one session_id; every turn lists
+# whether it must be treated as a follow-up and the metric/breakdown it must
+# resolve to. Exit code 1 on any mismatch.
+
+from __future__ import annotations
+import sys
+from typing import List, Optional, Tuple
+from rag_agent.graph import build_graph
+from rag_agent.session import SessionStore
+from rag_agent.standins import StandInSearch, StandInSynthesizer, StandInWarehouse
+
+# (query, follow_up, metric, breakdown)
+Turn = Tuple[str, bool, str, Optional[str]]
+
+CONVERSATIONS: List[List[Turn]] = [
+    [("How many upgrades last month by region?", False, "upgrades", "region"),
+     ("and by gender?", True, "upgrades", "gender"),
+     ("How many members in November 2025?", False, "active", None),
+     ("by grade?", True, "active", "grade")],
+    [("How many joins in October 2025?", False, "admissions", None),
+     ("what about last month?", True, "admissions", None),
+     ("How many members last month?", False, "active", None),
+     ("last month instead", True, "active", None)],
+]
+
+def main():
+    g = build_graph(search=StandInSearch(0), sql=StandInWarehouse().populate(2000), synth=StandInSynthesizer(0),
+                    sessions=SessionStore(), tracer=None)
+    mismatches = 0
+    for i, conv in enumerate(CONVERSATIONS):
+        for q, follow_up, metric, breakdown in conv:
+            out = g.invoke({"user_query": q, "session_id": f"conv-{i}"})
+            got = (bool(out.get("follow_up")), out.get("metric"), out.get("breakdown"))
+            ok = got == (follow_up, metric, breakdown)
+            mismatches += not ok
+            print(f"{'ok ' if ok else 'BAD'} {q!r:45} follow_up={got[0]} metric={got[1]} breakdown={got[2]}")
+    print(f"mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
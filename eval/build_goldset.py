@@ -1,39 +1,149 @@
 from __future__ import annotations
-import json, argparse
-from typing import Dict, List, Set, Tuple
-from rag_agent.sql_templates import parse_time_window
-from rag_agent.intent_router import detect_metric
-from .eval_common import SearchClient
+import json, argparse, itertools, os, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from rag_agent.query_parser import parse_query
+from .eval_common import get_search_client, configure_search_client, get_eval_today, SKU_QPS
 from .normalize import normalize_for_retrieval
+from .retrieval_modes import build_body, Normalized
 
 def time_anchor_from_query(q: str) -> str:
     # e.g., "2025-11" for Nov-2025; for "this year" anchor "2025"
-    granularity, tw = parse_time_window(q)
-    if granularity == "month":
-        y = tw.start_fk // 10000
-        m = (tw.start_fk // 100) % 100
-        return f"{y:04d}-{m:02d}"
-    else:
-        y = tw.start_fk // 10000
-        return f"{y:04d}"
-
-def build_filter(metric: str) -> str:
-    if metric == "active":
-        return "membership_status_original eq 'Active'"
-    if metric == "admissions":
-        return "membership_type_original eq 'Join'"
-    if metric == "upgrades":
-        return "membership_type_original eq 'Upgrade'"
-    if metric == "left":
-        return "(membership_status_original eq 'Resigned' or membership_status_original eq 'Deceased')"
-    return ""
-
-def pool_gold_for_query(qid: str, query: str, pool: int = 200, per_query: int = 20) -> List[str]:
-    lex, vec, filt = normalize_for_retrieval(query)
-    body = {"search": lex, "top": pool, "select": "id,content"}
-    if filt: body["filter"] = filt
-    res = SearchClient().post(body).get("value", [])
-    return [r["id"] for r in res][:per_query]
+    return parse_query(q).anchor
+
+POOL_MODES = ("lexical", "vector", "hybrid", "semantic")
+
+def pool_body(mode: str, norm: Normalized, pool: int = 200) -> Dict[str, Any]:
+    """ID-only pooling request; 'lexical' is the original keyword pool, others are retrieval kinds."""
+    if mode == "lexical":
+        lex, _, filt = norm
+        body: Dict[str, Any] = {"search": lex, "top": pool, "select": "id"}
+        if filt: body["filter"] = filt
+        return body
+    return build_body(mode, norm, k_candidates=pool, top_k=pool, select="id")
+
+def pool_ids(mode: str, norm: Normalized, pool: int = 200) -> List[str]:
+    return [r["id"] for r in get_search_client().post(pool_body(mode, norm, pool)).get("value", [])]
+
+def union_pool(ranked: Sequence[List[str]], per_query: int) -> List[str]:
+    """Interleaves the per-mode rankings rank by rank (depth pooling), dropping repeats."""
+    out: List[str] = []
+    seen: Set[str] = set()
+    for tier in itertools.zip_longest(*ranked):
+        for doc_id in tier:
+            if doc_id is not None and doc_id not in seen:
+                seen.add(doc_id)
+                out.append(doc_id)
+    return out[:per_query]
+
+def pool_gold_for_query(qid: str, query: str, pool: int = 200, per_query: int = 20,
+                        modes: Sequence[str] = ("lexical",)) -> List[str]:
+    norm = normalize_for_retrieval(query)
+    return union_pool([pool_ids(m, norm, pool) for m in modes], per_query)
+
+class Checkpoint:
+    """
+    Append-only JSONL of finished (qid, mode) fetches. The first line records the
+    build parameters; resuming with different parameters is refused so a goldset
+    never mixes pools.
+    """
+
+    def __init__(self, path: str, params: Dict[str, Any], restart: bool = False):
+        self.path = path
+        self.done: Dict[Tuple[str, str], List[str]] = {}
+        self._lock = threading.Lock()
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            lines = self._load()
+            if not lines:
+                self._append({"params": params})     # empty, or only a torn first line
+            elif lines[0].get("params") != params:
+                raise SystemExit(f"{path} was written with {lines[0].get('params')}; "
+                                 f"rerun with the same options or pass --restart")
+            for rec in lines[1:]:
+                self.done[(rec["qid"], rec["mode"])] = rec["ids"]
+        else:
+            self._append({"params": params})
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """
+        Parsed records. A last line that does not parse (a write cut short by a
+        crash) is dropped and cut from the file, so the next append starts on a
+        fresh line; a bad line anywhere else is corruption and stops the build.
+        """
+        with open(self.path, "rb") as f:
+            data = f.read()
+        lines = data.split(b"\n")
+        recs: List[Dict[str, Any]] = []
+        end = 0                             # offset just past the last parsed line's text
+        pos = 0
+        for i, line in enumerate(lines):
+            if line.strip():
+                try:
+                    recs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    if i < len(lines) - 1:
+                        raise SystemExit(f"{self.path}: line {i + 1} is not valid JSON; fix it or pass --restart")
+                    break
+                end = pos + len(line)
+            pos += len(line) + 1
+        if data[end:] != b"\n":
+            with open(self.path, "r+b") as f:   # drop the torn tail and end on a newline
+                f.truncate(end)
+                f.seek(end)
+                f.write(b"\n" if end else b"")
+        return recs
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, qid: str, mode: str, ids: List[str]) -> None:
+        self._append({"qid": qid, "mode": mode, "ids": ids})
+        self.done[(qid, mode)] = ids
+
+def build_goldset(queries: List[Dict[str, str]], out: str, pool: int = 200, per_query: int = 20,
+                  modes: Sequence[str] = ("lexical",), workers: int = 1, checkpoint: Optional[str] = None,
+                  restart: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Pools gold IDs for every query x mode on `workers` threads over the shared
+    search client. Each finished fetch is checkpointed, so an interrupted build
+    resumes with only the missing fetches. Writes `out` atomically at the end.
+    """
+    for m in modes:
+        if m not in POOL_MODES:
+            raise ValueError(f"unknown pooling mode: {m}")
+    checkpoint = checkpoint or out + ".partial.jsonl"
+    params = {"queries": [q["id"] for q in queries], "pool": pool, "per_query": per_query,
+              "modes": list(modes), "today": get_eval_today().isoformat()}
+    ckpt = Checkpoint(checkpoint, params, restart=restart)
+
+    norms = {item["id"]: normalize_for_retrieval(item["query"]) for item in queries}
+    todo = [(item["id"], m) for item in queries for m in modes if (item["id"], m) not in ckpt.done]
+
+    def fetch(task: Tuple[str, str]) -> None:
+        qid, mode = task
+        ckpt.record(qid, mode, pool_ids(mode, norms[qid], pool))
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gold") as ex:
+            list(ex.map(fetch, todo))
+
+    gold: Dict[str, Dict[str, Any]] = {}
+    for item in queries:
+        qid, qtext = item["id"], item["query"]
+        ids = union_pool([ckpt.done[(qid, m)] for m in modes], per_query)
+        gold[qid] = {"query": qtext, "relevant_doc_ids": ids, "scorable": bool(ids)}
+
+    tmp = out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(gold, f, indent=2)
+    os.replace(tmp, out)
+    os.remove(checkpoint)
+    return gold
 
 def main():
     ap = argparse.ArgumentParser()
@@ -41,19 +151,21 @@ def main():
     ap.add_argument("--out", required=True, help="path to write goldset.json")
     ap.add_argument("--pool", type=int, default=200)
     ap.add_argument("--per_query", type=int, default=20)
+    ap.add_argument("--modes", nargs="+", choices=POOL_MODES, default=["lexical"],
+                    help="union-pool across these retrieval modes (default: lexical only)")
+    ap.add_argument("--workers", type=int, default=1, help="concurrent pooling requests")
+    ap.add_argument("--qps", type=float, default=None, help="rate limit (requests/sec) across workers")
+    ap.add_argument("--sku", choices=sorted(SKU_QPS), default=None, help="use the preset rate limit for a Search SKU")
+    ap.add_argument("--checkpoint", default=None, help="progress file (default: <out>.partial.jsonl)")
+    ap.add_argument("--restart", action="store_true", help="discard an existing checkpoint")
     args = ap.parse_args()
 
     with open(args.queries, "r", encoding="utf-8") as f:
         queries = json.load(f)
 
-    gold: Dict[str, Dict[str, List[str]]] = {}
-    for item in queries:
-        qid, qtext = item["id"], item["query"]
-        ids = pool_gold_for_query(qid, qtext, pool=args.pool, per_query=args.per_query)
-        gold[qid] = {"query": qtext, "relevant_doc_ids": ids, "scorable": bool(ids)}
-
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(gold, f, indent=2)
+    configure_search_client(workers=args.workers, qps=args.qps or SKU_QPS.get(args.sku))
+    build_goldset(queries, args.out, pool=args.pool, per_query=args.per_query, modes=args.modes,
+                  workers=args.workers, checkpoint=args.checkpoint, restart=args.restart)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
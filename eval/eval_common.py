@@ -1,37 +1,156 @@
 from __future__ import annotations
-import json, os, time
-import requests
-from typing import Dict, Any
-from rag_agent.config import get_settings
+import json, os, random, threading, time
+from typing import Dict, Any, Optional
 from datetime import date
 
+# Conservative per-replica query rates to start from when picking --qps for a
+# Search SKU; tune down if runs still see 429s, up if they never do.
+SKU_QPS = {"free": 3.0, "basic": 10.0, "s1": 25.0, "s2": 50.0, "s3": 100.0}
+
+RETRY_STATUSES = {429, 503}
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/sec, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
 class SearchClient:
-    def __init__(self):
+    """
+    Thread-safe Search client for eval runs: one pooled session (keep-alive, one
+    TLS handshake per connection), optional token-bucket rate limit, and retry
+    with exponential backoff on 429/503 (honouring Retry-After).
+    """
+
+    def __init__(self, pool_size: int = 32, qps: Optional[float] = None,
+                 max_retries: int = 5, backoff_s: float = 0.5):
+        # requests/settings load on first client, not on import: rag_agent.sql_templates
+        # imports this module for get_eval_today()
+        import requests
+        from requests.adapters import HTTPAdapter
+        from rag_agent.config import get_settings
         s = get_settings().search
         self.endpoint = s.endpoint.rstrip("/")
         self.index = s.index
         self.api_version = s.api_version
         self.session = requests.Session()
         self.session.headers.update({"Content-Type": "application/json", "api-key": s.api_key})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = TokenBucket(qps) if qps else None
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.stats = {"requests": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def _retry_delay(self, resp: Any, attempt: int) -> float:
+        hdr = resp.headers.get("retry-after-ms") if resp is not None else None
+        if hdr:
+            return float(hdr) / 1000.0
+        hdr = resp.headers.get("Retry-After") if resp is not None else None
+        if hdr and hdr.replace(".", "", 1).isdigit():
+            return float(hdr)
+        return self.backoff_s * (2 ** attempt) * (1 + random.random() * 0.25)
 
     def post(self, body: Dict[str, Any]) -> Dict[str, Any]:
         url = f"{self.endpoint}/indexes/{self.index}/docs/search?api-version={self.api_version}"
-        r = self.session.post(url, json=body, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            with self._stats_lock:
+                self.stats["requests"] += 1
+            r = self.session.post(url, json=body, timeout=30)
+            if r.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                time.sleep(self._retry_delay(r, attempt))
+                continue
+            r.raise_for_status()
+            return r.json()
+        raise RuntimeError("unreachable")
+
+_client_lock = threading.Lock()
+_shared: Optional[SearchClient] = None
+
+def _local_backend() -> bool:
+    from rag_agent.config import get_settings
+    return get_settings().search_backend.backend == "local"
+
+def get_search_client() -> SearchClient:
+    """Process-wide client shared by every retrieval mode and worker thread."""
+    global _shared
+    with _client_lock:
+        if _shared is None:
+            _shared = _new_client()
+        return _shared
+
+def configure_search_client(workers: int = 1, qps: Optional[float] = None) -> SearchClient:
+    """Replaces the shared client with one sized for `workers` threads and limited to `qps`."""
+    global _shared
+    with _client_lock:
+        _shared = _new_client(max(4, workers), qps)
+        return _shared
+
+def _new_client(pool_size: Optional[int] = None, qps: Optional[float] = None) -> Any:
+    # AGENT_CASSETTE: recorded responses; in replay mode no live client (or rate limit) at all
+    from rag_agent.clients import with_cassette
+    return with_cassette(lambda: _live_client(pool_size, qps), "RecordedSearch")
+
+def _live_client(pool_size: Optional[int] = None, qps: Optional[float] = None) -> Any:
+    # AZURE_SEARCH_BACKEND=local: same post(body) contract, no network and no rate limit
+    if _local_backend():
+        from rag_agent.local_search import LocalSearch
+        return LocalSearch()
+    return SearchClient() if pool_size is None else SearchClient(pool_size=pool_size, qps=qps)
+
+def _cassette() -> Optional[Dict[str, Any]]:
+    from rag_agent.config import get_settings
+    a = get_settings().agent
+    return {"path": a.cassette, "mode": a.cassette_mode} if a.cassette else None
 
 def run_metadata(mode: str, k_candidates: int, top_k: int) -> Dict[str, Any]:
+    from rag_agent.config import get_settings
     s = get_settings()
-    return {
+    cassette = _cassette()
+    if cassette and cassette["mode"] == "replay":
+        # the target recorded with the responses; no Search settings needed
+        c = get_search_client()
+        index, api_version, endpoint = (getattr(c, a, None) for a in ("index", "api_version", "endpoint"))
+    elif _local_backend():
+        b = s.search_backend
+        index, api_version, endpoint = f"local:{b.local_path}", None, "local"
+    else:
+        index, api_version, endpoint = s.search.index, s.search.api_version, s.search.endpoint
+    meta = {
         "mode": mode,
         "k_candidates": k_candidates,
         "top_k": top_k,
-        "search_index": s.search.index,
-        "search_api_version": s.search.api_version,
-        "endpoint": s.search.endpoint,
+        "search_index": index,
+        "search_api_version": api_version,
+        "endpoint": endpoint,
         "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
         "notes": "Modern RAG baseline evaluation with fixed k_candidates=50, top=10"
     }
+    if cassette:
+        meta["cassette"] = cassette
+    return meta
 
 def get_eval_today() -> date:
     # EVAL_TODAY=YYYY-MM-DD (optional)
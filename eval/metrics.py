@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import List, Set, Dict
+from typing import List, Set, Dict, Sequence, Tuple, Optional
+import numpy as np
 
 def recall_at_k(pred: List[str], gold: Set[str], k: int = 10) -> float:
     if not gold:
@@ -10,4 +11,155 @@ def mrr_at_k(pred: List[str], gold: Set[str], k: int = 10) -> float:
     for i, doc_id in enumerate(pred[:k], start=1):
         if doc_id in gold:
             return 1.0 / i
-    return 0.0
\ No newline at end of file
+    return 0.0
+
+# Vectorised metrics
+#
+# A run is a boolean relevance matrix rel[q, r] (query x rank, True when the
+# doc at rank r+1 is relevant) plus n_rel[q], the gold-set size. Every metric is
+# computed for all queries and all k in one pass. Repeated doc ids only count at
+# their first rank, matching recall_at_k's set semantics.
+
+METRICS = ("recall", "precision", "mrr", "ndcg", "map")
+
+def relevance_matrix(preds: Sequence[Sequence[str]], golds: Sequence[Set[str]],
+                     depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(rel[Q, depth] bool, n_rel[Q] int) for ranked predictions against gold sets."""
+    if len(preds) != len(golds):
+        raise ValueError(f"{len(preds)} predictions for {len(golds)} gold sets")
+    depth = depth if depth is not None else max((len(p) for p in preds), default=0)
+    rel = np.zeros((len(preds), depth), dtype=bool)
+    for q, (pred, gold) in enumerate(zip(preds, golds)):
+        seen: Set[str] = set()
+        for r, doc_id in enumerate(pred[:depth]):
+            if doc_id in gold and doc_id not in seen:
+                rel[q, r] = True
+            seen.add(doc_id)
+    n_rel = np.fromiter((len(g) for g in golds), dtype=np.int64, count=len(golds))
+    return rel, n_rel
+
+def metrics_at_k(rel: np.ndarray, n_rel: np.ndarray, ks: Sequence[int] = (10,)) -> Dict[str, np.ndarray]:
+    """
+    Per-query scores keyed "<metric>@<k>" (e.g. "ndcg@10"), each a float array of
+    length Q. Ranks beyond rel's depth count as non-relevant. Binary gains; MAP@k
+    is AP normalised by min(|gold|, k).
+    """
+    ks = sorted(set(int(k) for k in ks))
+    if not ks or ks[0] < 1:
+        raise ValueError(f"k values must be >= 1: {ks}")
+    depth = ks[-1]
+    if rel.shape[1] < depth:
+        rel = np.pad(rel, ((0, 0), (0, depth - rel.shape[1])))
+    rel = rel[:, :depth].astype(np.float64)
+    ranks = np.arange(1, depth + 1, dtype=np.float64)
+    n_rel_f = n_rel.astype(np.float64)
+    has_gold = n_rel > 0
+
+    hits = np.cumsum(rel, axis=1)                               # hits within top r
+    discount = 1.0 / np.log2(ranks + 1.0)
+    dcg = np.cumsum(rel * discount, axis=1)
+    ideal = np.cumsum(discount)                                 # IDCG for r relevant docs
+    ap_terms = np.cumsum(rel * hits / ranks, axis=1)            # sum of P@r at relevant ranks
+    first = np.where(rel.any(axis=1), rel.argmax(axis=1) + 1, 0)
+
+    out: Dict[str, np.ndarray] = {}
+    for k in ks:
+        h = hits[:, k - 1]
+        out[f"recall@{k}"] = np.divide(h, n_rel_f, out=np.zeros_like(h), where=has_gold)
+        out[f"precision@{k}"] = h / float(k)
+        out[f"mrr@{k}"] = np.where((first > 0) & (first <= k), 1.0 / np.maximum(first, 1), 0.0)
+        cap = np.minimum(n_rel, k)
+        idcg = np.where(cap > 0, ideal[np.maximum(cap, 1) - 1], 1.0)
+        out[f"ndcg@{k}"] = np.where(has_gold, dcg[:, k - 1] / idcg, 0.0)
+        out[f"map@{k}"] = np.where(has_gold, ap_terms[:, k - 1] / np.maximum(cap, 1), 0.0)
+    return out
+
+def evaluate_run(preds: Sequence[Sequence[str]], golds: Sequence[Set[str]],
+                 ks: Sequence[int] = (10,)) -> Dict[str, np.ndarray]:
+    rel, n_rel = relevance_matrix(preds, golds, depth=max(ks))
+    return metrics_at_k(rel, n_rel, ks)
+
+# Bootstrap / significance
+#
+# Resampling is one (B, Q) index matrix shared by every run, so all runs see the
+# same resampled query sets (paired). For many runs the resamples become a (B, Q)
+# count matrix and every run's bootstrap means are one matrix product.
+
+def bootstrap_indices(n_queries: int, n_boot: int = 10000, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, n_queries, size=(n_boot, n_queries))
+
+def _resample_counts(idx: np.ndarray, n_queries: int) -> np.ndarray:
+    """counts[b, q] = times query q was drawn in resample b."""
+    n_boot = idx.shape[0]
+    flat = (idx + n_queries * np.arange(n_boot)[:, None]).ravel()
+    return np.bincount(flat, minlength=n_boot * n_queries).reshape(n_boot, n_queries).astype(np.float64)
+
+def bootstrap_ci(scores: np.ndarray, n_boot: int = 10000, alpha: float = 0.05, seed: int = 0,
+                 idx: Optional[np.ndarray] = None) -> Tuple[float, float, float]:
+    """(mean, lo, hi) percentile interval of the macro mean."""
+    scores = np.asarray(scores, dtype=np.float64)
+    idx = idx if idx is not None else bootstrap_indices(len(scores), n_boot, seed)
+    means = scores[idx].mean(axis=1)
+    lo, hi = np.quantile(means, [alpha / 2, 1 - alpha / 2])
+    return float(scores.mean()), float(lo), float(hi)
+
+def paired_bootstrap(a: np.ndarray, b: np.ndarray, n_boot: int = 10000, alpha: float = 0.05,
+                     seed: int = 0, idx: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """
+    Delta mean(b) - mean(a) over the same queries with a percentile CI. The
+    two-sided p comes from resampling the centred differences (the null of no
+    change): the share of resampled |mean| at least as large as the observed.
+    """
+    d = np.asarray(b, dtype=np.float64) - np.asarray(a, dtype=np.float64)
+    idx = idx if idx is not None else bootstrap_indices(len(d), n_boot, seed)
+    means = d[idx].mean(axis=1)
+    lo, hi = np.quantile(means, [alpha / 2, 1 - alpha / 2])
+    if not d.any():
+        return {"delta": 0.0, "lo": float(lo), "hi": float(hi), "p": 1.0}
+    obs = abs(d.mean())
+    null = np.abs(means - d.mean())          # = |mean of (d - d.mean()) resampled|
+    p = ((null >= obs - 1e-12).sum() + 1) / (len(null) + 1)
+    return {"delta": float(d.mean()), "lo": float(lo), "hi": float(hi), "p": float(p)}
+
+def randomization_test(a: np.ndarray, b: np.ndarray, n_perm: int = 10000, seed: int = 0) -> float:
+    """Two-sided paired sign-flip test of mean(b) - mean(a); returns the p-value."""
+    d = np.asarray(b, dtype=np.float64) - np.asarray(a, dtype=np.float64)
+    if not d.any():
+        return 1.0
+    signs = np.random.default_rng(seed).choice((-1.0, 1.0), size=(n_perm, len(d)))
+    null = np.abs((signs * d).mean(axis=1))
+    return float(((null >= abs(d.mean()) - 1e-12).sum() + 1) / (n_perm + 1))
+
+def compare_runs(runs: Dict[str, np.ndarray], baseline: str, n_boot: int = 10000, alpha: float = 0.05,
+                 seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Paired comparison of every run against `baseline` on one metric's per-query
+    scores. Returns {run: {mean, lo, hi, delta, delta_lo, delta_hi, p, p_perm}}.
+    """
+    names = list(runs)
+    mat = np.vstack([np.asarray(runs[n], dtype=np.float64) for n in names])   # [R, Q]
+    n_q = mat.shape[1]
+    base = mat[names.index(baseline)]
+    diff = mat - base                                                         # [R, Q]
+
+    counts = _resample_counts(bootstrap_indices(n_q, n_boot, seed), n_q)      # [B, Q]
+    means = mat @ counts.T / n_q                                              # [R, B]
+    deltas = diff @ counts.T / n_q
+    q = [alpha / 2, 1 - alpha / 2]
+    lo, hi = np.quantile(means, q, axis=1)
+    dlo, dhi = np.quantile(deltas, q, axis=1)
+    obs = np.abs(diff.mean(axis=1))[:, None]
+    centred = np.abs(deltas - diff.mean(axis=1)[:, None])                     # null: centred differences
+    p = ((centred >= obs - 1e-12).sum(axis=1) + 1) / (n_boot + 1)
+
+    signs = np.random.default_rng(seed).choice((-1.0, 1.0), size=(n_boot, n_q))
+    null = np.abs(diff @ signs.T / n_q)                                       # [R, B]
+    p_perm = ((null >= obs - 1e-12).sum(axis=1) + 1) / (n_boot + 1)
+
+    out: Dict[str, Dict[str, float]] = {}
+    for i, n in enumerate(names):
+        same = not diff[i].any()
+        out[n] = {"mean": float(mat[i].mean()), "lo": float(lo[i]), "hi": float(hi[i]),
+                  "delta": float(diff[i].mean()), "delta_lo": float(dlo[i]), "delta_hi": float(dhi[i]),
+                  "p": 1.0 if same else float(p[i]), "p_perm": 1.0 if same else float(p_perm[i])}
+    return out
@@ -1,40 +1,87 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from .eval_common import SearchClient
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+from .eval_common import get_search_client
 from .normalize import normalize_for_retrieval
 
 SELECT_FIELDS = "id,chunk,content,membership_status_original,membership_type_original,gradeName,hubName"
 
+# (lexical_query, vector_text, optional_filter) as returned by normalize_for_retrieval
+Normalized = Tuple[str, str, Optional[str]]
+
+# retrieval kind -> the baseline function name recorded as "mode" in .meta.json
+KIND_FUNCTIONS = {"vector": "vector_only", "hybrid": "hybrid_rrf", "semantic": "hybrid_semantic"}
+
 def _post(body) -> List[str]:
-    return [v["id"] for v in SearchClient().post(body).get("value", [])]
+    return [v["id"] for v in get_search_client().post(body).get("value", [])]
 
-def vector_only(query: str, k_candidates: int = 50, top_k: int = 10) -> List[str]:
-    lex, vec, filt = normalize_for_retrieval(query)
-    body = {
-        "vectorQueries": [{"kind": "text", "text": vec, "fields": "chunkVector", "k": k_candidates, "weight": 1.0}],
-        "top": top_k, "select": SELECT_FIELDS
+def build_body(kind: str, norm: Normalized, k_candidates: int = 50, top_k: int = 10,
+               weight: float = 1.0, select: str = SELECT_FIELDS) -> Dict[str, Any]:
+    """Search request for one retrieval kind from an already-normalised query."""
+    lex, vec, filt = norm
+    body: Dict[str, Any] = {
+        "vectorQueries": [{"kind": "text", "text": vec, "fields": "chunkVector", "k": k_candidates, "weight": weight}],
+        "top": top_k, "select": select
     }
+    if kind in ("hybrid", "semantic"):
+        body = {"search": lex, **body}
+    if kind == "semantic":
+        body = {"search": lex, "queryType": "semantic", "semanticConfiguration": "mem-semantic",
+                **{k: v for k, v in body.items() if k != "search"}}
+    elif kind != "vector" and kind != "hybrid":
+        raise ValueError(f"unknown retrieval kind: {kind}")
     if filt: body["filter"] = filt
-    return _post(body)
+    return body
+
+def vector_only(query: str, k_candidates: int = 50, top_k: int = 10) -> List[str]:
+    return _post(build_body("vector", normalize_for_retrieval(query), k_candidates, top_k))
 
 def hybrid_rrf(query: str, k_candidates: int = 50, top_k: int = 10) -> List[str]:
-    lex, vec, filt = normalize_for_retrieval(query)
-    body = {
-        "search": lex,
-        "vectorQueries": [{"kind": "text", "text": vec, "fields": "chunkVector", "k": k_candidates, "weight": 1.0}],
-        "top": top_k, "select": SELECT_FIELDS
-    }
-    if filt: body["filter"] = filt
-    return _post(body)
+    return _post(build_body("hybrid", normalize_for_retrieval(query), k_candidates, top_k))
 
 def hybrid_semantic(query: str, k_candidates: int = 50, top_k: int = 10) -> List[str]:
-    lex, vec, filt = normalize_for_retrieval(query)
-    body = {
-        "search": lex,
-        "queryType": "semantic",
-        "semanticConfiguration": "mem-semantic",
-        "vectorQueries": [{"kind": "text", "text": vec, "fields": "chunkVector", "k": k_candidates, "weight": 1.0}],
-        "top": top_k, "select": SELECT_FIELDS
-    }
-    if filt: body["filter"] = filt
-    return _post(body)
\ No newline at end of file
+    return _post(build_body("semantic", normalize_for_retrieval(query), k_candidates, top_k))
+
+@dataclass(frozen=True)
+class ModeSpec:
+    """
+    One retrieval configuration to evaluate. Parsed from strings like
+    "hybrid", "semantic:k=100", "vector:k=80,w=0.5,top=20".
+    """
+    kind: str
+    k_candidates: int = 50
+    top_k: int = 10
+    weight: float = 1.0
+
+    @classmethod
+    def parse(cls, spec: str, k_candidates: int = 50, top_k: int = 10) -> "ModeSpec":
+        kind, _, opts = spec.partition(":")
+        if kind not in KIND_FUNCTIONS:
+            raise ValueError(f"unknown retrieval kind in {spec!r}; expected one of {sorted(KIND_FUNCTIONS)}")
+        vals: Dict[str, Any] = {"k_candidates": k_candidates, "top_k": top_k, "weight": 1.0}
+        for opt in filter(None, opts.split(",")):
+            key, _, val = opt.partition("=")
+            key = {"k": "k_candidates", "top": "top_k", "w": "weight"}.get(key.strip(), key.strip())
+            if key not in vals:
+                raise ValueError(f"unknown option {key!r} in {spec!r}")
+            vals[key] = float(val) if key == "weight" else int(val)
+        return cls(kind=kind, **vals)
+
+    @property
+    def function_name(self) -> str:
+        return KIND_FUNCTIONS[self.kind]
+
+    @property
+    def name(self) -> str:
+        """File-name friendly label; the plain kind for baseline settings."""
+        parts = [self.kind]
+        if self.k_candidates != 50: parts.append(f"k{self.k_candidates}")
+        if self.top_k != 10: parts.append(f"top{self.top_k}")
+        if self.weight != 1.0: parts.append(f"w{self.weight:g}")
+        return "_".join(parts)
+
+    def body(self, norm: Normalized) -> Dict[str, Any]:
+        return build_body(self.kind, norm, self.k_candidates, self.top_k, self.weight)
+
+    def run(self, norm: Normalized) -> List[str]:
+        return _post(self.body(norm))
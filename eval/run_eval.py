@@ -1,30 +1,55 @@
 from __future__ import annotations
-import json, argparse, csv, pathlib
-from typing import Dict, List, Set
-from .metrics import recall_at_k, mrr_at_k
-from .retrieval_modes import vector_only, hybrid_rrf, hybrid_semantic
-from .eval_common import run_metadata
+import json, argparse, csv, pathlib, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from .metrics import evaluate_run, METRICS
+from .normalize import normalize_for_retrieval
+from .retrieval_modes import vector_only, hybrid_rrf, hybrid_semantic, ModeSpec
+from .eval_common import run_metadata, configure_search_client, SKU_QPS
+from .run_store import RunStore, DEFAULT_STORE
 
-def evaluate(mode_fn, gold_path: str, out_csv: str, k_candidates: int = 50, top_k: int = 10):
-    gold = json.load(open(gold_path, "r", encoding="utf-8"))
-    rows = []
-    macro_recall, macro_mrr, n = 0.0, 0.0, 0
+def evaluate(mode_fn, gold_path: str, out_csv: str, k_candidates: int = 50, top_k: int = 10,
+             workers: int = 1, store: Optional[str] = None):
+    """
+    Runs mode_fn over every scorable goldset query on `workers` threads. Rows
+    come back in goldset order regardless of completion order, so output files
+    are identical to a sequential run.
+    """
+    items = _load_items(gold_path)
+    fetch = lambda item: mode_fn(item[1], k_candidates=k_candidates, top_k=top_k)
+
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval") as pool:
+            preds = list(pool.map(fetch, items))     # map preserves input order
+    else:
+        preds = [fetch(it) for it in items]
+    wall_s = time.perf_counter() - t0
 
-    for qid, obj in gold.items():
-        if not obj.get("scorable", True):
-            continue
-        qtext: str = obj["query"]
-        rel: Set[str] = set(obj["relevant_doc_ids"])
+    meta = run_metadata(mode_fn.__name__, k_candidates, top_k)
+    meta["goldset"] = pathlib.Path(gold_path).stem
+    _write_run(*_score_rows(items, preds, top_k), out_csv, meta, workers, wall_s, store)
+
+def _load_items(gold_path: str) -> List[Tuple[str, str, Set[str]]]:
+    gold = json.load(open(gold_path, "r", encoding="utf-8"))
+    return [(qid, obj["query"], set(obj["relevant_doc_ids"]))
+            for qid, obj in gold.items() if obj.get("scorable", True)]
 
-        pred: List[str] = mode_fn(qtext, k_candidates=k_candidates, top_k=top_k)
-        r = recall_at_k(pred, rel, k=top_k)
-        m = mrr_at_k(pred, rel, k=top_k)
+def _score_rows(items: List[Tuple[str, str, Set[str]]], preds: List[List[str]],
+                top_k: int) -> Tuple[List[Dict[str, object]], Dict[str, float]]:
+    """Per-query CSV rows plus macro means of every metric at top_k."""
+    scores = evaluate_run(preds, [rel for _, _, rel in items], ks=(top_k,))
+    rows = [{"qid": qid, "query": q, "recall_at_10": float(scores[f"recall@{top_k}"][i]),
+             "mrr_at_10": float(scores[f"mrr@{top_k}"][i]), "gold_size": len(rel)}
+            for i, (qid, q, rel) in enumerate(items)]
+    macro = {f"{m}@{top_k}": float(scores[f"{m}@{top_k}"].mean()) if items else 0.0 for m in METRICS}
+    return rows, macro
 
-        rows.append({"qid": qid, "query": qtext, "recall_at_10": r, "mrr_at_10": m,
-                     "gold_size": len(rel)})
-        macro_recall += r
-        macro_mrr += m
-        n += 1
+def _write_run(rows: List[Dict[str, object]], macro_all: Dict[str, float], out_csv: str,
+               meta: Dict[str, object], workers: int, wall_s: float, store: Optional[str] = None):
+    n = len(rows)
+    macro_recall = sum(r["recall_at_10"] for r in rows)
+    macro_mrr = sum(r["mrr_at_10"] for r in rows)
 
     pathlib.Path(out_csv).parent.mkdir(parents=True, exist_ok=True)
     with open(out_csv, "w", newline="", encoding="utf-8") as f:
@@ -33,22 +58,83 @@ def evaluate(mode_fn, gold_path: str, out_csv: str, k_candidates: int = 50, top_
         for r in rows:
             w.writerow(r)
 
-    meta = run_metadata(mode_fn.__name__, k_candidates, top_k)
     meta["macro_recall_at_10"] = macro_recall / max(1, n)
     meta["macro_mrr_at_10"] = macro_mrr / max(1, n)
+    meta["macro_at_k"] = macro_all
+    meta["workers"] = workers
+    meta["wall_s"] = round(wall_s, 3)
     meta_path = out_csv.replace(".csv", ".meta.json")
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2)
+    if store:
+        rs = RunStore(store)
+        rs.add_run(pathlib.Path(out_csv).stem, meta, rows)
+        rs.close()
+
+def evaluate_modes(specs: Sequence[ModeSpec], gold_path: str, out_dir: str, tag: str,
+                   workers: int = 1, store: Optional[str] = None) -> Dict[str, str]:
+    """
+    Evaluates several modes in one pass: the goldset is read once, each query is
+    normalised once, and the per-mode requests for a query go out together.
+    Writes <out_dir>/<spec.name>_<tag>.csv + .meta.json per spec, in the same
+    format as evaluate(). Returns {spec.name: csv_path}.
+    """
+    names = [s.name for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"duplicate modes: {names}")
+    items = _load_items(gold_path)
+    norms = [normalize_for_retrieval(q) for _, q, _ in items]
+
+    t0 = time.perf_counter()
+    tasks = [(i, spec) for i in range(len(items)) for spec in specs]   # a query's modes are adjacent
+    run = lambda task: task[1].run(norms[task[0]])
+    pool_size = max(1, workers) * len(specs)
+    with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="eval") as pool:
+        preds = list(pool.map(run, tasks))
+    wall_s = time.perf_counter() - t0
+
+    out: Dict[str, str] = {}
+    for j, spec in enumerate(specs):
+        scored = _score_rows(items, [preds[i * len(specs) + j] for i in range(len(items))], spec.top_k)
+        meta = run_metadata(spec.function_name, spec.k_candidates, spec.top_k)
+        meta["variant"] = spec.name
+        meta["weight"] = spec.weight
+        meta["goldset"] = pathlib.Path(gold_path).stem
+        out_csv = str(pathlib.Path(out_dir) / f"{spec.name}_{tag}.csv")
+        _write_run(*scored, out_csv, meta, workers, wall_s, store)
+        out[spec.name] = out_csv
+    return out
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--mode", choices=["vector","hybrid","semantic"], required=True)
+    sel = ap.add_mutually_exclusive_group(required=True)
+    sel.add_argument("--mode", choices=["vector","hybrid","semantic"])
+    sel.add_argument("--modes", nargs="+", metavar="SPEC",
+                     help="one pass over several modes, e.g. vector hybrid semantic hybrid:k=100,w=0.5")
     ap.add_argument("--gold", required=True)
-    ap.add_argument("--out", required=True)
+    ap.add_argument("--out", help="output CSV (--mode)")
+    ap.add_argument("--out_dir", default="eval/runs", help="output directory (--modes)")
+    ap.add_argument("--tag", help="file suffix for --modes outputs, e.g. v2 -> hybrid_v2.csv")
     ap.add_argument("--k_candidates", type=int, default=50)
     ap.add_argument("--top_k", type=int, default=10)
+    ap.add_argument("--store", default=DEFAULT_STORE, help="run store to append to ('' to skip)")
+    ap.add_argument("--workers", type=int, default=1, help="concurrent queries")
+    ap.add_argument("--qps", type=float, default=None, help="rate limit (requests/sec) across workers")
+    ap.add_argument("--sku", choices=sorted(SKU_QPS), default=None, help="use the preset rate limit for a Search SKU")
     args = ap.parse_args()
 
+    if args.modes:
+        if not args.tag:
+            ap.error("--modes requires --tag")
+        specs = [ModeSpec.parse(m, args.k_candidates, args.top_k) for m in args.modes]
+        configure_search_client(workers=args.workers * len(specs), qps=args.qps or SKU_QPS.get(args.sku))
+        for name, path in evaluate_modes(specs, gold_path=args.gold, out_dir=args.out_dir, tag=args.tag,
+                                         workers=args.workers, store=args.store).items():
+            print(f"{name}: {path}")
+        return
+    if not args.out:
+        ap.error("--mode requires --out")
+
     if args.mode == "vector":
         fn = vector_only
     elif args.mode == "hybrid":
@@ -56,7 +142,9 @@ def main():
     else:
         fn = hybrid_semantic
 
-    evaluate(fn, gold_path=args.gold, out_csv=args.out, k_candidates=args.k_candidates, top_k=args.top_k)
+    configure_search_client(workers=args.workers, qps=args.qps or SKU_QPS.get(args.sku))
+    evaluate(fn, gold_path=args.gold, out_csv=args.out, k_candidates=args.k_candidates, top_k=args.top_k,
+             workers=args.workers, store=args.store)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+import json, pathlib, sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Append-only store for eval runs (SQLite, one file)
+#
+# runs    one row per run: indexed metadata + macro metrics + the full meta JSON
+# scores  (run_id, metric, qid) -> value, so a report reads only the metrics it needs
+# queries (goldset, qid) -> query text; qids are only unique within a goldset
+#
+# A run is named after its CSV stem (vector_v2, hybrid_k100_w0.5_v1, ...). Names may
+# repeat across re-runs; lookups by name resolve to the latest run with that name,
+# lookups by run_id to exactly that run. A run's goldset is the stem of the --gold
+# file it scored ("" for runs recorded before the goldset was tracked).
+
+DEFAULT_STORE = "eval/runs/runs.sqlite"
+
+RUN_COLUMNS = ["run_id", "name", "mode", "variant", "k_candidates", "top_k", "weight", "search_index",
+               "search_api_version", "endpoint", "goldset", "timestamp_utc", "n_queries",
+               "macro_recall_at_10", "macro_mrr_at_10"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs(
+    run_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    variant TEXT,
+    k_candidates INTEGER,
+    top_k INTEGER,
+    weight REAL,
+    search_index TEXT,
+    search_api_version TEXT,
+    endpoint TEXT,
+    goldset TEXT NOT NULL DEFAULT '',
+    timestamp_utc TEXT,
+    n_queries INTEGER,
+    macro_recall_at_10 REAL,
+    macro_mrr_at_10 REAL,
+    meta_json TEXT NOT NULL,
+    UNIQUE(name, timestamp_utc)
+);
+CREATE INDEX IF NOT EXISTS ix_runs_name ON runs(name, timestamp_utc);
+CREATE INDEX IF NOT EXISTS ix_runs_mode ON runs(mode, timestamp_utc);
+CREATE INDEX IF NOT EXISTS ix_runs_index ON runs(search_index, search_api_version);
+CREATE INDEX IF NOT EXISTS ix_runs_k ON runs(k_candidates, top_k);
+CREATE TABLE IF NOT EXISTS scores(
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    metric TEXT NOT NULL,
+    qid TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY(run_id, metric, qid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS queries(
+    goldset TEXT NOT NULL,
+    qid TEXT NOT NULL,
+    query TEXT NOT NULL,
+    PRIMARY KEY(goldset, qid)
+) WITHOUT ROWID;
+"""
+
+def run_labels(runs: Sequence[Dict[str, Any]]) -> List[str]:
+    """Display label per run: its name, or "name#run_id" when the name repeats in `runs`."""
+    names = [r["name"] for r in runs]
+    return [r["name"] if names.count(r["name"]) == 1 else f"{r['name']}#{r['run_id']}" for r in runs]
+
+def _num(v: str) -> Any:
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return v
+    return int(f) if f.is_integer() and "." not in str(v) else f
+
+class RunStore:
+    def __init__(self, path: str = DEFAULT_STORE):
+        self.path = path
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self._migrate()
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _migrate(self) -> None:
+        """Brings stores written before runs.goldset / queries(goldset, qid) up to date."""
+        cols = lambda t: {r[1] for r in self.conn.execute(f"PRAGMA table_info({t})")}
+        run_cols = cols("runs")
+        if run_cols and "goldset" not in run_cols:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN goldset TEXT NOT NULL DEFAULT ''")
+        q_cols = cols("queries")
+        if q_cols and "goldset" not in q_cols:
+            self.conn.executescript("""
+                ALTER TABLE queries RENAME TO queries_v1;
+                CREATE TABLE queries(goldset TEXT NOT NULL, qid TEXT NOT NULL, query TEXT NOT NULL,
+                                     PRIMARY KEY(goldset, qid)) WITHOUT ROWID;
+                INSERT INTO queries SELECT '', qid, query FROM queries_v1;
+                DROP TABLE queries_v1;
+            """)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ---- writing ----
+    def add_run(self, name: str, meta: Dict[str, Any], rows: Sequence[Dict[str, Any]]) -> int:
+        """Appends one run (meta + per-query rows as written to the CSV); returns run_id."""
+        with self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO runs({', '.join(RUN_COLUMNS[1:])}, meta_json) VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+                (name, meta["mode"], meta.get("variant"), meta.get("k_candidates"), meta.get("top_k"),
+                 meta.get("weight", 1.0), meta.get("search_index"), meta.get("search_api_version"),
+                 meta.get("endpoint"), meta.get("goldset") or "", meta.get("timestamp_utc"), len(rows),
+                 meta.get("macro_recall_at_10"), meta.get("macro_mrr_at_10"), json.dumps(meta)))
+            run_id = int(cur.lastrowid)
+            self.conn.executemany("INSERT OR REPLACE INTO queries(goldset, qid, query) VALUES (?, ?, ?)",
+                                  [(meta.get("goldset") or "", str(r["qid"]), r["query"]) for r in rows if "query" in r])
+            self.conn.executemany(
+                "INSERT INTO scores(run_id, metric, qid, value) VALUES (?, ?, ?, ?)",
+                [(run_id, k, str(r["qid"]), v) for r in rows for k, v in r.items() if k not in ("qid", "query")])
+        return run_id
+
+    def find_run(self, name: str, timestamp_utc: Optional[str]) -> Optional[int]:
+        row = self.conn.execute("SELECT run_id FROM runs WHERE name = ? AND timestamp_utc IS ?",
+                                (name, timestamp_utc)).fetchone()
+        return None if row is None else int(row[0])
+
+    def import_files(self, paths: Iterable[str]) -> List[int]:
+        """
+        Imports CSV + .meta.json pairs (meta paths, CSV paths or directories) and
+        returns their run_ids. Runs already in the store (same name and timestamp)
+        are not added again; their existing run_id is returned.
+        """
+        import csv
+        metas: List[pathlib.Path] = []
+        for p in map(pathlib.Path, paths):
+            if p.is_dir():
+                metas.extend(sorted(p.glob("*.meta.json")))
+            elif p.name.endswith(".meta.json"):
+                metas.append(p)
+            else:
+                metas.append(p.with_name(p.stem + ".meta.json"))
+        ids: List[int] = []
+        for meta_path in metas:
+            meta = json.load(open(meta_path, "r", encoding="utf-8"))
+            if "mode" not in meta or meta.get("mode") == "sweep":
+                continue
+            name = meta_path.name[: -len(".meta.json")]
+            existing = self.find_run(name, meta.get("timestamp_utc"))
+            if existing is not None:
+                ids.append(existing)
+                continue
+            with open(str(meta_path).replace(".meta.json", ".csv"), newline="", encoding="utf-8") as f:
+                rows = [{k: (v if k in ("qid", "query") else _num(v)) for k, v in r.items()}
+                        for r in csv.DictReader(f)]
+            ids.append(self.add_run(name, meta, rows))
+        return ids
+
+    # ---- reading ----
+    def runs(self, name: Optional[str] = None, mode: Optional[str] = None, search_index: Optional[str] = None,
+             search_api_version: Optional[str] = None, k_candidates: Optional[int] = None,
+             top_k: Optional[int] = None, since: Optional[str] = None,
+             goldset: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Run metadata matching every given filter, oldest first."""
+        filters = {"name": name, "mode": mode, "search_index": search_index,
+                   "search_api_version": search_api_version, "k_candidates": k_candidates, "top_k": top_k,
+                   "goldset": goldset}
+        where = [f"{k} = ?" for k, v in filters.items() if v is not None]
+        params: List[Any] = [v for v in filters.values() if v is not None]
+        if since:
+            where.append("timestamp_utc >= ?")
+            params.append(since)
+        sql = f"SELECT {', '.join(RUN_COLUMNS)} FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return [dict(r) for r in self.conn.execute(sql + " ORDER BY timestamp_utc, run_id", params)]
+
+    def resolve(self, ref: str | int) -> Dict[str, Any]:
+        """A run by run_id or by name (latest run with that name)."""
+        if isinstance(ref, int) or str(ref).isdigit():
+            rows = self.conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE run_id = ?", (int(ref),))
+        else:
+            rows = self.conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE name = ? "
+                                     "ORDER BY timestamp_utc DESC, run_id DESC LIMIT 1", (ref,))
+        row = rows.fetchone()
+        if row is None:
+            raise KeyError(f"no run {ref!r} in {self.path}")
+        return dict(row)
+
+    def meta(self, ref: str | int) -> Dict[str, Any]:
+        run_id = self.resolve(ref)["run_id"]
+        return json.loads(self.conn.execute("SELECT meta_json FROM runs WHERE run_id = ?", (run_id,)).fetchone()[0])
+
+    def per_query(self, refs: Sequence[str | int], metrics: Sequence[str] = ("recall_at_10", "mrr_at_10")):
+        """
+        Wide DataFrame: qid, query, then one column per (metric, run) named
+        "<metric>[<run label>]" (see run_labels). Only the requested metrics are
+        read. Queries missing from any run are dropped, so columns stay paired.
+        Every run must have scored the same goldset.
+        """
+        import pandas as pd
+        runs = [self.resolve(r) for r in refs]
+        ids = [r["run_id"] for r in runs]
+        goldsets = {r["goldset"] for r in runs}
+        if len(goldsets) > 1:
+            raise ValueError(f"runs scored different goldsets: {sorted(goldsets)}")
+        long = pd.read_sql_query(
+            f"SELECT s.run_id, s.metric, s.qid, s.value FROM scores s "
+            f"WHERE s.run_id IN ({', '.join('?' * len(ids))}) AND s.metric IN ({', '.join('?' * len(metrics))})",
+            self.conn, params=[*ids, *metrics])
+        label = dict(zip(ids, run_labels(runs)))
+        long["col"] = long["metric"] + "[" + long["run_id"].map(label) + "]"
+        wide = long.pivot(index="qid", columns="col", values="value").dropna()
+        cols = [f"{m}[{label[i]}]" for m in metrics for i in ids]
+        wide = wide.reindex(columns=cols).reset_index()
+        q = pd.read_sql_query("SELECT qid, query FROM queries WHERE goldset = ?", self.conn,
+                              params=[runs[0]["goldset"]])
+        return q.merge(wide, on="qid", how="right")[["qid", "query", *cols]]
+
+    def trend(self, metric: str = "macro_recall_at_10", **filters: Any) -> List[Dict[str, Any]]:
+        """(timestamp, name, index, k, metric) per matching run, oldest first."""
+        if metric not in RUN_COLUMNS:
+            raise ValueError(f"unknown run metric: {metric}")
+        return [{"timestamp_utc": r["timestamp_utc"], "name": r["name"], "mode": r["mode"],
+                 "search_index": r["search_index"], "k_candidates": r["k_candidates"],
+                 "top_k": r["top_k"], metric: r[metric]} for r in self.runs(**filters)]
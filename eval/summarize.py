@@ -1,37 +1,99 @@
 from __future__ import annotations
-import sys, json, pandas as pd
-from pathlib import Path
+import sys, argparse, pandas as pd
+from .metrics import paired_bootstrap, randomization_test, bootstrap_ci
+from .run_store import RunStore, DEFAULT_STORE, run_labels
 
-def load(meta_path):
-    meta = json.load(open(meta_path, "r", encoding="utf-8"))
-    csv_path = meta_path.replace(".meta.json", ".csv")
-    df = pd.read_csv(csv_path)
-    return meta, df
+METRIC_LABELS = {"recall_at_10": "Recall@10", "mrr_at_10": "MRR@10"}
 
-if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print("usage: python -m eval.summarize <vector.meta.json> <hybrid.meta.json> <semantic.meta.json>")
-        sys.exit(1)
-
-    meta_vec, df_vec = load(sys.argv[1])
-    meta_hyb, df_hyb = load(sys.argv[2])
-    meta_sem, df_sem = load(sys.argv[3])
+def compare(store: RunStore, refs, metrics=("recall_at_10", "mrr_at_10")):
+    """
+    N-way comparison of runs (names, run ids) in the order given. Runs are
+    matched by run_id, so two runs sharing a name show up as "name#run_id".
+    """
+    runs = [store.resolve(r) for r in refs]
+    ids = [r["run_id"] for r in runs]
+    if len(set(ids)) != len(ids):
+        raise SystemExit(f"runs listed twice: {ids}")
+    if len({r["goldset"] for r in runs}) > 1:
+        raise SystemExit("runs scored different goldsets: "
+                         + ", ".join(f"{r['run_id']}={r['goldset'] or '?'}" for r in runs))
+    names = run_labels(runs)
+    width = max(len(n) for n in names)
 
     print("\nMacro metrics")
-    for name, meta in [("Vector", meta_vec), ("Hybrid", meta_hyb), ("Hybrid+Semantic", meta_sem)]:
-        print(f"{name}: Recall@10={meta['macro_recall_at_10']:.3f}  MRR@10={meta['macro_mrr_at_10']:.3f}")
+    for n, r in zip(names, runs):
+        print(f"{n:<{width}}  Recall@10={r['macro_recall_at_10']:.3f}  MRR@10={r['macro_mrr_at_10']:.3f}"
+              f"  ({r['mode']}, k={r['k_candidates']}, top={r['top_k']}, {r['search_index']}, {r['timestamp_utc']})")
 
     print("\nDeltas")
-    print(f"Recall@10  Vector→Hybrid: {meta_vec['macro_recall_at_10']:.3f} → {meta_hyb['macro_recall_at_10']:.3f}")
-    print(f"Recall@10  Hybrid→Hybrid+Semantic: {meta_hyb['macro_recall_at_10']:.3f} → {meta_sem['macro_recall_at_10']:.3f}")
-    print(f"MRR@10     Vector→Hybrid: {meta_vec['macro_mrr_at_10']:.3f} → {meta_hyb['macro_mrr_at_10']:.3f}")
-    print(f"MRR@10     Hybrid→Hybrid+Semantic: {meta_hyb['macro_mrr_at_10']:.3f} → {meta_sem['macro_mrr_at_10']:.3f}")
-
-    # per-query comparison table
-    df = df_vec.merge(df_hyb, on=["qid","query"], suffixes=("_vec","_hyb")).merge(
-        df_sem, on=["qid","query"]
-    )
-    df.rename(columns={"recall_at_10":"recall_at_10_sem","mrr_at_10":"mrr_at_10_sem"}, inplace=True)
-    cols = ["qid","query","gold_size","recall_at_10_vec","recall_at_10_hyb","recall_at_10_sem","mrr_at_10_vec","mrr_at_10_hyb","mrr_at_10_sem"]
+    for m in metrics:
+        for (na, a), (nb, b) in zip(zip(names, runs), zip(names[1:], runs[1:])):
+            print(f"{METRIC_LABELS.get(m, m):<10} {na}→{nb}: "
+                  f"{a['macro_' + m]:.3f} → {b['macro_' + m]:.3f}")
+
+    # paired significance on the per-query scores (same queries in every run)
+    df = store.per_query(ids, metrics)
+    print("\nSignificance (paired bootstrap, 10000 resamples, 95% CI; p_perm = sign-flip test)")
+    for m in metrics:
+        label = METRIC_LABELS.get(m, m)
+        scores = {n: df[f"{m}[{n}]"].to_numpy() for n in names}
+        for n, s in scores.items():
+            mean, lo, hi = bootstrap_ci(s)
+            print(f"{label:<10} {n}: {mean:.3f} [{lo:.3f}, {hi:.3f}]")
+        for a, b in zip(names, names[1:]):
+            r = paired_bootstrap(scores[a], scores[b])
+            p_perm = randomization_test(scores[a], scores[b])
+            print(f"{label:<10} {a}→{b}: Δ={r['delta']:+.3f} [{r['lo']:+.3f}, {r['hi']:+.3f}]  "
+                  f"p={r['p']:.3f}  p_perm={p_perm:.3f}")
+
     print("\nPer-query:")
-    print(df[cols].to_string(index=False, max_colwidth=60))
\ No newline at end of file
+    print(df.to_string(index=False, max_colwidth=60))
+
+def _import_one(store: RunStore, meta_path: str) -> int:
+    ids = store.import_files([meta_path])
+    if not ids:
+        raise SystemExit(f"{meta_path} is not a single-run meta (a sweep summary, or no \"mode\"); "
+                         "pass a run_eval .meta.json, a run name or a run id")
+    return ids[0]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Summaries over the eval run store")
+    ap.add_argument("runs", nargs="*", help="run names, run ids or .meta.json paths (imported first)")
+    ap.add_argument("--store", default=DEFAULT_STORE)
+    ap.add_argument("--import", dest="import_paths", nargs="+", metavar="PATH",
+                    help="import CSV + .meta.json runs (files or directories) into the store")
+    ap.add_argument("--list", action="store_true", help="list runs matching the filters")
+    ap.add_argument("--trend", metavar="METRIC", nargs="?", const="macro_recall_at_10",
+                    help="metric over time for runs matching the filters")
+    ap.add_argument("--mode")
+    ap.add_argument("--index", dest="search_index")
+    ap.add_argument("--api_version", dest="search_api_version")
+    ap.add_argument("--k_candidates", type=int)
+    ap.add_argument("--top_k", type=int)
+    ap.add_argument("--since", help="ISO timestamp lower bound")
+    ap.add_argument("--goldset", help="goldset stem, e.g. goldset_v1")
+    args = ap.parse_args(argv)
+
+    store = RunStore(args.store)
+    filters = {k: getattr(args, k) for k in ("mode", "search_index", "search_api_version",
+                                             "k_candidates", "top_k", "since", "goldset")}
+    if args.import_paths:
+        before = len(store.runs())
+        ids = store.import_files(args.import_paths)
+        print(f"{len(ids)} run(s) in {args.import_paths}, {len(store.runs()) - before} new")
+
+    # .meta.json paths are imported (idempotently) and compared as that exact run
+    refs = [_import_one(store, r) if r.endswith(".meta.json") else r for r in args.runs]
+
+    if args.list:
+        print(pd.DataFrame(store.runs(**filters)).to_string(index=False))
+    elif args.trend:
+        print(pd.DataFrame(store.trend(args.trend, **filters)).to_string(index=False))
+    elif refs:
+        compare(store, refs)
+    elif not args.import_paths:
+        ap.print_usage()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
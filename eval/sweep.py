@@ -0,0 +1,155 @@
+from __future__ import annotations
+import json, argparse, csv, itertools, pathlib, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Sequence, Set, Tuple
+from .metrics import evaluate_run, METRICS
+from .normalize import normalize_for_retrieval
+from .retrieval_modes import ModeSpec, KIND_FUNCTIONS
+from .eval_common import run_metadata, configure_search_client, SKU_QPS
+
+# Parameter sweep over kind x k_candidates x weight x top_k.
+#
+# top usually only truncates the ranked list, so each distinct (kind, k_candidates,
+# weight) is fetched once at the largest top in the grid and every smaller top_k
+# is scored on a prefix of that list. That is checked once per kind: the first
+# probe_queries queries are re-sent at the smallest top and compared with the
+# prefix. A kind whose ranking moves with top (e.g. a semantic reranker whose
+# window follows top) falls back to one fetch per top_k. Settings that cannot
+# change the ranking are collapsed before anything is sent: a vector-only request
+# has a single scorer, so its weight has no effect and only weight=1 is queried.
+
+SWEEP_FIELDS = ["kind", "mode", "k_candidates", "weight", "top_k", "n_queries"] + [f"{m}_at_k" for m in METRICS]
+
+def ranking_key(kind: str, k_candidates: int, weight: float) -> Tuple[str, int, float]:
+    """The part of a setting that decides the ranking (top_k only truncates it)."""
+    return (kind, k_candidates, 1.0 if kind == "vector" else float(weight))
+
+def plan_fetches(kinds: Sequence[str], k_candidates: Sequence[int], weights: Sequence[float],
+                 top_ks: Sequence[int]) -> List[ModeSpec]:
+    """One ModeSpec per distinct ranking, each at the largest top in the grid."""
+    max_top = max(top_ks)
+    keys = {ranking_key(kd, k, w) for kd, k, w in itertools.product(kinds, k_candidates, weights)}
+    return [ModeSpec(kind=kd, k_candidates=k, top_k=max_top, weight=w) for kd, k, w in sorted(keys)]
+
+def _fetch(specs: Sequence[ModeSpec], norms: Sequence[str], idx: Sequence[int],
+           workers: int) -> List[List[List[str]]]:
+    """preds[s][j] = specs[s] run on norms[idx[j]]."""
+    tasks = [(spec, i) for spec in specs for i in idx]
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sweep") as pool:
+        flat = list(pool.map(lambda t: t[0].run(norms[t[1]]), tasks))
+    return [flat[s * len(idx):(s + 1) * len(idx)] for s in range(len(specs))]
+
+def sweep(gold_path: str, out_csv: str, kinds: Sequence[str], k_candidates: Sequence[int],
+          weights: Sequence[float], top_ks: Sequence[int], workers: int = 1,
+          probe_queries: int = 5) -> List[Dict[str, object]]:
+    """
+    Runs the grid and writes one row per (kind, k_candidates, weight, top_k) to
+    out_csv, plus out_csv's .meta.json with the request count and, per kind,
+    whether smaller top_k were scored on prefixes. Returns the rows.
+    """
+    for kd in kinds:
+        if kd not in KIND_FUNCTIONS:
+            raise ValueError(f"unknown retrieval kind: {kd}")
+    gold = json.load(open(gold_path, "r", encoding="utf-8"))
+    items = [(obj["query"], set(obj["relevant_doc_ids"]))
+             for obj in gold.values() if obj.get("scorable", True)]
+    norms = [normalize_for_retrieval(q) for q, _ in items]
+    fetches = plan_fetches(kinds, k_candidates, weights, top_ks)
+
+    n = len(items)
+    tops = sorted(set(top_ks))
+    t0 = time.perf_counter()
+    preds = _fetch(fetches, norms, range(n), workers)
+    requests = len(fetches) * n
+
+    # does top only truncate? one probe per kind at the smallest top
+    prefix_ok: Dict[str, bool] = {}
+    probe = list(range(min(n, probe_queries)))
+    if len(tops) > 1 and probe:
+        first = {}
+        for f, spec in enumerate(fetches):
+            first.setdefault(spec.kind, f)
+        probe_specs = [replace(fetches[f], top_k=tops[0]) for f in first.values()]
+        probed = _fetch(probe_specs, norms, probe, workers)
+        requests += len(probe_specs) * len(probe)
+        for (kind, f), got in zip(first.items(), probed):
+            prefix_ok[kind] = all(list(g) == list(preds[f][i][:tops[0]]) for i, g in zip(probe, got))
+
+    # kinds whose ranking depends on top: one fetch per smaller top as well
+    separate = [replace(spec, top_k=top) for spec in fetches if not prefix_ok.get(spec.kind, True)
+                for top in tops[:-1]]
+    by_top: Dict[Tuple[Tuple[str, int, float], int], List[List[str]]] = {}
+    if separate:
+        for spec, p in zip(separate, _fetch(separate, norms, range(n), workers)):
+            by_top[(ranking_key(spec.kind, spec.k_candidates, spec.weight), spec.top_k)] = p
+        requests += len(separate) * n
+    wall_s = time.perf_counter() - t0
+
+    rel_sets: List[Set[str]] = [rel for _, rel in items]
+    rows: List[Dict[str, object]] = []
+    for f, spec in enumerate(fetches):
+        key = ranking_key(spec.kind, spec.k_candidates, spec.weight)
+        scores = evaluate_run(preds[f], rel_sets, ks=tops)   # every top_k in one pass
+        for top in tops:
+            if (key, top) in by_top:
+                sc = evaluate_run(by_top[(key, top)], rel_sets, ks=(top,))
+            else:
+                sc = scores
+            rows.append({"kind": spec.kind, "mode": spec.function_name, "k_candidates": spec.k_candidates,
+                         "weight": spec.weight, "top_k": top, "n_queries": n,
+                         **{f"{m}_at_k": float(sc[f"{m}@{top}"].mean()) if n else 0.0 for m in METRICS}})
+
+    pathlib.Path(out_csv).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_csv, "w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=SWEEP_FIELDS)
+        w.writeheader()
+        w.writerows(rows)
+
+    requested = len(set(kinds)) * len(set(k_candidates)) * len(set(weights)) * len(set(top_ks))
+    meta = run_metadata("sweep", max(k_candidates), max(top_ks))
+    meta.update({
+        "grid": {"kinds": list(kinds), "k_candidates": list(k_candidates),
+                 "weights": list(weights), "top_k": list(top_ks)},
+        "settings_requested": requested, "settings_scored": len(rows),
+        "network_passes": len(fetches) + len(separate), "requests": requests,
+        "prefix_reuse": {kd: prefix_ok.get(kd, True) for kd in dict.fromkeys(spec.kind for spec in fetches)},
+        "probe_queries": len(probe) if len(tops) > 1 else 0,
+        "workers": workers, "wall_s": round(wall_s, 3),
+    })
+    meta["notes"] = ("Parameter sweep; smaller top_k derived from one fetch at the largest top where "
+                     "prefix_reuse is true, fetched separately where it is false")
+    with open(out_csv.replace(".csv", ".meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gold", required=True)
+    ap.add_argument("--out", required=True, help="sweep table CSV")
+    ap.add_argument("--kinds", nargs="+", choices=sorted(KIND_FUNCTIONS), default=["vector", "hybrid", "semantic"])
+    ap.add_argument("--k_candidates", nargs="+", type=int, default=[50])
+    ap.add_argument("--weights", nargs="+", type=float, default=[1.0])
+    ap.add_argument("--top_k", nargs="+", type=int, default=[10])
+    ap.add_argument("--workers", type=int, default=1, help="concurrent requests")
+    ap.add_argument("--probe_queries", type=int, default=5,
+                    help="queries re-sent per kind at the smallest top to check prefix reuse")
+    ap.add_argument("--qps", type=float, default=None, help="rate limit (requests/sec) across workers")
+    ap.add_argument("--sku", choices=sorted(SKU_QPS), default=None, help="use the preset rate limit for a Search SKU")
+    args = ap.parse_args()
+
+    configure_search_client(workers=args.workers, qps=args.qps or SKU_QPS.get(args.sku))
+    rows = sweep(args.gold, args.out, args.kinds, args.k_candidates, args.weights, args.top_k,
+                 workers=args.workers, probe_queries=args.probe_queries)
+    meta = json.load(open(args.out.replace(".csv", ".meta.json"), "r", encoding="utf-8"))
+    print(f"{meta['settings_requested']} settings -> {meta['network_passes']} network passes "
+          f"({meta['requests']} requests, {meta['wall_s']}s)")
+    for kd, ok in meta["prefix_reuse"].items():
+        if not ok:
+            print(f"{kd}: ranking changes with top; each top_k was fetched separately")
+    for r in sorted(rows, key=lambda r: (-r["recall_at_k"], -r["mrr_at_k"])):
+        print(f"{r['kind']:<9} k={r['k_candidates']:<4} w={r['weight']:<4g} top={r['top_k']:<3} "
+              f"Recall@k={r['recall_at_k']:.3f}  MRR@k={r['mrr_at_k']:.3f}")
+
+if __name__ == "__main__":
+    main()
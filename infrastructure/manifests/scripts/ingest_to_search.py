@@ -0,0 +1,511 @@
+# Bulk, incremental ingestion of report.vw_membership_rag into the search index
+#
+# Replaces the portal indexer + skillset (SplitSkill -> AzureOpenAIEmbeddingSkill
+# -> index projections) with a client-side pipeline that produces the same chunk
+# documents (id, parent_id, chunk, content, chunkVector, filter fields):
+#
+#   read     forward-only cursor over the view, fetchmany(read_batch), ordered by
+#            (active_date_fk, doc_id); the next batch is fetched while the current
+#            one is embedded
+#   skip     a row whose content hash matches the state file is not re-chunked,
+#            re-embedded or re-uploaded
+#   chunk    content split into max_chars pages with overlap (the skillset's 1200/300)
+#   embed    embed_batch texts per request, `concurrency` requests in flight,
+#            limited to --rpm requests and --tpm tokens per minute (429s are
+#            retried by the OpenAI client, honouring Retry-After)
+#   upload   mergeOrUpload in batches of at most 1000 documents (and 16 MB);
+#            chunks a shrunken row no longer has are deleted in the same batch;
+#            one upload overlaps the next batch's embedding
+#   commit   hashes and the (active_date_fk, doc_id) watermark are written to the
+#            state file only after their documents are uploaded, so a crashed run
+#            resumes after the last committed batch
+#
+# Incremental runs (default) read only rows after the watermark. --full rescans the
+# whole view; unchanged rows still cost no embedding or upload, so this is the way
+# to pick up edits to older rows.
+#
+# Keys are "<doc_id>_<chunk no>", not the ones the indexer's projections generate:
+# point the pipeline at a fresh index (or one it built) and disable the indexer.
+#
+# Local stand-in mode (no Azure): --standin N generates N view rows, embeds with
+# the hashing embedder from rag_agent.local_search (with optional per-request
+# latency), and --local-out DIR writes a local index snapshot that
+# AZURE_SEARCH_BACKEND=local can serve.
+#
+#   python infrastructure/manifests/scripts/ingest_to_search.py                      # Azure, incremental
+#   python infrastructure/manifests/scripts/ingest_to_search.py --full
+#   python infrastructure/manifests/scripts/ingest_to_search.py --standin 20000 --local-out data/search_index
+
+from __future__ import annotations
+import argparse, asyncio, hashlib, json, os, random, sqlite3, sys, time, zlib
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+VIEW = "report.vw_membership_rag"
+FILTER_FIELDS = ("membership_status_original", "membership_type_original", "special_pricing_reason")
+MAX_UPLOAD_DOCS = 1000                      # Azure AI Search limit per index request
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024         # ... and per request payload
+RETRY_STATUSES = {429, 503}
+
+Watermark = Tuple[int, str]                 # (active_date_fk or 0, doc_id)
+
+# ---- rows -> documents ----
+def content_hash(row: Dict[str, Any]) -> str:
+    """Everything that ends up in the row's documents."""
+    parts = [str(row.get("content") or "")] + [str(row.get(f) or "") for f in FILTER_FIELDS]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def chunk_text(text: str, max_chars: int = 1200, overlap: int = 300) -> List[str]:
+    """Pages of at most max_chars, each starting `overlap` characters before the previous end."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return [text] if text else []
+    out, start = [], 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            cut = text.rfind(" ", start + 1, end)
+            end = cut if cut > start + overlap else end
+        out.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        if text[start - 1] != " ":
+            nxt = text.find(" ", start, end)
+            start = nxt + 1 if nxt != -1 else start
+    return out
+
+def chunk_id(doc_id: str, i: int) -> str:
+    return f"{doc_id}_{i}"
+
+def row_key(row: Dict[str, Any]) -> Watermark:
+    return int(row.get("active_date_fk") or 0), str(row["doc_id"])
+
+# ---- state: content hashes + watermark ----
+class IngestState:
+    """
+    SQLite file with one (hash, chunk count) per source row and the watermark,
+    both per target index, so several targets can share a file.
+    """
+
+    def __init__(self, path: str, target: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.target = target
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS docs(target TEXT, doc_id TEXT, hash TEXT, n_chunks INTEGER,
+                                        PRIMARY KEY (target, doc_id));
+        CREATE TABLE IF NOT EXISTS watermark(target TEXT PRIMARY KEY, active_date_fk INTEGER, doc_id TEXT,
+                                             updated_utc TEXT);
+        """)
+
+    def watermark(self) -> Optional[Watermark]:
+        r = self.conn.execute("SELECT active_date_fk, doc_id FROM watermark WHERE target = ?",
+                              (self.target,)).fetchone()
+        return (int(r[0]), str(r[1])) if r else None
+
+    def lookup(self, doc_ids: Sequence[str]) -> Dict[str, Tuple[str, int]]:
+        out: Dict[str, Tuple[str, int]] = {}
+        for s in range(0, len(doc_ids), 500):
+            part = list(doc_ids[s:s + 500])
+            q = f"SELECT doc_id, hash, n_chunks FROM docs WHERE target = ? AND doc_id IN ({','.join('?' * len(part))})"
+            out.update({d: (h, n) for d, h, n in self.conn.execute(q, [self.target, *part])})
+        return out
+
+    def commit(self, rows: List[Tuple[str, str, int]], wm: Optional[Watermark]) -> None:
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO docs VALUES (?,?,?,?)",
+                                  [(self.target, d, h, n) for d, h, n in rows])
+            if wm is not None:
+                self.conn.execute("INSERT OR REPLACE INTO watermark VALUES (?,?,?,?)",
+                                  (self.target, wm[0], wm[1], time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())))
+
+    def reset(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM docs WHERE target = ?", (self.target,))
+            self.conn.execute("DELETE FROM watermark WHERE target = ?", (self.target,))
+
+    def close(self) -> None:
+        self.conn.close()
+
+# ---- sources ----
+_COLUMNS = ("doc_id", "active_date_fk", "content") + FILTER_FIELDS
+
+class SqlViewSource:
+    """Streams the view after a watermark; rows arrive in watermark order."""
+
+    def __init__(self, sql: Any = None):
+        if sql is None:
+            from rag_agent.sql_client import AzureSQL
+            sql = AzureSQL()
+        self.sql = sql
+
+    def batches(self, after: Optional[Watermark], size: int) -> Iterator[List[Dict[str, Any]]]:
+        where, params = "", []
+        if after is not None:
+            where = "WHERE ISNULL(active_date_fk, 0) > ? OR (ISNULL(active_date_fk, 0) = ? AND doc_id > ?)"
+            params = [after[0], after[0], after[1]]
+        q = (f"SELECT {', '.join(_COLUMNS)} FROM {VIEW} {where} "
+             f"ORDER BY ISNULL(active_date_fk, 0), doc_id")
+        # one pooled connection held for the scan; fetchmany keeps memory at one batch
+        with self.sql.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(q, params)
+                cols = [c[0] for c in cur.description]
+                while True:
+                    rows = cur.fetchmany(size)
+                    if not rows:
+                        return
+                    yield [dict(zip(cols, r)) for r in rows]
+            finally:
+                cur.close()
+
+class StandInSource:
+    """
+    Deterministic view-shaped rows: row i is the same in every run with the same
+    seed and dates grow with i (rows_per_day rows a day from 2024-01-01), so a
+    larger n_rows adds rows after the watermark. Rows with i % 50 == 0 depend on
+    `revision` too, to exercise change detection on --full runs.
+    """
+
+    GRADES = ["Applicant", "Member", "Fellow", "Retired Member", "TechCIOB", "Educator Pathway"]
+    HUBS = [("United Kingdom", "London"), ("United Kingdom", "Bristol"), ("United Kingdom", "Leeds"),
+            ("United Kingdom", "Glasgow"), ("United Arab Emirates", "Dubai"), ("Hong Kong", "Hong Kong")]
+    STATUSES = ["Active", "Active", "Active", "Resigned", "Deceased", "Lapsed"]
+    TYPES = ["Join", "Upgrade", "Renewal", "Renewal", "Rejoin"]
+    PRICING = ["", "", "", "Student", "Concession", "Early Career"]
+
+    def __init__(self, n_rows: int, seed: int = 7, revision: int = 0, rows_per_day: int = 25):
+        self.n_rows = n_rows
+        self.rows_per_day = rows_per_day
+        self.seed = seed
+        self.revision = revision
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        h = zlib.crc32(f"{self.seed}:{i}".encode())
+        v = zlib.crc32(f"{self.seed}:{i}:{self.revision if i % 50 == 0 else 0}".encode())
+        d = date(2024, 1, 1) + timedelta(days=i // self.rows_per_day)
+        active_fk = int(d.strftime("%Y%m%d"))
+        grade = self.GRADES[(h >> 8) % len(self.GRADES)]
+        country, hub = self.HUBS[(h >> 12) % len(self.HUBS)]
+        status = self.STATUSES[v % len(self.STATUSES)]
+        mtype = self.TYPES[(v >> 4) % len(self.TYPES)]
+        member = 100000 + i
+        content = (f"Member M{member} Member {member}. Grade: {grade}. Hub: {country}/{hub}. "
+                   f"Status: {status} {mtype}. Active: {d.isoformat()} End: {(d + timedelta(days=365)).isoformat()}.")
+        return {"doc_id": f"{member}-{active_fk}-{1 + (h >> 8) % len(self.GRADES)}", "active_date_fk": active_fk,
+                "content": content, "membership_status_original": status, "membership_type_original": mtype,
+                "special_pricing_reason": self.PRICING[(h >> 16) % len(self.PRICING)] or None}
+
+    def batches(self, after: Optional[Watermark], size: int) -> Iterator[List[Dict[str, Any]]]:
+        rows = sorted((self._row(i) for i in range(self.n_rows)), key=row_key)
+        if after is not None:
+            rows = [r for r in rows if row_key(r) > after]
+        for s in range(0, len(rows), size):
+            yield rows[s:s + size]
+
+# ---- embedding ----
+class AsyncRateLimiter:
+    """Requests and tokens per minute, as token buckets refilled continuously."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.limits = [(b, (b or 0.0) / 60.0) for b in (rpm, tpm)]
+        self._level = [b or 0.0 for b in (rpm, tpm)]
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        async with self._lock:       # FIFO: one waiter at a time drains the buckets
+            need = (1.0, float(tokens))
+            while True:
+                now = time.monotonic()
+                waits = []
+                for i, ((cap, rate), n) in enumerate(zip(self.limits, need)):
+                    if not cap:
+                        continue
+                    self._level[i] = min(cap, self._level[i] + (now - self._last) * rate)
+                    # a single request bigger than the bucket waits for a full bucket
+                    waits.append(max(0.0, (min(n, cap) - self._level[i]) / rate))
+                self._last = now
+                wait = max(waits, default=0.0)
+                if wait <= 0:
+                    for i, ((cap, _), n) in enumerate(zip(self.limits, need)):
+                        if cap:
+                            self._level[i] -= min(n, cap)
+                    return
+                await asyncio.sleep(wait)
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+class AzureEmbedder:
+    def __init__(self, dims: int = 1536, max_retries: int = 8):
+        from openai import AsyncAzureOpenAI      # heavy; only when embedding against Azure
+        from rag_agent.config import get_settings
+        s = get_settings().openai
+        self.client = AsyncAzureOpenAI(api_key=s.api_key, api_version=s.api_version, azure_endpoint=s.endpoint,
+                                       max_retries=max_retries)
+        self.deployment = s.embedding_deployment
+        self.dims = dims
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        resp = await self.client.embeddings.create(model=self.deployment, input=texts, dimensions=self.dims)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+class StandInEmbedder:
+    """The local index's hashing embedder behind a simulated per-request latency."""
+
+    def __init__(self, dims: int = 384, latency_s: float = 0.0):
+        from rag_agent.local_search import HashingEmbedder
+        self.embedder = HashingEmbedder(dims)
+        self.latency_s = latency_s
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self.embedder.embed(texts).tolist()
+
+# ---- sinks ----
+class AzureIndexSink:
+    """mergeOrUpload / delete through the index's docs/index endpoint."""
+
+    def __init__(self, max_retries: int = 5, backoff_s: float = 1.0):
+        from rag_agent.search_client import AzureAISearch
+        self.search = AzureAISearch()
+        self.url = (f"{self.search.endpoint}/indexes/{self.search.index}/docs/index"
+                    f"?api-version={self.search.api_version}")
+        self.target = f"azure:{self.search.endpoint}/{self.search.index}"
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.requests = 0
+
+    def _post(self, parts: List[bytes]) -> List[str]:
+        """One request; returns the keys that failed after retries."""
+        body = b'{"value":[' + b",".join(parts) + b"]}"
+        for attempt in range(self.max_retries + 1):
+            self.requests += 1
+            r = self.search.session.post(self.url, data=body, timeout=120)
+            if r.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(self.backoff_s * (2 ** attempt) * (1 + random.random() * 0.25))
+                continue
+            if r.status_code not in (200, 207):
+                r.raise_for_status()
+            failed = [v["key"] for v in r.json().get("value", []) if not v.get("status")]
+            if not failed or attempt == self.max_retries:
+                return failed
+            # 207: resend only the documents that failed (usually throttled)
+            keep = set(failed)
+            parts = [p for p in parts if json.loads(p)["id"] in keep]
+            body = b'{"value":[' + b",".join(parts) + b"]}"
+            time.sleep(self.backoff_s * (2 ** attempt))
+        return []
+
+    def upload(self, actions: List[Dict[str, Any]]) -> None:
+        parts = [json.dumps(a, separators=(",", ":")).encode("utf-8") for a in actions]
+        batch: List[bytes] = []
+        size = 0
+        failed: List[str] = []
+        for p in parts:
+            if batch and (len(batch) >= MAX_UPLOAD_DOCS or size + len(p) + 64 > MAX_UPLOAD_BYTES):
+                failed += self._post(batch)
+                batch, size = [], 0
+            batch.append(p)
+            size += len(p) + 1
+        if batch:
+            failed += self._post(batch)
+        if failed:
+            raise RuntimeError(f"{len(failed)} documents failed to index, e.g. {failed[:5]}")
+
+    def close(self) -> None:
+        return None
+
+class LocalIndexSink:
+    """
+    Collects documents and (re)builds a LocalSearchIndex in `out_dir` on close.
+    The local index embeds chunks itself with the same hashing embedder, so
+    vectors are not stored.
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.target = f"local:{os.path.abspath(out_dir)}"
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.requests = 0
+        self.dirty = False
+        path = os.path.join(out_dir, "docs.jsonl")
+        if os.path.exists(path):
+            from rag_agent.local_search import docs_from_jsonl
+            self.docs = {d["id"]: d for d in docs_from_jsonl(path)}
+
+    def upload(self, actions: List[Dict[str, Any]]) -> None:
+        for s in range(0, len(actions), MAX_UPLOAD_DOCS):
+            self.requests += 1
+            self.dirty = True
+            for a in actions[s:s + MAX_UPLOAD_DOCS]:
+                if a["@search.action"] == "delete":
+                    self.docs.pop(a["id"], None)
+                else:
+                    self.docs[a["id"]] = {k: v for k, v in a.items() if k not in ("@search.action", "chunkVector")}
+
+    def close(self) -> None:
+        if not self.dirty:
+            return
+        from rag_agent.local_search import HashingEmbedder, LocalSearchIndex
+        LocalSearchIndex.build(self.docs.values(), self.out_dir, HashingEmbedder())
+
+# ---- pipeline ----
+@dataclass
+class IngestStats:
+    rows_read: int = 0
+    rows_unchanged: int = 0
+    rows_changed: int = 0
+    chunks_embedded: int = 0
+    embed_requests: int = 0
+    docs_uploaded: int = 0
+    docs_deleted: int = 0
+    seconds: float = 0.0
+    stage_s: Dict[str, float] = field(default_factory=lambda: {"read": 0.0, "embed": 0.0, "upload": 0.0})
+
+    def report(self) -> str:
+        s = max(self.seconds, 1e-9)
+        return (f"{self.rows_read} rows read ({self.rows_read / s:,.0f}/s), {self.rows_unchanged} unchanged, "
+                f"{self.rows_changed} new or changed; {self.chunks_embedded} chunks embedded in "
+                f"{self.embed_requests} requests; {self.docs_uploaded} docs uploaded "
+                f"({self.docs_uploaded / s:,.1f} docs/s), {self.docs_deleted} deleted; {self.seconds:.1f}s "
+                f"(busy: read {self.stage_s['read']:.1f}s, embed {self.stage_s['embed']:.1f}s, "
+                f"upload {self.stage_s['upload']:.1f}s)")
+
+async def ingest(source: Any, embedder: Any, sink: Any, state: IngestState, *, full: bool = False,
+                 read_batch: int = 500, embed_batch: int = 64, upload_batch: int = MAX_UPLOAD_DOCS,
+                 concurrency: int = 4, limiter: Optional[AsyncRateLimiter] = None,
+                 max_chars: int = 1200, overlap: int = 300) -> IngestStats:
+    upload_batch = min(upload_batch, MAX_UPLOAD_DOCS)
+    stats = IngestStats()
+    t_start = time.perf_counter()
+    sem = asyncio.Semaphore(concurrency)
+    limiter = limiter or AsyncRateLimiter()
+
+    async def embed_one(texts: List[str]) -> List[List[float]]:
+        async with sem:
+            await limiter.acquire(sum(estimate_tokens(t) for t in texts))
+            stats.embed_requests += 1
+            return await embedder.aembed(texts)
+
+    async def read_next(it: Iterator[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        t0 = time.perf_counter()
+        rows = await asyncio.to_thread(next, it, None)
+        stats.stage_s["read"] += time.perf_counter() - t0
+        return rows
+
+    async def flush(actions: List[Dict[str, Any]], commits: List[Tuple[str, str, int]],
+                    wm: Optional[Watermark]) -> None:
+        t0 = time.perf_counter()
+        for s in range(0, len(actions), upload_batch):
+            await asyncio.to_thread(sink.upload, actions[s:s + upload_batch])
+        stats.stage_s["upload"] += time.perf_counter() - t0
+        stats.docs_uploaded += sum(a["@search.action"] != "delete" for a in actions)
+        stats.docs_deleted += sum(a["@search.action"] == "delete" for a in actions)
+        state.commit(commits, wm)
+
+    batches = source.batches(None if full else state.watermark(), read_batch)
+    next_rows = asyncio.ensure_future(read_next(batches))
+    pending: Optional[asyncio.Future] = None
+    actions: List[Dict[str, Any]] = []
+    commits: List[Tuple[str, str, int]] = []
+    wm: Optional[Watermark] = None
+    try:
+        while True:
+            rows = await next_rows
+            if not rows:
+                break
+            next_rows = asyncio.ensure_future(read_next(batches))    # prefetch while this batch embeds
+            stats.rows_read += len(rows)
+            known = state.lookup([str(r["doc_id"]) for r in rows])
+            docs: List[Dict[str, Any]] = []
+            for r in rows:
+                doc_id, h = str(r["doc_id"]), content_hash(r)
+                old = known.get(doc_id)
+                if old is not None and old[0] == h:
+                    stats.rows_unchanged += 1
+                    continue
+                stats.rows_changed += 1
+                chunks = chunk_text(str(r.get("content") or ""), max_chars, overlap)
+                meta = {f: r.get(f) for f in FILTER_FIELDS}
+                docs += [{"@search.action": "mergeOrUpload", "id": chunk_id(doc_id, i), "parent_id": doc_id,
+                          "chunk": c, "content": r.get("content"), **meta} for i, c in enumerate(chunks)]
+                stale = range(len(chunks), old[1] if old is not None else 0)     # the row got shorter
+                actions += [{"@search.action": "delete", "id": chunk_id(doc_id, i)} for i in stale]
+                commits.append((doc_id, h, len(chunks)))
+            wm = row_key(rows[-1])
+
+            if docs:
+                t0 = time.perf_counter()
+                groups = [docs[s:s + embed_batch] for s in range(0, len(docs), embed_batch)]
+                vectors = await asyncio.gather(*(embed_one([d["chunk"] for d in g]) for g in groups))
+                stats.stage_s["embed"] += time.perf_counter() - t0
+                for g, vs in zip(groups, vectors):
+                    for d, v in zip(g, vs):
+                        d["chunkVector"] = v
+                stats.chunks_embedded += len(docs)
+                actions += docs
+
+            if len(actions) >= upload_batch:
+                if pending is not None:
+                    await pending                  # keeps commits (and the watermark) in order
+                pending = asyncio.ensure_future(flush(actions, commits, wm))
+                actions, commits = [], []
+        if pending is not None:
+            await pending
+        await flush(actions, commits, wm)
+    finally:
+        next_rows.cancel()
+    await asyncio.to_thread(sink.close)
+    stats.seconds = time.perf_counter() - t_start
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=f"Chunk, embed and upload {VIEW} to the search index")
+    ap.add_argument("--full", action="store_true", help="rescan the whole view (unchanged rows are still skipped)")
+    ap.add_argument("--reset", action="store_true", help="forget hashes and watermark for this target first")
+    ap.add_argument("--state", default="data/ingest_state.sqlite", help="hash + watermark file")
+    ap.add_argument("--read-batch", type=int, default=500, help="rows per fetchmany")
+    ap.add_argument("--embed-batch", type=int, default=64, help="texts per embedding request")
+    ap.add_argument("--upload-batch", type=int, default=MAX_UPLOAD_DOCS, help="documents per index request (<= 1000)")
+    ap.add_argument("--concurrency", type=int, default=4, help="embedding requests in flight")
+    ap.add_argument("--rpm", type=float, default=None, help="embedding requests per minute")
+    ap.add_argument("--tpm", type=float, default=None, help="embedding tokens per minute")
+    ap.add_argument("--max-chars", type=int, default=1200)
+    ap.add_argument("--overlap", type=int, default=300)
+    ap.add_argument("--dims", type=int, default=1536, help="embedding dimensions (the index's chunkVector)")
+    ap.add_argument("--standin", type=int, metavar="N", help="generate N rows and embed locally (no Azure)")
+    ap.add_argument("--revision", type=int, default=0, help="stand-in rows revision (changes every 50th row)")
+    ap.add_argument("--embed-latency", type=float, default=0.0, help="stand-in seconds per embedding request")
+    ap.add_argument("--local-out", metavar="DIR", help="write a local index snapshot instead of uploading")
+    args = ap.parse_args(argv)
+
+    if args.standin is not None:
+        source: Any = StandInSource(args.standin, revision=args.revision)
+        embedder: Any = StandInEmbedder(latency_s=args.embed_latency)
+    else:
+        source, embedder = SqlViewSource(), AzureEmbedder(args.dims)
+    sink: Any = LocalIndexSink(args.local_out) if args.local_out else AzureIndexSink()
+    state = IngestState(args.state, sink.target)
+    if args.reset:
+        state.reset()
+    print(f"{'full' if args.full else 'incremental'} ingest -> {sink.target} (watermark {state.watermark()})")
+    try:
+        stats = asyncio.run(ingest(
+            source, embedder, sink, state, full=args.full, read_batch=args.read_batch,
+            embed_batch=args.embed_batch, upload_batch=args.upload_batch, concurrency=args.concurrency,
+            limiter=AsyncRateLimiter(args.rpm, args.tpm), max_chars=args.max_chars, overlap=args.overlap))
+    finally:
+        state.close()
+    print(stats.report())
+    print(f"index requests: {sink.requests}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,610 @@
+# Seeded, vectorised synthetic data generator for the membership warehouse
+#
+# Python port of data/sql/02_generate_synthetic_data_v7_2.sql (dim_date, the
+# reference dims, dim_member and fact_membership admissions / upgrades /
+# rejoins) with the same distributions:
+#
+#   daily plan   round(base * month weight * weekday weight * U(0.8, 1.2)) joins a
+#                day, base 20 on weekdays and 6 at weekends, times --scale
+#   joins        grade .40/.35/.05/.05/.10/.05, hub by country weight, 25% on an
+#                organisation, age buckets 22-24 .. 65-79, 2% deceased, 5% resigned,
+#                special pricing 5% concession / 3% maternity / 4% academic
+#   upgrades     10% of joins with a next grade, 15 days after the start up to 10
+#                days before expiry
+#   rejoins      5% of joins, drawn from the resigned, 7-66 days after the start
+#
+# Rows are drawn with one numpy Generator (--seed), a block of days at a time
+# (about --block-rows joins per block), so memory stays flat and the default
+# window at --scale 1000 gives ~13M fact_membership rows. Pass --end for a run
+# that is reproducible across days (the SQL script uses today).
+#
+# Not generated: fact_invoice, fact_payment and fact_renewal, and the dim/fact
+# columns the SQL script leaves NULL.
+#
+# Outputs
+#   --sqlite PATH     plain tables (dim_date, ..., fact_membership); ATTACH the file
+#                     as `report` and build_kpi_sql runs against it (see
+#                     StandInWarehouse(report_path=...))
+#   --parquet DIR     DIR/<table>/part-NNNNN.parquet, one part per block
+#                     (needs pyarrow or fastparquet)
+#   --azure           dwh.* via pyodbc fast_executemany in --commit-rows chunks;
+#                     appends after the current max ids, and like the SQL script
+#                     skips a window already in dwh.__synthetic_run
+#
+#   python infrastructure/manifests/scripts/seed_db.py --sqlite data/warehouse.sqlite --end 2025-10-30
+#   python infrastructure/manifests/scripts/seed_db.py --parquet data/warehouse --scale 1000
+#   python infrastructure/manifests/scripts/seed_db.py --azure
+
+from __future__ import annotations
+import argparse, os, sqlite3, sys, time
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+# ---- parameters (02_generate_synthetic_data_v7_2.sql, sections 3-4) ----
+BASE_WEEKDAY, BASE_WEEKEND = 20, 6
+CURRENCY_FK = 5
+MONTH_WEIGHT = np.array([1.30, 1.15, 1.10, 1.00, 0.95, 0.90, 0.85, 0.90, 1.20, 1.10, 1.00, 0.60])
+DOW_WEIGHT = np.array([1.00, 1.05, 1.05, 1.05, 1.00, 0.60, 0.50])       # ISO weekday Mon..Sun
+
+# reference dims in seed order; ids are positions (1-based)
+GRADES = [
+    # grade_name, grade_type, paying, employed, student, status, grade_display,
+    # reporting_category, membership_category, parent_grade_name, performance_grade
+    ("Applicant", "Non Chartered", "1", "1", "0", "Current", "Applicant", "Applicant", "Applicant", "Applicant", "Other"),
+    ("Member", "Chartered", "1", "1", "0", "Current", "Member", "Member", "Chartered", "Member", "Other"),
+    ("Fellow", "Chartered", "1", "1", "0", "Current", "Fellow", "Fellow", "Chartered", "Fellow", "Other"),
+    ("Retired Member", "Chartered", "1", "0", "0", "Current", "Retired Member", "Retired Member", "Chartered",
+     "Member", "Non-Targeted Grades"),
+    ("TechCIOB", "Non Chartered", "1", "1", "0", "Current", "Technical", "Technical", "Technical", "Technical", "Other"),
+    ("Educator Pathway", "Non Chartered", "1", "1", "0", "Current", "Applicant", "Applicant", "Applicant", "Applicant",
+     "Other"),
+]
+GRADE_COLUMNS = ["grade_name", "grade_type", "paying", "employed", "student", "status", "grade_display",
+                 "reporting_category", "membership_category", "parent_grade_name", "performance_grade"]
+GRADE_WEIGHT = np.array([0.40, 0.35, 0.05, 0.05, 0.10, 0.05])
+NEXT_GRADE = np.array([0, 2, 3, 0, 0, 2, 2])          # by grade id: Applicant/TechCIOB/Educator -> Member -> Fellow
+
+HUBS = [
+    # local_hub, area_hub_id, area_hub_name, regional_group, regional_hub, super_region, country_name,
+    # economic_region, europe_international, status, state, region_code
+    ("London", 2, "North", "UK North", "Europe", "Europe", "United Kingdom", "United Kingdom", "Europe",
+     "Active", "Active", "EUR"),
+    ("New York", 91, "Americas", "New York", "Americas", "Americas", "United States", "Americas", "International",
+     "Active", "Active", "AMS"),
+    ("Toronto", 91, "Americas", "Toronto", "Americas", "Americas", "Canada", "Americas", "International",
+     "Active", "Active", "AMS"),
+    ("Beijing", 92, "China", "Beijing", "Asia", "Asia", "China", "China", "International", "Active", "Active", "ASIA"),
+    ("Shanghai", 92, "China", "Shanghai", "Asia", "Asia", "China", "China", "International", "Active", "Active", "ASIA"),
+    ("Kuala Lumpur", 92, "Malaysia", "Kuala Lumpur", "Asia", "Asia", "Malaysia", "Malaysia", "International",
+     "Active", "Active", "ASIA"),
+]
+HUB_COLUMNS = ["local_hub", "area_hub_id", "area_hub_name", "regional_group", "regional_hub", "super_region",
+               "country_name", "economic_region", "europe_international", "status", "state", "region_code"]
+COUNTRY_WEIGHT = {"United Kingdom": 0.45, "United States": 0.20, "Canada": 0.10, "China": 0.15, "Malaysia": 0.10}
+HUB_WEIGHT = np.array([COUNTRY_WEIGHT[h[6]] for h in HUBS])
+HUB_WEIGHT = HUB_WEIGHT / HUB_WEIGHT.sum()
+
+PRODUCTS = [
+    # product_name, product_number, vat_rate, base price
+    ("Applicants", "MEM-1001", "8-0% (STD)", 120), ("Members", "MEM-1011", "E-0% (XPT)", 335),
+    ("Fellows", "MEM-1009", "8-0% (STD)", 450), ("TechCIOB", "MEM-1010", "8-0% (STD)", 200),
+    ("Retired Member", "MEM-1012", "2-0% (OOS)", 198), ("Educator Pathway", "MEM-1007", "8-0% (STD)", 250),
+]
+GRADE_PRODUCT = np.array([0, 1, 2, 3, 5, 4, 6])      # by grade id
+PRICE = np.array([0.0] + [p[3] for p in PRODUCTS])   # by product id
+
+ORGANISATIONS = [
+    # organisation_name, address_city, address_postalcode, local_hub, regional_hub
+    ("TAYLOR WHIMPY", "LONDON", "TW3 4GA", "N&E Yorkshire & Humber", "Europe (Regional Hub)"),
+    ("BARRATS", "BIRMINGHAM", "TW3 HDS", "Doha", "Middle East & North Africa (Regional Hub)"),
+]
+ORG_SHARE = 0.25
+
+FIRST_NAMES = np.array(["Alex", "Sam", "Jordan", "Priya", "Chen", "Maria", "Fatima", "Liam", "Noah", "Emma", "Ava",
+                        "Olivia"])
+LAST_NAMES = np.array(["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Wilson",
+                       "Taylor", "Anderson", "Thompson"])
+AGE_CUTS = [0.05, 0.25, 0.55, 0.80, 0.95]                  # -> 22-24, 25-34, 35-44, 45-54, 55-64, 65-79
+AGE_LOW, AGE_SPAN = np.array([22, 25, 35, 45, 55, 65]), np.array([3, 10, 10, 10, 10, 15])
+STATUS_LABELS = np.array(["Deceased", "Resigned", "Active"])       # r < .02, < .07, else
+PRICING_LABELS = np.array(["concession", "maternity", "academic", "standard"])   # r < .05, < .08, < .12, else
+UPGRADE_SHARE, REJOIN_SHARE = 0.10, 0.05
+
+SEEDED_TABLES = ["dim_date", "dim_grade", "dim_hub", "dim_product", "dim_organisation", "dim_member",
+                 "fact_membership"]
+
+# ---- vectorised date helpers (datetime64[D] in, arrays out) ----
+def ymd(d: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    months = d.astype("M8[M]")
+    y = months.astype("M8[Y]").astype(np.int64) + 1970
+    m = months.astype(np.int64) % 12 + 1
+    day = (d - months.astype("M8[D]")).astype(np.int64) + 1
+    return y, m, day
+
+def date_fk(d: np.ndarray) -> np.ndarray:
+    y, m, day = ymd(d)
+    return y * 10000 + m * 100 + day
+
+def month_start(d: np.ndarray) -> np.ndarray:
+    return d.astype("M8[M]").astype("M8[D]")
+
+def year_end(d: np.ndarray) -> np.ndarray:
+    return (d.astype("M8[Y]") + 1).astype("M8[D]") - 1
+
+def add_months(d: np.ndarray, months: np.ndarray | int) -> np.ndarray:
+    """DATEADD(month/year, ...): keeps the day, clamped to the target month's last day."""
+    target = d.astype("M8[M]") + months
+    last_day = ((target + 1).astype("M8[D]") - target.astype("M8[D]")).astype(np.int64) - 1
+    offset = np.minimum((d - d.astype("M8[M]").astype("M8[D]")).astype(np.int64), last_day)
+    return target.astype("M8[D]") + offset
+
+def iso_weekday(d: np.ndarray) -> np.ndarray:
+    return (d.astype(np.int64) + 3) % 7 + 1        # 1970-01-01 was a Thursday
+
+# ---- vectorised value helpers ----
+_HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_DASHES = (8, 13, 18, 23)
+
+def uuid4s(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n random version-4 UUID strings."""
+    b = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    b[:, 6] = (b[:, 6] & 0x0F) | 0x40
+    b[:, 8] = (b[:, 8] & 0x3F) | 0x80
+    hexed = np.empty((n, 32), dtype=np.uint8)
+    hexed[:, 0::2], hexed[:, 1::2] = _HEX[b >> 4], _HEX[b & 0x0F]
+    out = np.full((n, 36), ord("-"), dtype=np.uint8)
+    keep = np.setdiff1d(np.arange(36), _DASHES)
+    out[:, keep] = hexed
+    return out.view("S36").ravel().astype(str)
+
+def age_group(age: np.ndarray) -> np.ndarray:
+    return np.select([(age >= 25) & (age <= 34), (age >= 35) & (age <= 44), (age >= 45) & (age <= 54),
+                      (age >= 55) & (age <= 64), age >= 65],
+                     ["25 to 34", "35 to 44", "45 to 54", "55 to 64", "65 and over"], "18 to 24")
+
+def generation(age: np.ndarray) -> np.ndarray:
+    return np.select([age >= 56, age >= 41, age >= 25], ["baby boomers", "gen x", "gen y"], "gen z")
+
+def nullable(values: np.ndarray, mask: np.ndarray) -> pd.Series:
+    """Integer column with NULL where mask is False."""
+    return pd.Series(pd.array(np.where(mask, values, 0), dtype="Int64")).mask(~mask)
+
+# ---- reference dims ----
+def dim_date(start: date, end: date, today: date) -> pd.DataFrame:
+    d = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    y, m, day = ymd(d)
+    t = np.datetime64(today)
+    ty, tm, _ = ymd(np.array([t]))
+    sunday = (d.astype(np.int64) + 4) % 7                 # Sunday=0 .. Saturday=6 (SET DATEFIRST 7)
+    jan1 = d.astype("M8[Y]").astype("M8[D]")
+    eom = (d.astype("M8[M]") + 1).astype("M8[D]") - 1
+    month_name = pd.to_datetime(d).month_name().to_numpy()
+    mth = np.array([s[:3] for s in month_name])
+    return pd.DataFrame({
+        "date_id": date_fk(d).astype(str),
+        "date": pd.to_datetime(d),
+        "year": y, "month_no": m, "month_name": month_name, "mth": mth,
+        "mth_year": np.char.add(np.char.add(mth, "-"), np.char.zfill((y % 100).astype(str), 2)),
+        "mth_year_no": y * 100 + m, "day": day,
+        "weekday_no": iso_weekday(d), "weekday_name": pd.to_datetime(d).day_name().to_numpy(),
+        "quarter": (m - 1) // 3 + 1,
+        "years_from_today": ty[0] - y,
+        "months_from_today": (ty[0] - y) * 12 + tm[0] - m,
+        "weeks_from_today": ((t - ((t.astype(np.int64) + 4) % 7)) - (d - sunday)).astype(np.int64) // 7,
+        "days_from_today": (t - d).astype(np.int64),
+        "week_no": ((d - jan1).astype(np.int64) + (jan1.astype(np.int64) + 4) % 7) // 7 + 1,
+        "weekend_date": pd.to_datetime(d + (7 - sunday)),
+        "past_date": (d < t).astype(np.int64),
+        "renewal_month_sort": m, "is_completed_month": 0,
+        "end_of_month": pd.to_datetime(eom), "is_end_of_month": (d == eom).astype(np.int64),
+        "qtr_year": np.char.add(np.char.add("Q", ((m - 1) // 3 + 1).astype(str)), np.char.add("-", y.astype(str))),
+    })
+
+def reference_dims(rng: np.random.Generator) -> Dict[str, Tuple[pd.DataFrame, str]]:
+    """Each reference dim with the natural key writers match existing rows on."""
+    grade = pd.DataFrame(GRADES, columns=GRADE_COLUMNS)
+    grade.insert(0, "grade_id", uuid4s(rng, len(grade)))
+    hub = pd.DataFrame(HUBS, columns=HUB_COLUMNS)
+    hub.insert(0, "local_hub_id", uuid4s(rng, len(hub)))
+    product = pd.DataFrame({
+        "product_id": uuid4s(rng, len(PRODUCTS)),
+        "product_name": [p[0] for p in PRODUCTS], "product_number": [p[1] for p in PRODUCTS],
+        "product_type": "Sales Inventory", "vat_rate": [p[2] for p in PRODUCTS], "state": "Active"})
+    org = pd.DataFrame(ORGANISATIONS, columns=["organisation_name", "address_city", "address_postalcode",
+                                               "local_hub", "regional_hub"])
+    org.insert(0, "organisation_id", uuid4s(rng, len(org)))
+    org = org.assign(cbc_type="None", is_study_centre="FALSE", is_exam_centre="FALSE", address_country="United Kingdom",
+                     currency="British Pound", state="Inactive", status="Inactive", owner="# BLC App Services")
+    return {"dim_grade": (grade, "grade_name"), "dim_hub": (hub, "local_hub"),
+            "dim_product": (product, "product_name"), "dim_organisation": (org, "organisation_name")}
+
+def daily_plan(rng: np.random.Generator, start: date, end: date, scale: float) -> Tuple[np.ndarray, np.ndarray]:
+    d = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    _, m, _ = ymd(d)
+    wd = iso_weekday(d)
+    base = np.where(wd >= 6, BASE_WEEKEND, BASE_WEEKDAY) * scale
+    target = base * MONTH_WEIGHT[m - 1] * DOW_WEIGHT[wd - 1] * rng.uniform(0.8, 1.2, size=len(d))
+    return d, np.floor(target + 0.5).astype(np.int64)    # ROUND(x, 0): half away from zero
+
+def day_blocks(counts: np.ndarray, block_rows: int) -> Iterator[slice]:
+    """Consecutive day ranges holding about block_rows joins each."""
+    lo, acc = 0, 0
+    for i, c in enumerate(counts):
+        acc += c
+        if acc >= block_rows:
+            yield slice(lo, i + 1)
+            lo, acc = i + 1, 0
+    if lo < len(counts):
+        yield slice(lo, len(counts))
+
+# ---- one block of members and facts ----
+class Block:
+    """Joins for a range of days, the members behind them and the facts they produce."""
+
+    def __init__(self, rng: np.random.Generator, days: np.ndarray, counts: np.ndarray, end: np.datetime64,
+                 ids: Dict[str, np.ndarray], member_id: int, member_no: int, membership_sk: int):
+        n = int(counts.sum())
+        self.n = n
+        start = np.repeat(days, counts)
+        grade = rng.choice(len(GRADES), size=n, p=GRADE_WEIGHT) + 1
+        hub = rng.choice(len(HUBS), size=n, p=HUB_WEIGHT) + 1
+        product = GRADE_PRODUCT[grade]
+        bucket = np.searchsorted(AGE_CUTS, rng.random(n), side="right")
+        age = AGE_LOW[bucket] + rng.integers(0, AGE_SPAN[bucket])
+        dob = add_months(start, -12 * age)
+        first, last = FIRST_NAMES[rng.integers(0, 12, n)], LAST_NAMES[rng.integers(0, 12, n)]
+        has_org = rng.random(n) < ORG_SHARE
+        org = rng.integers(1, len(ORGANISATIONS) + 1, n)
+
+        # dim_member
+        member_fk = member_id + np.arange(n)
+        title_a, title_b = rng.integers(0, 4, n), rng.integers(0, 4, n)    # two draws, as in the SQL
+        full_name = np.char.add(np.char.add(first, " "), last)
+        number = np.char.zfill(((member_no + np.arange(n)) % 10**7).astype(str), 7)     # RIGHT(..., 7)
+        contact = uuid4s(rng, n)
+        self.member = pd.DataFrame({
+            "id": member_fk, "contact_id": contact,
+            "title": np.where(title_a == 0, "Mr", np.where(title_b == 1, "Ms", "Mrs")),
+            "first_name": first, "last_name": last, "full_name": full_name, "certificate_name": full_name,
+            "salutation": np.char.add("Mr/Ms ", last),
+            "gender": np.where(rng.random(n) < 0.5, "Male", "Female"),
+            "registered_disables_tatus": np.where(rng.random(n) < 0.03, "TRUE", "FALSE"),
+            "age": age, "age_group": age_group(age), "generation": generation(age),
+            "membership_number": number, "membership_status": "Active", "date_of_birth": pd.to_datetime(dob),
+            "email_preferred": np.char.lower(np.char.add(np.char.add(np.char.add(first, "."), last), "@example.org")),
+            "status": "Active",
+        })
+
+        # admissions
+        start_fk = date_fk(start)
+        expiry = np.where(has_org, add_months(start, 12) - 1, year_end(start))
+        r_status, r_pricing = rng.random(n), rng.random(n)
+        status = STATUS_LABELS[np.searchsorted([0.02, 0.07], r_status, side="right")]
+        pricing = PRICING_LABELS[np.searchsorted([0.05, 0.08, 0.12], r_pricing, side="right")]
+        membership_id = uuid4s(rng, n)
+        dob_year = ymd(dob)[0]
+        common = dict(member_fk=member_fk, has_org=has_org, org=org, product=product, hub=hub, number=number,
+                      name=full_name, membership_id=membership_id, contact=contact, expiry_fk=date_fk(expiry),
+                      end_fk=date_fk(year_end(start)), dob_year=dob_year, ids=ids)
+        parts = [self._facts(np.arange(n), start, grade, common, kind="Join", status=status,
+                             total=PRICE[product], pricing=pricing, active_fk=date_fk(month_start(start)),
+                             is_attrition=(r_status < 0.07).astype(np.int64))]
+
+        # upgrades: 10% of joins with a next grade, inside the membership year and the window
+        lo, hi = start + 15, expiry - 10
+        span = (hi - lo).astype(np.int64)
+        up_date = np.where(lo < hi, lo + rng.integers(0, np.maximum(span, 1)), lo)
+        up = np.flatnonzero((rng.random(n) < UPGRADE_SHARE) & (NEXT_GRADE[grade] > 0) & (up_date <= end))
+        parts.append(self._facts(up, up_date, NEXT_GRADE[grade], common, kind="Upgrade", prev_grade=grade,
+                                 active_fk=date_fk(month_start(up_date))))
+
+        # rejoins: 5% of joins, drawn from the resigned
+        resigned = np.flatnonzero(status == "Resigned")
+        picked = rng.choice(resigned, size=min(int(n * REJOIN_SHARE), len(resigned)), replace=False)
+        rejoin = np.full(n, np.datetime64("NaT"), dtype="M8[D]")
+        rejoin[picked] = start[picked] + 7 + rng.integers(0, 60, len(picked))
+        back = np.sort(picked[rejoin[picked] <= end])
+        # active month keeps the join year with the rejoin month, as the SQL script does
+        y, _, _ = ymd(start)
+        _, rm, _ = ymd(np.where(np.isnat(rejoin), start, rejoin))
+        parts.append(self._facts(back, rejoin, grade, common, kind="Rejoin", active_fk=y * 10000 + rm * 100 + 1))
+
+        facts = pd.concat(parts, ignore_index=True)
+        facts.insert(0, "membership_sk", membership_sk + np.arange(len(facts)))
+        self.facts = facts
+        self.upgrades, self.rejoins = len(up), len(back)
+
+    @staticmethod
+    def _facts(idx: np.ndarray, on: np.ndarray, grade: np.ndarray, c: Dict[str, Any], kind: str,
+               active_fk: np.ndarray, status: Optional[np.ndarray] = None, total: Optional[np.ndarray] = None,
+               pricing: Optional[np.ndarray] = None, is_attrition: Optional[np.ndarray] = None,
+               prev_grade: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """fact_membership rows for members `idx`, starting on on[idx]."""
+        ids = c["ids"]
+        n = len(idx)
+        on_fk = date_fk(on[idx])
+        age = ymd(on[idx])[0] - c["dob_year"][idx]       # DATEDIFF(year, date_of_birth, ...)
+        grade_fk = ids["dim_grade"][grade[idx]]
+        pricing = pricing[idx] if pricing is not None else "standard"
+        return pd.DataFrame({
+            "member_fk": c["member_fk"][idx],
+            "organisation_fk": nullable(ids["dim_organisation"][c["org"][idx]], c["has_org"][idx]),
+            "product_fk": ids["dim_product"][c["product"][idx]],
+            "grade_fk": grade_fk,
+            "prev_grade_fk": nullable(ids["dim_grade"][prev_grade[idx]] if prev_grade is not None
+                                      else np.zeros(n, np.int64), np.full(n, prev_grade is not None)),
+            "hub_fk": ids["dim_hub"][c["hub"][idx]],
+            "currency_fk": CURRENCY_FK,
+            "start_date_fk": on_fk, "expiry_date_fk": c["expiry_fk"][idx], "admit_to_membership_date_fk": on_fk,
+            "membership_id": c["membership_id"][idx],
+            "membership_number": c["number"][idx],
+            "membership_number_grade_concat": np.char.add(np.char.add(c["number"][idx], "+"), grade_fk.astype(str)),
+            "membership_name": c["name"][idx],
+            "total_value": total[idx] if total is not None else np.zeros(n),
+            "total_value_base": total[idx] if total is not None else np.zeros(n),
+            "special_pricing": pricing,
+            "state": "Active", "status": kind,
+            "membership_status_original": status[idx] if status is not None else "Active",
+            "membership_type_original": kind,
+            "age_at_membership_start": age, "age_group_at_membership_start": age_group(age),
+            "created_date_fk": on_fk, "modified_date_fk": on_fk,
+            "active_date_fk": active_fk[idx], "end_date_fk": c["end_fk"][idx],
+            "membership_status_derived": "Active", "membership_type_derived": kind,
+            "is_admission": int(kind == "Join"), "is_upgrade": int(kind == "Upgrade"),
+            "is_reinstatement": int(kind == "Rejoin"),
+            "is_attrition": is_attrition[idx] if is_attrition is not None else 0,
+            "contact_id": c["contact"][idx],
+            "special_pricing_reason": pricing,
+        })
+
+# ---- writers ----
+def _rows(df: pd.DataFrame, iso_dates: bool = False) -> List[Tuple[Any, ...]]:
+    """Python tuples for executemany; NULL -> None, timestamps -> datetime (or ISO text)."""
+    cols = []
+    for name in df.columns:
+        s = df[name]
+        if s.dtype.kind == "M":
+            cols.append(s.dt.strftime("%Y-%m-%d").tolist() if iso_dates else s.dt.to_pydatetime().tolist())
+        elif s.hasnans:
+            cols.append(s.astype(object).where(s.notna(), None).tolist())
+        else:
+            cols.append(s.tolist())
+    return list(zip(*cols))
+
+class SqliteWriter:
+    """A fresh SQLite file with plain table names, for ATTACH ... AS report."""
+
+    def __init__(self, path: str):
+        self.target = f"sqlite:{path}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        for t in SEEDED_TABLES:
+            self.conn.execute(f"DROP TABLE IF EXISTS {t}")
+        self._created: set = set()
+
+    def seeded(self, start: date, end: date) -> bool:
+        return False
+
+    def next_id(self, table: str) -> int:
+        return 1
+
+    def reference(self, table: str, df: pd.DataFrame, key: str) -> np.ndarray:
+        self.write(table, df.assign(id=np.arange(1, len(df) + 1)))
+        return np.arange(len(df) + 1)
+
+    def write(self, table: str, df: pd.DataFrame) -> None:
+        if table not in self._created:
+            types = {"i": "INTEGER", "u": "INTEGER", "f": "REAL"}
+            decls = [f"{c} INTEGER PRIMARY KEY" if c in ("id", "membership_sk")
+                     else f"{c} {types.get(df[c].dtype.kind, 'TEXT')}" for c in df.columns]
+            self.conn.execute(f"CREATE TABLE {table}({', '.join(decls)})")
+            self._created.add(table)
+        q = f"INSERT INTO {table}({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})"
+        with self.conn:
+            self.conn.executemany(q, _rows(df, iso_dates=True))
+
+    def mark(self, start: date, end: date) -> None:
+        pass
+
+    def close(self) -> None:
+        with self.conn:
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix_fact_membership_active ON fact_membership(active_date_fk)")
+        self.conn.close()
+
+class ParquetWriter:
+    """DIR/<table>/part-NNNNN.parquet, one part per write."""
+
+    def __init__(self, root: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            try:
+                import fastparquet  # noqa: F401
+            except ImportError:
+                raise SystemExit("--parquet needs pyarrow or fastparquet: pip install pyarrow")
+        self.target = f"parquet:{root}"
+        self.root = root
+        self._parts: Dict[str, int] = {}
+
+    def seeded(self, start: date, end: date) -> bool:
+        return False
+
+    def next_id(self, table: str) -> int:
+        return 1
+
+    def reference(self, table: str, df: pd.DataFrame, key: str) -> np.ndarray:
+        self.write(table, df.assign(id=np.arange(1, len(df) + 1)))
+        return np.arange(len(df) + 1)
+
+    def write(self, table: str, df: pd.DataFrame) -> None:
+        part = self._parts.get(table, 0)
+        os.makedirs(os.path.join(self.root, table), exist_ok=True)
+        df.to_parquet(os.path.join(self.root, table, f"part-{part:05d}.parquet"), index=False)
+        self._parts[table] = part + 1
+
+    def mark(self, start: date, end: date) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+class AzureSqlWriter:
+    """dwh.* through one pooled pyodbc connection with fast_executemany."""
+
+    def __init__(self, commit_rows: int = 100_000, sql: Any = None):
+        if sql is None:
+            from rag_agent.sql_client import AzureSQL
+            sql = AzureSQL()
+        self.sql = sql
+        self.target = "azure-sql:dwh"
+        self.commit_rows = commit_rows
+        self._ctx = sql.pool.connection()
+        self.conn = self._ctx.__enter__()
+        self.conn.autocommit = False
+
+    def _scalar(self, q: str, params: Tuple[Any, ...] = ()) -> Any:
+        cur = self.conn.cursor()
+        try:
+            return cur.execute(q, params).fetchone()[0]
+        finally:
+            cur.close()
+
+    def seeded(self, start: date, end: date) -> bool:
+        if self._scalar("SELECT CASE WHEN OBJECT_ID('dwh.__synthetic_run') IS NULL THEN 0 ELSE 1 END") == 0:
+            return False
+        return bool(self._scalar("SELECT COUNT(*) FROM dwh.__synthetic_run WHERE start_date = ? AND end_date = ?",
+                                 (start, end)))
+
+    def next_id(self, table: str) -> int:
+        col = "membership_sk" if table == "fact_membership" else "id"
+        return int(self._scalar(f"SELECT ISNULL(MAX({col}), 0) FROM dwh.{table}")) + 1
+
+    def reference(self, table: str, df: pd.DataFrame, key: str) -> np.ndarray:
+        """Seeds the dim if it is empty; either way maps our ids (by `key`) onto the table's."""
+        if self._scalar(f"SELECT COUNT(*) FROM dwh.{table}") == 0:
+            self.write(table, df, identity=False)
+        cur = self.conn.cursor()
+        try:
+            existing = {k: i for i, k in cur.execute(f"SELECT id, {key} FROM dwh.{table}").fetchall()}
+        finally:
+            cur.close()
+        missing = sorted(set(df[key]) - set(existing))
+        if missing:
+            raise SystemExit(f"dwh.{table} has no rows for {missing}")
+        return np.array([0] + [existing[k] for k in df[key]])
+
+    def write(self, table: str, df: pd.DataFrame, identity: bool = True) -> None:
+        if table == "dim_date":      # dates already present are kept, as in the SQL script
+            cur = self.conn.cursor()
+            try:
+                known = {r[0] for r in cur.execute("SELECT date_id FROM dwh.dim_date WHERE date_id BETWEEN ? AND ?",
+                                                   (df["date_id"].iloc[0], df["date_id"].iloc[-1])).fetchall()}
+            finally:
+                cur.close()
+            df = df[~df["date_id"].isin(known)]
+        identity = identity and ("id" in df.columns or "membership_sk" in df.columns)
+        cols = ", ".join(f"[{c}]" for c in df.columns)
+        q = f"INSERT INTO dwh.{table} ({cols}) VALUES ({', '.join('?' * len(df.columns))})"
+        cur = self.conn.cursor()
+        cur.fast_executemany = True
+        try:
+            if identity:
+                cur.execute(f"SET IDENTITY_INSERT dwh.{table} ON")
+            for lo in range(0, len(df), self.commit_rows):
+                cur.executemany(q, _rows(df.iloc[lo:lo + self.commit_rows]))
+                self.conn.commit()
+            if identity:
+                cur.execute(f"SET IDENTITY_INSERT dwh.{table} OFF")
+                self.conn.commit()
+        finally:
+            cur.close()
+
+    def mark(self, start: date, end: date) -> None:
+        cur = self.conn.cursor()
+        try:
+            cur.execute("IF OBJECT_ID('dwh.__synthetic_run') IS NULL CREATE TABLE dwh.__synthetic_run ("
+                        "run_id int IDENTITY(1,1) PRIMARY KEY, start_date date NOT NULL, end_date date NOT NULL, "
+                        "created_at datetime2(3) NOT NULL DEFAULT SYSUTCDATETIME())")
+            cur.execute("INSERT INTO dwh.__synthetic_run(start_date, end_date) VALUES (?, ?)", (start, end))
+            self.conn.commit()
+        finally:
+            cur.close()
+
+    def close(self) -> None:
+        self._ctx.__exit__(None, None, None)
+        self.sql.close()
+
+# ---- run ----
+def seed(writer: Any, start: date, end: date, seed: int = 7, scale: float = 1.0, block_rows: int = 250_000,
+         today: Optional[date] = None) -> Dict[str, int]:
+    rng = np.random.default_rng(seed)
+    counts_out = {t: 0 for t in SEEDED_TABLES}
+    dates = dim_date(start, end, today or date.today())
+    writer.write("dim_date", dates)
+    counts_out["dim_date"] = len(dates)
+    ids: Dict[str, np.ndarray] = {}
+    for table, (df, key) in reference_dims(rng).items():
+        ids[table] = writer.reference(table, df, key)
+        counts_out[table] = len(df)
+    days, counts = daily_plan(rng, start, end, scale)
+    member_id, sk = writer.next_id("dim_member"), writer.next_id("fact_membership")
+    member_no = 3000001
+    t0 = time.perf_counter()
+    for span in day_blocks(counts, block_rows):
+        b = Block(rng, days[span], counts[span], np.datetime64(end), ids, member_id, member_no, sk)
+        writer.write("dim_member", b.member)
+        writer.write("fact_membership", b.facts)
+        member_id, member_no, sk = member_id + b.n, member_no + b.n, sk + len(b.facts)
+        counts_out["dim_member"] += b.n
+        counts_out["fact_membership"] += len(b.facts)
+        print(f"  {str(days[span][0])}..{str(days[span][-1])}: {b.n} joins, {b.upgrades} upgrades, "
+              f"{b.rejoins} rejoins ({counts_out['fact_membership'] / (time.perf_counter() - t0):,.0f} fact rows/s)")
+    writer.mark(start, end)
+    return counts_out
+
+def main():
+    ap = argparse.ArgumentParser(description="Seeded synthetic membership warehouse")
+    out = ap.add_mutually_exclusive_group(required=True)
+    out.add_argument("--sqlite", help="write a SQLite file (ATTACH it as report)")
+    out.add_argument("--parquet", help="write Parquet parts under this directory")
+    out.add_argument("--azure", action="store_true", help="bulk-load dwh.* on the configured Azure SQL database")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--end", type=date.fromisoformat, default=None, help="window end (default today)")
+    ap.add_argument("--years", type=int, default=2, help="window length back from --end")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiplies the daily join targets")
+    ap.add_argument("--block-rows", type=int, default=250_000, help="about this many joins generated at a time")
+    ap.add_argument("--commit-rows", type=int, default=100_000, help="rows per executemany/commit (--azure)")
+    args = ap.parse_args()
+
+    end = args.end or date.today()
+    try:
+        start = end.replace(year=end.year - args.years)
+    except ValueError:                       # 29 Feb -> 28 Feb, like DATEADD(year, ...)
+        start = end.replace(year=end.year - args.years, day=28)
+    if args.sqlite:
+        writer: Any = SqliteWriter(args.sqlite)
+    elif args.parquet:
+        writer = ParquetWriter(args.parquet)
+    else:
+        writer = AzureSqlWriter(args.commit_rows)
+    try:
+        if writer.seeded(start, end):
+            print(f"Synthetic data for {start}..{end} already exists. Skipping.")
+            return
+        print(f"seeding {start}..{end} (seed {args.seed}, scale {args.scale:g}) -> {writer.target}")
+        t0 = time.perf_counter()
+        counts = seed(writer, start, end, seed=args.seed, scale=args.scale, block_rows=args.block_rows)
+        wall = time.perf_counter() - t0
+    finally:
+        writer.close()
+    print(", ".join(f"{t} {n:,}" for t, n in counts.items()))
+    print(f"{wall:.1f} s, {counts['fact_membership'] / wall:,.0f} fact rows/s")
+
+if __name__ == "__main__":
+    main()
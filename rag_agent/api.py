@@ -0,0 +1,123 @@
+# FastAPI entry point: async graph, many concurrent chats per worker
+#   uvicorn rag_agent.api:app --host 0.0.0.0 --port 8000
+
+from __future__ import annotations
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+class ChatRequest(BaseModel):
+    query: str
+    session_id: str | None = None     # same id across turns enables follow-ups ("and by gender?")
+
+class ChatResponse(BaseModel):
+    answer: str
+    intent: str | None = None
+    answer_path: str | None = None
+    timings_ms: Dict[str, float] = {}
+    ttft_ms: float | None = None
+    total_ms: float | None = None
+    prompt_tokens: int | None = None
+    follow_up: bool | None = None
+    trace_id: str | None = None        # set when the turn was traced (AGENT_TRACE)
+
+def create_app(graph: Any = None, sql: Any = None, search: Any = None, renderer: Any = None,
+               sessions: Any = None, cube: Any = None, tracer: Any = None) -> FastAPI:
+    """
+    Builds the app around a compiled graph. With no graph, the Azure-backed
+    agent is compiled once at startup and shared by every request. On shutdown
+    the clients given (or built) here are released: the cube's refresh thread
+    stops, Search and SQL close their connections and the tracer flushes.
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.sql = sql
+        app.state.search = search
+        app.state.renderer = renderer
+        app.state.sessions = sessions
+        app.state.cube = cube
+        app.state.tracer = tracer
+        if graph is None:
+            from . import clients
+            from .graph import get_graph
+            app.state.sql = clients.get_sql()
+            app.state.search = clients.get_search()
+            app.state.renderer = clients.get_renderer()
+            app.state.sessions = clients.get_sessions()
+            app.state.cube = clients.get_cube()
+            app.state.tracer = clients.get_tracer()
+            app.state.graph = get_graph()
+        else:
+            app.state.graph = graph
+        yield
+        if app.state.cube is not None:
+            app.state.cube.stop()
+        if hasattr(app.state.search, "aclose"):
+            await app.state.search.aclose()
+        if hasattr(app.state.sql, "close"):
+            app.state.sql.close()
+        if app.state.tracer is not None:
+            app.state.tracer.close()
+
+    app = FastAPI(title="Membership RAG agent", lifespan=lifespan)
+
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, Any]:
+        sql_client, search_client = app.state.sql, app.state.search
+        return {
+            "search_cache": search_client.cache_stats() if hasattr(search_client, "cache_stats") else None,
+            "sql_pool": sql_client.pool_stats() if hasattr(sql_client, "pool_stats") else None,
+            "sql_cache": sql_client.cache_stats() if hasattr(sql_client, "cache_stats") else None,
+            "answers": app.state.renderer.snapshot() if app.state.renderer is not None else None,
+            "sessions": app.state.sessions.snapshot() if app.state.sessions is not None else None,
+            "kpi_cube": app.state.cube.snapshot() if app.state.cube is not None else None,
+        }
+
+    def _input(req: ChatRequest) -> Dict[str, Any]:
+        return {"user_query": req.query, **({"session_id": req.session_id} if req.session_id else {})}
+
+    @app.post("/chat", response_model=ChatResponse)
+    async def chat(req: ChatRequest) -> ChatResponse:
+        out = await app.state.graph.ainvoke(_input(req))
+        return ChatResponse(
+            answer=out.get("answer", "(no answer)"),
+            intent=out.get("intent"),
+            answer_path=out.get("answer_path"),
+            timings_ms=out.get("timings_ms", {}),
+            ttft_ms=out.get("ttft_ms"),
+            total_ms=out.get("total_ms"),
+            prompt_tokens=out.get("prompt_tokens"),
+            follow_up=out.get("follow_up", False),
+            trace_id=out.get("trace_id"),
+        )
+
+    @app.post("/chat/stream")
+    async def chat_stream(req: ChatRequest) -> StreamingResponse:
+        """
+        Server-sent events: one `token` event per answer delta, then a `done`
+        event carrying the same fields as /chat.
+        """
+        async def events() -> AsyncIterator[str]:
+            out: Dict[str, Any] = {}
+            async for mode, chunk in app.state.graph.astream(_input(req),
+                                                             stream_mode=["custom", "values"]):
+                if mode == "custom" and "token" in chunk:
+                    yield f"event: token\ndata: {json.dumps(chunk['token'])}\n\n"
+                elif mode == "values":
+                    out = chunk
+            done = {k: out.get(k) for k in ("answer", "intent", "answer_path", "timings_ms", "ttft_ms", "total_ms",
+                                          "prompt_tokens", "follow_up", "trace_id")}
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+app = create_app()
@@ -0,0 +1,456 @@
+# Result caches for read-only tool calls
+#   - TTLCache: in-process LRU with per-entry TTL, bounded by entry count and bytes
+#   - SqliteCacheBackend: optional shared on-disk tier so several workers share entries
+#   - CachedSQL: AzureSQL.query_dicts / query_columns in front of the cache, rows stored column-wise
+#   - CachedSearch: AzureAISearch.hybrid_semantic with single-flight coalescing
+
+from __future__ import annotations
+import asyncio, hashlib, json, pickle, re, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .tracing import annotate
+
+_MISSING = object()
+
+class SqliteCacheBackend:
+    """
+    Shared cache tier in a SQLite file (WAL mode, so many processes can read while
+    one writes). Values are pickled, so `path` must be a trusted file that only
+    this service writes: unpickling a planted entry runs arbitrary code.
+
+    Reads do not write: hits record their access time in memory and the times are
+    flushed in one batch every `touch_batch` hits, or on the next set(). Eviction
+    is approximate LRU: every `prune_every` writes, expired rows are dropped and,
+    if the table is over max_entries, the least recently accessed rows go.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, touch_batch: int = 64, prune_every: int = 64):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}       # key -> access time not yet written
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS cache(
+            key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache(accessed)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Tuple[Any, float] | None:
+        """Returns (value, expires_at) or None. Expired rows are left for the next prune."""
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        with self._lock:
+            self._touched[key] = time.time()
+            flush = len(self._touched) >= self.touch_batch
+        if flush:
+            self._flush_touched(conn)
+            conn.commit()
+        return pickle.loads(row[0]), row[1]
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany("UPDATE cache SET accessed = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO cache(key, value, expires, accessed) VALUES (?,?,?,?)",
+                     (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at, now))
+        self._flush_touched(conn)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 1 or self.prune_every <= 1
+        if prune:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (now,))
+            over = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if over > 0:
+                conn.execute("""DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY accessed LIMIT ?)""", (over,))
+        conn.commit()
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM cache")
+        conn.commit()
+
+class TTLCache:
+    """
+    Thread-safe LRU with a per-entry TTL. Bounded by `max_entries` and by
+    `max_bytes` of the (approximate) sizes passed to set(). A backend, if given,
+    is a second tier consulted on local misses and written through on set().
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_s: float = 600.0, backend: Optional[SqliteCacheBackend] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.backend = backend
+        self._data: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()   # key -> (value, expires, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "backend_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _drop(self, key: str) -> None:
+        _, _, nbytes = self._data.pop(key)
+        self._bytes -= nbytes
+
+    def _put(self, key: str, value: Any, expires: float, nbytes: int) -> None:
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (value, expires, nbytes)
+        self._bytes += nbytes
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._data)))
+            self.stats["evictions"] += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[1] >= now:
+                    self._data.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return item[0]
+                self._drop(key)
+                self.stats["expirations"] += 1
+        if self.backend is not None:
+            found = self.backend.get(key)
+            if found is not None:
+                value, expires = found
+                with self._lock:
+                    self._put(key, value, expires, _approx_size(value))
+                    self.stats["backend_hits"] += 1
+                return value
+        with self._lock:
+            self.stats["misses"] += 1
+        return default
+
+    def set(self, key: str, value: Any, nbytes: Optional[int] = None, ttl_s: Optional[float] = None) -> None:
+        expires = time.time() + (self.ttl_s if ttl_s is None else ttl_s)
+        with self._lock:
+            self._put(key, value, expires, _approx_size(value) if nbytes is None else nbytes)
+        if self.backend is not None:
+            self.backend.set(key, value, expires)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+            out.update({"entries": len(self._data), "bytes": self._bytes})
+        return out
+
+def _approx_size(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024
+
+# ---- SQL result cache ----
+
+_WS = re.compile(r"\s+")
+
+def sql_cache_key(sql: str, params: Iterable[Any] = ()) -> str:
+    """Whitespace-normalised SQL + params, hashed."""
+    norm = _WS.sub(" ", sql).strip()
+    return hashlib.sha1(repr((norm, tuple(params))).encode("utf-8")).hexdigest()
+
+# Rows are kept as (columns, rows-as-tuples): one tuple of column names per
+# entry instead of a dict per row, and cheap to pickle for the disk tier.
+CompactRows = Tuple[Tuple[str, ...], Tuple[Tuple[Any, ...], ...]]
+
+def pack_rows(rows: List[Dict[str, Any]]) -> CompactRows:
+    if not rows:
+        return (), ()
+    cols = tuple(rows[0].keys())
+    return cols, tuple(tuple(r[c] for c in cols) for r in rows)
+
+def unpack_rows(packed: CompactRows) -> List[Dict[str, Any]]:
+    cols, rows = packed
+    return [dict(zip(cols, r)) for r in rows]
+
+def _pack_columns(res: Any) -> Tuple[Tuple[str, ...], Tuple[Tuple[Any, ...], ...], bool]:
+    return res.columns, tuple(tuple(c) for c in res.data), res.truncated
+
+def _unpack_columns(packed: Tuple[Tuple[str, ...], Tuple[Tuple[Any, ...], ...], bool]):
+    from .sql_client import ColumnarResult
+    cols, data, truncated = packed
+    return ColumnarResult(cols, [list(c) for c in data], truncated)
+
+class CachedSQL:
+    """
+    Drop-in for AzureSQL.query_dicts/aquery_dicts that serves repeated KPI
+    queries from a TTLCache. Safe because the agent's data surface is read-only.
+    """
+
+    def __init__(self, sql: Any, cache: TTLCache):
+        self.sql = sql
+        self.cache = cache
+        self.latency = {"hit_ms_total": 0.0, "miss_ms_total": 0.0}
+
+    def query_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        t0 = time.perf_counter()
+        params = tuple(params)
+        key = sql_cache_key(sql, params)
+        packed = self.cache.get(key, _MISSING)
+        if packed is not _MISSING:
+            rows = unpack_rows(packed)
+            self.latency["hit_ms_total"] += (time.perf_counter() - t0) * 1000.0
+            annotate(cache="hit")
+            return rows
+        annotate(cache="miss")
+        rows = self.sql.query_dicts(sql, params)
+        self.cache.set(key, pack_rows(rows))
+        self.latency["miss_ms_total"] += (time.perf_counter() - t0) * 1000.0
+        return rows
+
+    async def aquery_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        t0 = time.perf_counter()
+        params = tuple(params)
+        key = sql_cache_key(sql, params)
+        packed = self.cache.get(key, _MISSING)
+        if packed is not _MISSING:
+            rows = unpack_rows(packed)
+            self.latency["hit_ms_total"] += (time.perf_counter() - t0) * 1000.0
+            annotate(cache="hit")
+            return rows
+        annotate(cache="miss")
+        rows = await self.sql.aquery_dicts(sql, params)
+        self.cache.set(key, pack_rows(rows))
+        self.latency["miss_ms_total"] += (time.perf_counter() - t0) * 1000.0
+        return rows
+
+    def query_columns(self, sql: str, params: Iterable[Any] = (), max_rows: Optional[int] = None):
+        t0 = time.perf_counter()
+        params = tuple(params)
+        key = sql_cache_key(sql, (*params, ("max_rows", max_rows)))
+        packed = self.cache.get(key, _MISSING)
+        if packed is not _MISSING:
+            res = _unpack_columns(packed)
+            self.latency["hit_ms_total"] += (time.perf_counter() - t0) * 1000.0
+            annotate(cache="hit")
+            return res
+        annotate(cache="miss")
+        res = self.sql.query_columns(sql, params, max_rows)
+        self.cache.set(key, _pack_columns(res))
+        self.latency["miss_ms_total"] += (time.perf_counter() - t0) * 1000.0
+        return res
+
+    async def aquery_columns(self, sql: str, params: Iterable[Any] = (), max_rows: Optional[int] = None):
+        t0 = time.perf_counter()
+        params = tuple(params)
+        key = sql_cache_key(sql, (*params, ("max_rows", max_rows)))
+        packed = self.cache.get(key, _MISSING)
+        if packed is not _MISSING:
+            res = _unpack_columns(packed)
+            self.latency["hit_ms_total"] += (time.perf_counter() - t0) * 1000.0
+            annotate(cache="hit")
+            return res
+        annotate(cache="miss")
+        res = await self.sql.aquery_columns(sql, params, max_rows)
+        self.cache.set(key, _pack_columns(res))
+        self.latency["miss_ms_total"] += (time.perf_counter() - t0) * 1000.0
+        return res
+
+    def cache_stats(self) -> Dict[str, Any]:
+        s = self.cache.snapshot()
+        hits = s["hits"] + s["backend_hits"]
+        s["hit_ms_avg"] = self.latency["hit_ms_total"] / max(1, hits)
+        s["miss_ms_avg"] = self.latency["miss_ms_total"] / max(1, s["misses"])
+        return s
+
+    def __getattr__(self, name: str) -> Any:
+        # pool_stats(), close(), query() ... pass through to the wrapped client
+        return getattr(self.sql, name)
+
+# ---- request coalescing ----
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller runs
+    fn(), the rest wait for and share its result (or exception). Covers both
+    threads (do) and asyncio tasks on one loop (ado).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[str, "asyncio.Future[Any]"] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: str, afn) -> Any:
+        fut = self._tasks.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.ensure_future(afn())
+        self._tasks[key] = fut
+        try:
+            return await asyncio.shield(fut)
+        finally:
+            if self._tasks.get(key) is fut:
+                del self._tasks[key]
+
+# ---- Search response cache ----
+
+class CachedSearch:
+    """
+    Drop-in for AzureAISearch.hybrid_semantic/ahybrid_semantic. Responses are
+    cached by the canonical request (endpoint, index, api version, body) plus
+    the index generation, and identical in-flight requests share one upstream
+    call. When the index generation changes (indexer run / rebuild), the cache
+    is cleared. The generation is probed at most every check_generation_s: inline
+    on the sync path, in a background thread on the async path, so key() does no
+    I/O. Cached responses are shared between callers: treat as read-only.
+    """
+
+    def __init__(self, search: Any, cache: TTLCache, check_generation_s: float = 60.0):
+        self.search = search
+        self.cache = cache
+        self.flight = SingleFlight()
+        self.check_generation_s = check_generation_s
+        self._generation: Any = None
+        self._checked_at = float("-inf")
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self.upstream_calls = 0
+
+    # ---- invalidation ----
+    def invalidate(self) -> None:
+        self.cache.clear()
+
+    def _due(self) -> bool:
+        # claims the refresh window, so concurrent callers do not probe twice
+        if self.check_generation_s <= 0 or not hasattr(self.search, "index_generation"):
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < self.check_generation_s:
+            return False
+        self._checked_at = now
+        return True
+
+    def _refresh_generation(self) -> None:
+        """Blocking probe (index_generation is an HTTP GET); clears the cache when the generation changed."""
+        try:
+            gen = self.search.index_generation()
+        except Exception:
+            return                            # keep serving; retry next window
+        if self._generation is not None and gen != self._generation:
+            self.invalidate()
+        self._generation = gen
+
+    def _arefresh_generation(self) -> None:
+        # off the event loop, in the background: this request keys on the stored generation
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._refresh_generation))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def key(self, query: str, top: int = 5, select: str | None = None) -> str:
+        s = self.search
+        canonical = json.dumps({
+            "endpoint": getattr(s, "endpoint", None), "index": getattr(s, "index", None),
+            "api_version": getattr(s, "api_version", None), "generation": self._generation,
+            "body": s.build_body(query, top, select),
+        }, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+    # ---- calls ----
+    def hybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        if self._due():
+            self._refresh_generation()
+        key = self.key(query, top, select)
+        hit = self.cache.get(key, _MISSING)
+        if hit is not _MISSING:
+            annotate(cache="hit")
+            return hit
+        annotate(cache="miss")
+
+        def fetch() -> Dict[str, Any]:
+            self.upstream_calls += 1
+            resp = self.search.hybrid_semantic(query=query, top=top, select=select)
+            self.cache.set(key, resp)
+            return resp
+        return self.flight.do(key, fetch)
+
+    async def ahybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        if self._due():
+            self._arefresh_generation()
+        key = self.key(query, top, select)
+        hit = self.cache.get(key, _MISSING)
+        if hit is not _MISSING:
+            annotate(cache="hit")
+            return hit
+        annotate(cache="miss")
+
+        async def fetch() -> Dict[str, Any]:
+            self.upstream_calls += 1
+            resp = await self.search.ahybrid_semantic(query=query, top=top, select=select)
+            self.cache.set(key, resp)
+            return resp
+        return await self.flight.ado(key, fetch)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        s = self.cache.snapshot()
+        s.update({"upstream_calls": self.upstream_calls, "coalesced": self.flight.coalesced,
+                  "index_generation": self._generation})
+        return s
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.search, name)
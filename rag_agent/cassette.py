@@ -0,0 +1,356 @@
+# Record/replay of Search, SQL and LLM calls ("cassettes")
+#
+# A cassette is one SQLite file with a row per distinct request: the canonical
+# request, the response (pickled, zlib-compressed) and how long the call took.
+# Rows are keyed by a 16-byte hash of (kind, request). Wrappers sit directly on
+# the clients, under the result caches and tracing:
+#
+#   RecordedSearch  hybrid_semantic (AzureAISearch, LocalSearch) and post (eval_common.SearchClient),
+#                   both keyed by the request body, so the agent and eval share recordings
+#   RecordedSQL     query_columns / query_dicts / query, keyed by SQL, params and max_rows
+#   RecordedSynth   compose / stream_compose, keyed by the prompt messages; streams keep their deltas
+#
+# Modes (AGENT_CASSETTE_MODE):
+#   record  every call goes to the service and its recording is (re)written
+#   replay  calls are served from the cassette. The real client is never built, so no
+#           credentials or network are needed; a request not on the cassette raises CassetteMiss
+#   auto    replay what is recorded, record the rest
+#
+# Replay returns at once unless simulate_latency (AGENT_CASSETTE_LATENCY) is on; then it
+# sleeps for the recorded duration times latency_scale. A stream waits its recorded time
+# to first delta, then spreads the rest evenly over the remaining deltas.
+
+from __future__ import annotations
+import asyncio, hashlib, json, pathlib, pickle, sqlite3, threading, time, zlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .tracing import annotate
+
+MODES = ("record", "replay", "auto")
+
+class CassetteMiss(LookupError):
+    """A replayed request that was never recorded."""
+
+@dataclass(frozen=True)
+class Recording:
+    response: Any
+    latency_ms: float
+    ttft_ms: Optional[float] = None       # streams: call start -> first delta
+
+def canonical(request: Any) -> str:
+    return json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+
+class CassetteStore:
+    """Thread-safe; one connection per store, writes committed per call."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS calls(
+            key BLOB PRIMARY KEY,
+            kind TEXT NOT NULL,
+            request TEXT NOT NULL,
+            response BLOB NOT NULL,
+            latency_ms REAL NOT NULL,
+            ttft_ms REAL,
+            recorded_utc TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS ix_calls_kind ON calls(kind);
+        CREATE TABLE IF NOT EXISTS meta(k TEXT PRIMARY KEY, v TEXT NOT NULL);
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def key(kind: str, request: Any) -> bytes:
+        return hashlib.sha256(f"{kind}\n{canonical(request)}".encode("utf-8")).digest()[:16]
+
+    def get(self, kind: str, request: Any) -> Optional[Recording]:
+        with self._lock:
+            row = self.conn.execute("SELECT response, latency_ms, ttft_ms FROM calls WHERE key = ?",
+                                    (self.key(kind, request),)).fetchone()
+        if row is None:
+            return None
+        return Recording(pickle.loads(zlib.decompress(row[0])), row[1], row[2])
+
+    def put(self, kind: str, request: Any, response: Any, latency_ms: float, ttft_ms: Optional[float] = None) -> None:
+        blob = zlib.compress(pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL))
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO calls VALUES (?,?,?,?,?,?,?)",
+                              (self.key(kind, request), kind, canonical(request), blob, latency_ms, ttft_ms,
+                               time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())))
+
+    def get_meta(self, k: str) -> Any:
+        with self._lock:
+            row = self.conn.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, k: str, v: Any) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (k, canonical(v)))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per kind: recordings, stored bytes and median recorded latency."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kind, LENGTH(response), latency_ms FROM calls ORDER BY kind, latency_ms").fetchall()
+        out: Dict[str, Dict[str, Any]] = {}
+        for kind, nbytes, ms in rows:
+            s = out.setdefault(kind, {"calls": 0, "bytes": 0, "latencies": []})
+            s["calls"] += 1
+            s["bytes"] += nbytes
+            s["latencies"].append(ms)
+        for s in out.values():
+            lat = s.pop("latencies")
+            s["latency_ms_p50"] = round(lat[len(lat) // 2], 1)
+        return out
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+class _Recorded:
+    """
+    Shared record/replay logic. `inner` is the real client (None in replay mode).
+    ATTRS are client attributes other code reads (index name, SQL dialect, ...):
+    stored when recording and restored on replay.
+    """
+
+    KIND = ""
+    ATTRS: Tuple[str, ...] = ()
+
+    def __init__(self, inner: Any, store: CassetteStore, mode: str = "replay",
+                 simulate_latency: bool = False, latency_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"unknown cassette mode: {mode!r}; expected one of {MODES}")
+        if inner is None and mode != "replay":
+            raise ValueError(f"cassette mode {mode!r} needs a client to record from")
+        self.inner = inner
+        self.store = store
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+        self.counts = {"hits": 0, "misses": 0, "recorded": 0}
+        self._stats_lock = threading.Lock()
+        if inner is not None and self.ATTRS:
+            store.set_meta(f"{self.KIND}.attrs", {a: getattr(inner, a, None) for a in self.ATTRS})
+        elif inner is None:
+            for a, v in (store.get_meta(f"{self.KIND}.attrs") or {}).items():
+                if v is not None:
+                    setattr(self, a, v)
+
+    def _count(self, what: str) -> None:
+        with self._stats_lock:
+            self.counts[what] += 1
+
+    def _lookup(self, kind: str, request: Any) -> Optional[Recording]:
+        if self.mode == "record":
+            return None
+        rec = self.store.get(kind, request)
+        if rec is not None:
+            self._count("hits")
+            annotate(cassette="hit")
+            return rec
+        self._count("misses")
+        if self.mode == "replay":
+            annotate(cassette="miss")
+            raise CassetteMiss(f"{kind} request not on cassette {self.store.path}: {canonical(request)[:200]}")
+        return None
+
+    def _save(self, kind: str, request: Any, response: Any, t0: float, ttft_ms: Optional[float] = None) -> None:
+        self.store.put(kind, request, response, (time.perf_counter() - t0) * 1000.0, ttft_ms)
+        self._count("recorded")
+        annotate(cassette="recorded")
+
+    def _delay_s(self, ms: Optional[float]) -> float:
+        return (ms or 0.0) * self.latency_scale / 1000.0 if self.simulate_latency else 0.0
+
+    def _call(self, kind: str, request: Any, fn: Callable[[], Any],
+              pack: Callable[[Any], Any] = lambda x: x, unpack: Callable[[Any], Any] = lambda x: x) -> Any:
+        rec = self._lookup(kind, request)
+        if rec is not None:
+            delay = self._delay_s(rec.latency_ms)
+            if delay:
+                time.sleep(delay)
+            return unpack(rec.response)
+        t0 = time.perf_counter()
+        out = fn()
+        self._save(kind, request, pack(out), t0)
+        return out
+
+    async def _acall(self, kind: str, request: Any, afn: Callable[[], Awaitable[Any]],
+                     pack: Callable[[Any], Any] = lambda x: x, unpack: Callable[[Any], Any] = lambda x: x) -> Any:
+        rec = self._lookup(kind, request)
+        if rec is not None:
+            delay = self._delay_s(rec.latency_ms)
+            if delay:
+                await asyncio.sleep(delay)
+            return unpack(rec.response)
+        t0 = time.perf_counter()
+        out = await afn()
+        self._save(kind, request, pack(out), t0)
+        return out
+
+    def cassette_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {**self.counts, "mode": self.mode, "path": self.store.path}
+
+    def __getattr__(self, name: str) -> Any:
+        # anything not recorded (close(), pool_stats(), ...) passes through to the real client
+        inner = self.__dict__.get("inner")
+        if inner is None:
+            raise AttributeError(name)
+        return getattr(inner, name)
+
+class RecordedSearch(_Recorded):
+    KIND = "search"
+    ATTRS = ("endpoint", "index", "api_version")
+
+    def build_body(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        if self.inner is not None and hasattr(self.inner, "build_body"):
+            return self.inner.build_body(query, top, select)
+        from .search_client import hybrid_semantic_body
+        return hybrid_semantic_body(query, top, select)
+
+    def hybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        return self._call("search", self.build_body(query, top, select),
+                          lambda: self.inner.hybrid_semantic(query=query, top=top, select=select))
+
+    async def ahybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        return await self._acall("search", self.build_body(query, top, select),
+                                 lambda: self.inner.ahybrid_semantic(query=query, top=top, select=select))
+
+    def post(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return self._call("search", body, lambda: self.inner.post(body))
+
+    def index_generation(self) -> str:
+        return self._call("search.generation", {}, lambda: self.inner.index_generation())
+
+def _pack_result(res: Any) -> Tuple[Tuple[str, ...], List[List[Any]], bool]:
+    return res.columns, res.data, res.truncated
+
+def _unpack_result(packed: Tuple[Tuple[str, ...], List[List[Any]], bool]) -> Any:
+    from .sql_client import ColumnarResult
+    cols, data, truncated = packed
+    return ColumnarResult(cols, data, truncated)
+
+class RecordedSQL(_Recorded):
+    KIND = "sql"
+    ATTRS = ("dialect",)
+
+    @staticmethod
+    def _request(sql: str, params: Tuple[Any, ...], max_rows: Optional[int]) -> Dict[str, Any]:
+        return {"sql": sql, "params": list(params), "max_rows": max_rows}
+
+    def query_columns(self, sql: str, params: Iterable[Any] = (), max_rows: Optional[int] = None):
+        params = tuple(params)
+        return self._call("sql", self._request(sql, params, max_rows),
+                          lambda: self.inner.query_columns(sql, params, max_rows), _pack_result, _unpack_result)
+
+    async def aquery_columns(self, sql: str, params: Iterable[Any] = (), max_rows: Optional[int] = None):
+        params = tuple(params)
+        return await self._acall("sql", self._request(sql, params, max_rows),
+                                 lambda: self.inner.aquery_columns(sql, params, max_rows), _pack_result, _unpack_result)
+
+    # the clients derive these from query_columns too, so one recording serves all three
+    def query_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return self.query_columns(sql, params).to_dicts()
+
+    async def aquery_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return (await self.aquery_columns(sql, params)).to_dicts()
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[Tuple]:
+        return list(self.query_columns(sql, params).rows())
+
+class RecordedSynth(_Recorded):
+    KIND = "llm"
+
+    def __init__(self, inner: Any, store: CassetteStore, mode: str = "replay",
+                 simulate_latency: bool = False, latency_scale: float = 1.0):
+        super().__init__(inner, store, mode, simulate_latency, latency_scale)
+        if inner is None:
+            from .prompt import PromptBuilder
+            from .synthesizer import _sys
+            self.prompts = PromptBuilder.from_settings(system=_sys)
+
+    def build_prompt(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                     sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, sql_truncated: bool = False):
+        if self.inner is not None:
+            return self.inner.build_prompt(user_query, sql_rows, citations, sql_tables, sql_truncated)
+        return self.prompts.build(user_query, sql_rows, citations, sql_tables, sql_truncated)
+
+    def build_messages(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                       sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, str]]:
+        return self.build_prompt(user_query, sql_rows, citations, sql_tables).messages
+
+    def compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Any = None) -> str:
+        prompt = prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)
+        return self._call("llm", {"messages": prompt.messages},
+                          lambda: self.inner.compose(user_query, sql_rows, citations, sql_tables, prompt=prompt))
+
+    async def acompose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                       sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Any = None) -> str:
+        prompt = prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)
+        return await self._acall("llm", {"messages": prompt.messages},
+                                 lambda: self.inner.acompose(user_query, sql_rows, citations, sql_tables,
+                                                             prompt=prompt))
+
+    def _gaps(self, rec: Recording) -> Iterator[float]:
+        # seconds to wait before each replayed delta
+        deltas = rec.response
+        first = self._delay_s(rec.ttft_ms)
+        rest = max(0.0, self._delay_s(rec.latency_ms) - first) / max(1, len(deltas) - 1)
+        return (first if i == 0 else rest for i in range(len(deltas)))
+
+    def stream_compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                       sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Any = None) -> Iterator[str]:
+        prompt = prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)
+        request = {"messages": prompt.messages}
+        rec = self._lookup("llm.stream", request)
+        if rec is not None:
+            for delta, gap in zip(rec.response, self._gaps(rec)):
+                if gap:
+                    time.sleep(gap)
+                yield delta
+            return
+        t0 = time.perf_counter()
+        deltas: List[str] = []
+        ttft_ms = None
+        for delta in self.inner.stream_compose(user_query, sql_rows, citations, sql_tables, prompt=prompt):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000.0
+            deltas.append(delta)
+            yield delta
+        self._save("llm.stream", request, deltas, t0, ttft_ms)     # only complete streams are kept
+
+    async def astream_compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                              sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                              prompt: Any = None) -> AsyncIterator[str]:
+        prompt = prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)
+        request = {"messages": prompt.messages}
+        rec = self._lookup("llm.stream", request)
+        if rec is not None:
+            for delta, gap in zip(rec.response, self._gaps(rec)):
+                if gap:
+                    await asyncio.sleep(gap)
+                yield delta
+            return
+        t0 = time.perf_counter()
+        deltas: List[str] = []
+        ttft_ms = None
+        async for delta in self.inner.astream_compose(user_query, sql_rows, citations, sql_tables, prompt=prompt):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000.0
+            deltas.append(delta)
+            yield delta
+        self._save("llm.stream", request, deltas, t0, ttft_ms)
@@ -0,0 +1,106 @@
+# Process-wide clients, built on first use and memoised.
+# Importing this module (or rag_agent.graph) connects to nothing and needs no
+# credentials; the first get_*() call does the work, once per process.
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Callable, Optional, TYPE_CHECKING
+from .cache import CachedSearch, CachedSQL, SqliteCacheBackend, TTLCache
+from .config import AgentSettings, get_settings
+
+if TYPE_CHECKING:
+    from .cassette import CassetteStore
+    from .kpi_cube import KpiCube
+    from .renderer import AnswerRenderer
+    from .session import SessionStore
+    from .synthesizer import Synthesizer
+    from .tracing import Tracer
+
+def with_result_cache(sql: Any, agent: AgentSettings | None = None) -> Any:
+    """Wraps `sql` in a CachedSQL when AGENT_SQL_CACHE is on (idempotent)."""
+    agent = agent or get_settings().agent
+    if not agent.sql_cache or isinstance(sql, CachedSQL):
+        return sql
+    backend = SqliteCacheBackend(agent.sql_cache_path, agent.sql_cache_max_entries) if agent.sql_cache_path else None
+    return CachedSQL(sql, TTLCache(max_entries=agent.sql_cache_max_entries,
+                                   max_bytes=agent.sql_cache_max_mb * 1024 * 1024,
+                                   ttl_s=agent.sql_cache_ttl_s, backend=backend))
+
+def with_search_cache(search: Any, agent: AgentSettings | None = None) -> Any:
+    """Wraps `search` in a CachedSearch when AGENT_SEARCH_CACHE is on (idempotent)."""
+    agent = agent or get_settings().agent
+    if not agent.search_cache or isinstance(search, CachedSearch):
+        return search
+    backend = SqliteCacheBackend(agent.search_cache_path, agent.search_cache_max_entries) if agent.search_cache_path else None
+    return CachedSearch(search, TTLCache(max_entries=agent.search_cache_max_entries,
+                                         max_bytes=agent.search_cache_max_mb * 1024 * 1024,
+                                         ttl_s=agent.search_cache_ttl_s, backend=backend),
+                        check_generation_s=agent.search_cache_check_s)
+
+@lru_cache(maxsize=None)
+def get_cassette(path: str) -> "CassetteStore":
+    """One store per cassette file, shared by the Search, SQL and LLM wrappers."""
+    from .cassette import CassetteStore
+    return CassetteStore(path)
+
+def with_cassette(make: Callable[[], Any], wrapper: str, agent: AgentSettings | None = None) -> Any:
+    """
+    make() wrapped in rag_agent.cassette.<wrapper> when AGENT_CASSETTE is set,
+    else make(). In replay mode make() is never called: no real client is built.
+    """
+    agent = agent or get_settings().agent
+    if not agent.cassette:
+        return make()
+    from . import cassette
+    inner = None if agent.cassette_mode == "replay" else make()
+    return getattr(cassette, wrapper)(inner, get_cassette(agent.cassette), agent.cassette_mode,
+                                      agent.cassette_latency, agent.cassette_latency_scale)
+
+def build_cube(sql: Any, agent: AgentSettings | None = None) -> Optional["KpiCube"]:
+    """Loads a KpiCube over `sql` when AGENT_KPI_CUBE is on, else None."""
+    agent = agent or get_settings().agent
+    if not agent.kpi_cube:
+        return None
+    from .kpi_cube import KpiCube
+    # the cube's bulk/signature queries must always reach the database
+    cube = KpiCube(sql.sql if isinstance(sql, CachedSQL) else sql)
+    cube.load()
+    cube.start_auto_refresh(agent.kpi_cube_refresh_s)
+    return cube
+
+@lru_cache(maxsize=1)
+def get_search() -> Any:
+    if get_settings().search_backend.backend == "local":
+        from .local_search import LocalSearch
+        return with_search_cache(with_cassette(LocalSearch, "RecordedSearch"))
+    from .search_client import AzureAISearch
+    return with_search_cache(with_cassette(AzureAISearch, "RecordedSearch"))
+
+@lru_cache(maxsize=1)
+def get_sql() -> Any:
+    from .sql_client import AzureSQL
+    return with_result_cache(with_cassette(AzureSQL, "RecordedSQL"))
+
+@lru_cache(maxsize=1)
+def get_synth() -> "Synthesizer":
+    from .synthesizer import Synthesizer
+    return with_cassette(Synthesizer, "RecordedSynth")
+
+@lru_cache(maxsize=1)
+def get_cube() -> Optional["KpiCube"]:
+    return build_cube(get_sql())
+
+@lru_cache(maxsize=1)
+def get_renderer() -> "AnswerRenderer":
+    from .renderer import AnswerRenderer
+    return AnswerRenderer.from_settings()
+
+@lru_cache(maxsize=1)
+def get_sessions() -> "SessionStore":
+    from .session import SessionStore
+    return SessionStore.from_settings()
+
+@lru_cache(maxsize=1)
+def get_tracer() -> Optional["Tracer"]:
+    from .tracing import Tracer
+    return Tracer.from_settings()
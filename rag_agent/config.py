@@ -1,4 +1,5 @@
 from __future__ import annotations
+from functools import cached_property, lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Each section reads from .env automatically.
@@ -8,6 +9,7 @@ class OpenAISettings(BaseSettings):
     api_key: str                  # key string
     api_version: str = "2024-08-01-preview"
     chat_deployment: str          # e.g. gpt-5-mini
+    embedding_deployment: str = "text-embedding-3-small"   # used by the ingestion pipeline
 
 class SearchSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="AZURE_SEARCH_", env_file=".env", extra="ignore")
@@ -15,6 +17,13 @@ class SearchSettings(BaseSettings):
     api_key: str
     index: str                    # membership-rag-idx
     api_version: str = "2025-09-01"
+    indexer: str | None = None    # optional; its last run time marks index rebuilds
+
+class SearchBackendSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="AZURE_SEARCH_", env_file=".env", extra="ignore")
+    backend: str = "azure"        # azure | local (in-process index, see rag_agent.local_search)
+    local_path: str = "data/search_index"
+    local_nprobe: int = 0         # >0: approximate vector search over this many IVF lists
 
 class SqlSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="AZURE_SQL_", env_file=".env", extra="ignore")
@@ -23,12 +32,81 @@ class SqlSettings(BaseSettings):
     username: str                 # dev SQL login for local use
     password: str
     odbc_driver: str = "ODBC Driver 18 for SQL Server"
+    # connection pool
+    pool_size: int = 5                # max open connections
+    pool_timeout_s: float = 30.0      # max wait for a free connection
+    pool_recycle_s: float = 1800.0    # close connections idle longer than this
+    pool_ping_after_s: float = 60.0   # health-check connections idle longer than this
+    connect_retries: int = 3          # reconnect attempts per checkout
+    connect_backoff_s: float = 0.5    # first backoff, doubled per attempt
+    fetch_batch: int = 500            # rows per fetchmany() call
+
+class AgentSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="AGENT_", env_file=".env", extra="ignore")
+    kpi_cube: bool = False            # answer KPI plans from the in-memory cube
+    kpi_cube_refresh_s: float = 900.0 # poll the fact table for changes (0 = never)
+    sql_cache: bool = False           # cache query_dicts results by SQL + params
+    sql_cache_ttl_s: float = 600.0
+    sql_cache_max_entries: int = 1024
+    sql_cache_max_mb: int = 64
+    sql_cache_path: str | None = None # shared SQLite file for multi-worker deployments (trusted path: values are pickled)
+    search_cache: bool = False        # cache + coalesce hybrid_semantic calls
+    search_cache_ttl_s: float = 300.0
+    search_cache_max_entries: int = 512
+    search_cache_max_mb: int = 32
+    search_cache_path: str | None = None
+    search_cache_check_s: float = 60.0  # how often to probe for an index rebuild
+    answer_mode: str = "llm"          # 'llm' | 'fast' (template answers for simple KPI results)
+    fast_path_max_rows: int = 12      # largest breakdown the template renders
+    sql_max_rows: int = 10000         # rows read per KPI statement (more are flagged as truncated)
+    prompt_budget_tokens: int = 2000  # synthesizer user-prompt budget (tables + snippets + rules)
+    prompt_top_n: int = 15            # longer breakdowns keep the top N labels plus an "other" row
+    prompt_tokenizer: str = "o200k_base"  # tiktoken encoding, or "approx" (~4 chars/token, no tiktoken)
+    snippet_chars: int = 300          # citation snippets are cut to this many characters
+    session_max: int = 1000           # conversations remembered for follow-ups (LRU beyond)
+    session_idle_s: float = 1800.0    # a conversation idle this long is forgotten
+    session_max_turns: int = 8        # turns kept per conversation
+    session_max_results: int = 32     # KPI result slices kept per conversation
+    trace: bool = False               # spans per node and client call (see rag_agent.tracing)
+    trace_exporter: str = "jsonl"     # 'jsonl' | 'otlp'
+    trace_path: str = "data/traces.jsonl"
+    trace_otlp_endpoint: str | None = None   # default: OTEL_EXPORTER_OTLP_(TRACES_)ENDPOINT
+    trace_sample: float = 1.0         # share of turns traced
+    profile_sample: float = 0.0       # share of traced turns also profiled per node
+    profile_dir: str = "data/profiles"
+    profiler: str = "cprofile"        # 'cprofile' | 'pyinstrument'
+    cassette: str | None = None       # record/replay Search, SQL and LLM calls in this file (see rag_agent.cassette)
+    cassette_mode: str = "replay"     # 'record' | 'replay' | 'auto'
+    cassette_latency: bool = False    # replay sleeps for the recorded call durations
+    cassette_latency_scale: float = 1.0
+
+class Settings:
+    """
+    Sections are parsed from env/.env on first access and then reused, so a
+    process that only needs Search (e.g. eval) never validates OpenAI or SQL
+    settings, and .env is read once per section per process.
+    """
+
+    @cached_property
+    def openai(self) -> OpenAISettings:
+        return OpenAISettings()
+
+    @cached_property
+    def search(self) -> SearchSettings:
+        return SearchSettings()
+
+    @cached_property
+    def search_backend(self) -> SearchBackendSettings:
+        return SearchBackendSettings()
+
+    @cached_property
+    def sql(self) -> SqlSettings:
+        return SqlSettings()
 
-class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
-    openai: OpenAISettings = OpenAISettings()
-    search: SearchSettings = SearchSettings()
-    sql: SqlSettings = SqlSettings()
+    @cached_property
+    def agent(self) -> AgentSettings:
+        return AgentSettings()
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    return Settings()
\ No newline at end of file
+    return Settings()
@@ -1,107 +1,409 @@
 from __future__ import annotations
-from typing import TypedDict, List, Dict, Any, Tuple
-from langgraph.graph import StateGraph, END
-from .search_client import AzureAISearch, extract_citations
-from .sql_client import AzureSQL
-from .sql_templates import parse_time_window, build_kpi_sql
-from .intent_router import detect_metric, detect_breakdown, is_metric_or_list_query
-from .synthesizer import Synthesizer
+import asyncio, contextlib, time
+from functools import lru_cache, partial, wraps
+from typing import TypedDict, List, Dict, Any, Tuple, Annotated, Callable, TYPE_CHECKING
+from .search_client import extract_citations
+from .sql_templates import QueryPlan, TimeWindow, build_kpi_sql, build_kpi_multi_sql, sort_rows
+from .query_parser import parse_query
+
+# Heavy dependencies (LangGraph, pyodbc, openai, numpy, settings) are imported
+# where they are first needed, so importing this module stays cheap and
+# credential-free.
+if TYPE_CHECKING:
+    from .search_client import AzureAISearch
+    from .sql_client import AzureSQL
+    from .synthesizer import Synthesizer
+    from .kpi_cube import KpiCube
+    from .renderer import AnswerRenderer
+    from .session import SessionStore
+    from .tracing import Span, Tracer
+
+SEARCH_SELECT = "id,chunk,content,membership_status_original,membership_type_original,special_pricing_reason"
+
+def _merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    # reducer: parallel branches each contribute their own node timing
+    return {**(left or {}), **(right or {})}
 
 # ---- Shared state ----
 class AgentState(TypedDict, total=False):
     user_query: str
+    session_id: str       # optional; enables follow-up turns ("and by gender?")
+    follow_up: bool       # the router completed this turn from the session
+    search_query: str     # retrieval text when it differs from user_query (follow-ups)
+    search_reused: bool   # citations carried over from the previous turn
     intent: str           # 'metrics' or 'explain'
     metric: str           # 'active'|'admissions'|'upgrades'|'left'
     granularity: str      # 'month' or 'year'
     breakdown: str | None
+    metrics: List[str]            # set when the query names several metrics/breakdowns
+    breakdowns: List[str | None]
     time_start_fk: int
     time_end_fk: int
     search_hits: Dict[str, Any]
     sql_rows: List[Dict[str, Any]]
+    sql_tables: Dict[str, List[Dict[str, Any]]]   # multi-slice turns: 'admissions by region' -> rows
+    sql_source: str       # 'cube', 'sql' or 'session'
+    sql_truncated: bool   # the statement returned more than AGENT_SQL_MAX_ROWS rows
     citations: List[Tuple[str,str]]
     answer: str
+    answer_path: str      # 'template' (no LLM call) or 'llm'
+    prompt_tokens: int    # synthesizer prompt size (0 on the template path)
+    turn_start_s: float   # perf_counter at router entry
+    ttft_ms: float        # turn start -> first answer token
+    total_ms: float       # turn start -> answer complete
+    timings_ms: Annotated[Dict[str, float], _merge_timings]   # per-node wall time
+    trace_id: str         # set by the router when the turn is traced (AGENT_TRACE)
+
+# node outputs copied onto the node's span (lists as their lengths)
+_SPAN_FIELDS = ("intent", "follow_up", "search_reused", "sql_source", "sql_truncated", "answer_path",
+                "prompt_tokens", "ttft_ms")
+_SPAN_COUNTS = ("sql_rows", "citations")
+
+def _trace_id(state: AgentState, tracer: Tracer, starts_turn: bool) -> str | None:
+    return state.get("trace_id") or (tracer.new_trace() if starts_turn else None)
+
+def _profiled(tracer: Tracer, name: str, trace_id: str | None):
+    if trace_id is None or not tracer.profiles(trace_id):
+        return contextlib.nullcontext()
+    return tracer.profile(name, trace_id)
 
-search = AzureAISearch()
-sql = AzureSQL()
-synth = Synthesizer()
+def _note(span: Span | None, update: Dict[str, Any]) -> None:
+    if span is not None:
+        span.attrs.update({k: update[k] for k in _SPAN_FIELDS if k in update})
+        span.attrs.update({k: len(update[k]) for k in _SPAN_COUNTS if k in update})
+
+def timed(name: str, starts_turn: bool = False) -> Callable:
+    """
+    Wraps a sync or async node so its partial update also carries {name: elapsed_ms}.
+    Given a `tracer` dep, the node also runs in a span of the turn's trace (the
+    entry node, starts_turn, opens it) and may be profiled.
+    """
+    def deco(fn: Callable[..., Any]):
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def awrapper(state: AgentState, **deps) -> Dict[str, Any]:
+                tracer = deps.pop("tracer", None)
+                t0 = time.perf_counter()
+                if tracer is None:
+                    update = await fn(state, **deps)
+                else:
+                    tid = _trace_id(state, tracer, starts_turn)
+                    with tracer.span(name, tid) as span, _profiled(tracer, name, tid):
+                        update = await fn(state, **deps)
+                        _note(span, update)
+                    if starts_turn and tid:
+                        update["trace_id"] = tid
+                update["timings_ms"] = {name: (time.perf_counter() - t0) * 1000.0}
+                return update
+            return awrapper
+
+        @wraps(fn)
+        def wrapper(state: AgentState, **deps) -> Dict[str, Any]:
+            tracer = deps.pop("tracer", None)
+            t0 = time.perf_counter()
+            if tracer is None:
+                update = fn(state, **deps)
+            else:
+                tid = _trace_id(state, tracer, starts_turn)
+                with tracer.span(name, tid) as span, _profiled(tracer, name, tid):
+                    update = fn(state, **deps)
+                    _note(span, update)
+                if starts_turn and tid:
+                    update["trace_id"] = tid
+            update["timings_ms"] = {name: (time.perf_counter() - t0) * 1000.0}
+            return update
+        return wrapper
+    return deco
 
 # ---- Nodes ----
-def router_node(state: AgentState) -> AgentState:
-    q = state["user_query"]
-    if is_metric_or_list_query(q):
-        kind, tw = parse_time_window(q)
-        metric = detect_metric(q)
-        breakdown = detect_breakdown(q)
-        state.update({
+# Nodes return partial updates (not the whole state) so that 'retrieve' and
+# 'compute' can run in the same superstep without conflicting writes.
+# Each I/O node has a sync and an async form; graph.invoke uses the former,
+# graph.ainvoke the latter.
+def _classify(q: str) -> Dict[str, Any]:
+    p = parse_query(q)
+    if p.intent == "metrics":
+        out = {
             "intent": "metrics",
-            "metric": metric,
-            "granularity": kind,
-            "breakdown": breakdown,
-            "time_start_fk": tw.start_fk,
-            "time_end_fk": tw.end_fk
-        })
-    else:
-        state.update({"intent": "explain"})
-    return state
-
-def search_node(state: AgentState) -> AgentState:
-    r = search.hybrid_semantic(
-        query=state["user_query"],
-        top=5,
-        select="id,chunk,content,membership_status_original,membership_type_original,special_pricing_reason"
-    )
-    state["search_hits"] = r
-    state["citations"] = extract_citations(r, max_snippets=3)
-    return state
+            "metric": p.metric,
+            "granularity": p.granularity,
+            "breakdown": p.breakdown,
+            "time_start_fk": p.window.start_fk,
+            "time_end_fk": p.window.end_fk
+        }
+        if p.is_multi:
+            out.update(metrics=list(p.metrics), breakdowns=list(p.breakdowns))
+        return out
+    return {"intent": "explain"}
 
-def sql_node(state: AgentState) -> AgentState:
-    qplan = build_kpi_sql(
+def _route(state: AgentState, sessions: SessionStore | None) -> Dict[str, Any]:
+    # a follow-up in a known session is completed from it; anything else stands alone
+    q = state["user_query"]
+    sid = state.get("session_id")
+    if sessions is not None and sid:
+        resolved = sessions.resolve(sid, parse_query(q), q)
+        if resolved is not None:
+            if "sql_tables" in resolved:
+                resolved.update(_multi_result(resolved["sql_tables"], "session"))
+            elif "sql_rows" in resolved:
+                resolved.update(sql_source="session", sql_truncated=False)
+            return resolved
+    return _classify(q)
+
+@timed("router", starts_turn=True)
+def router_node(state: AgentState, sessions: SessionStore | None = None) -> Dict[str, Any]:
+    return {"turn_start_s": time.perf_counter(), **_route(state, sessions)}
+
+@timed("router", starts_turn=True)
+async def arouter_node(state: AgentState, sessions: SessionStore | None = None) -> Dict[str, Any]:
+    return {"turn_start_s": time.perf_counter(), **_route(state, sessions)}
+
+@timed("retrieve")
+def search_node(state: AgentState, search: AzureAISearch) -> Dict[str, Any]:
+    q = state.get("search_query") or state["user_query"]
+    r = search.hybrid_semantic(query=q, top=5, select=SEARCH_SELECT)
+    return {"search_hits": r, "citations": extract_citations(r, max_snippets=3)}
+
+@timed("retrieve")
+async def asearch_node(state: AgentState, search: AzureAISearch) -> Dict[str, Any]:
+    q = state.get("search_query") or state["user_query"]
+    r = await search.ahybrid_semantic(query=q, top=5, select=SEARCH_SELECT)
+    return {"search_hits": r, "citations": extract_citations(r, max_snippets=3)}
+
+def _plan(state: AgentState):
+    return build_kpi_sql(
         metric=state["metric"],
         granularity=state["granularity"],
         window=type("TW", (), {"start_fk": state["time_start_fk"], "end_fk": state["time_end_fk"]}),
         breakdown=state.get("breakdown")
     )
-    rows = sql.query_dicts(qplan.sql, qplan.params)
-    state["sql_rows"] = rows
-    return state
 
-def synth_node(state: AgentState) -> AgentState:
-    ans = synth.compose(
+def _multi_plan(state: AgentState, sql: AzureSQL):
+    return build_kpi_multi_sql(
+        metrics=state["metrics"],
+        granularity=state["granularity"],
+        window=TimeWindow(state["time_start_fk"], state["time_end_fk"]),
+        breakdowns=state.get("breakdowns") or (),
+        dialect=getattr(sql, "dialect", "mssql"),
+    )
+
+def _flatten(tables: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # one uniform (table, label, count) view of every slice, for sql_rows consumers
+    return [{"table": name, "label": r.get("label", "(total)"), "count": r["count"]}
+            for name, rows in tables.items() for r in rows]
+
+def _multi_result(tables: Dict[str, List[Dict[str, Any]]], source: str, truncated: bool = False) -> Dict[str, Any]:
+    return {"sql_tables": tables, "sql_rows": _flatten(tables), "sql_source": source, "sql_truncated": truncated}
+
+def _sql_result(res: Any, plan: QueryPlan) -> Dict[str, Any]:
+    # same row order as the cube, whatever the database's collation
+    return {"sql_rows": sort_rows(res.to_dicts(), plan.breakdown), "sql_source": "sql", "sql_truncated": res.truncated}
+
+# Multi-slice turns ("admissions and leavers by region and by grade") are one
+# statement and one database round trip, split back into per-slice tables.
+# Results are streamed (fetchmany) into columns and capped at max_rows.
+@timed("compute")
+def sql_node(state: AgentState, sql: AzureSQL, cube: KpiCube | None = None,
+             max_rows: int | None = None) -> Dict[str, Any]:
+    if state.get("metrics"):
+        mplan = _multi_plan(state, sql)
+        tables = cube.answer_multi(mplan) if cube is not None else None
+        if tables is not None:
+            return _multi_result(tables, "cube")
+        res = sql.query_columns(mplan.sql, mplan.params, max_rows)
+        return _multi_result(mplan.split(res.to_dicts()), "sql", res.truncated)
+    qplan = _plan(state)
+    rows = cube.answer(qplan) if cube is not None else None
+    if rows is not None:
+        return {"sql_rows": rows, "sql_source": "cube", "sql_truncated": False}
+    return _sql_result(sql.query_columns(qplan.sql, qplan.params, max_rows), qplan)
+
+@timed("compute")
+async def asql_node(state: AgentState, sql: AzureSQL, cube: KpiCube | None = None,
+                    max_rows: int | None = None) -> Dict[str, Any]:
+    if state.get("metrics"):
+        mplan = _multi_plan(state, sql)
+        tables = cube.answer_multi(mplan) if cube is not None else None
+        if tables is not None:
+            return _multi_result(tables, "cube")
+        res = await sql.aquery_columns(mplan.sql, mplan.params, max_rows)
+        return _multi_result(mplan.split(res.to_dicts()), "sql", res.truncated)
+    qplan = _plan(state)
+    rows = cube.answer(qplan) if cube is not None else None
+    if rows is not None:
+        return {"sql_rows": rows, "sql_source": "cube", "sql_truncated": False}
+    return _sql_result(await sql.aquery_columns(qplan.sql, qplan.params, max_rows), qplan)
+
+def _fast_answer(state: AgentState, renderer: AnswerRenderer | None) -> str | None:
+    if renderer is None:
+        return None
+    ans = renderer.render(state)
+    renderer.record(ans is not None)
+    return ans
+
+class _TokenSink:
+    """
+    Forwards answer deltas to LangGraph's custom stream ({"token": ...}; a no-op
+    unless the caller streams with stream_mode "custom") and times the turn.
+    """
+
+    def __init__(self, state: AgentState):
+        from langgraph.config import get_stream_writer
+        self.start = state.get("turn_start_s") or time.perf_counter()
+        self.write = get_stream_writer()
+        self.parts: List[str] = []
+        self.ttft_ms: float | None = None
+
+    def __call__(self, token: str) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.start) * 1000.0
+        self.parts.append(token)
+        self.write({"token": token})
+
+    def result(self, path: str, prompt_tokens: int = 0) -> Dict[str, Any]:
+        total_ms = (time.perf_counter() - self.start) * 1000.0
+        return {"answer": "".join(self.parts).strip(), "answer_path": path, "prompt_tokens": prompt_tokens,
+                "ttft_ms": self.ttft_ms if self.ttft_ms is not None else total_ms, "total_ms": total_ms}
+
+def _prompt(state: AgentState, synth: Synthesizer):
+    # built here (not inside the synthesizer) so the turn can report its token count
+    return synth.build_prompt(
         user_query=state["user_query"],
         sql_rows=state.get("sql_rows", []),
-        citations=state.get("citations", [])
+        citations=state.get("citations", []),
+        sql_tables=state.get("sql_tables"),
+        sql_truncated=state.get("sql_truncated", False),
     )
-    state["answer"] = ans
-    return state
+
+@timed("synthesize")
+def synth_node(state: AgentState, synth: Synthesizer, renderer: AnswerRenderer | None = None) -> Dict[str, Any]:
+    sink = _TokenSink(state)
+    ans = _fast_answer(state, renderer)
+    if ans is not None:
+        sink(ans)
+        return sink.result("template")
+    prompt = _prompt(state, synth)
+    for token in synth.stream_compose(
+        user_query=state["user_query"],
+        sql_rows=state.get("sql_rows", []),
+        citations=state.get("citations", []),
+        sql_tables=state.get("sql_tables"),
+        prompt=prompt
+    ):
+        sink(token)
+    return sink.result("llm", prompt.tokens)
+
+@timed("synthesize")
+async def asynth_node(state: AgentState, synth: Synthesizer, renderer: AnswerRenderer | None = None) -> Dict[str, Any]:
+    sink = _TokenSink(state)
+    ans = _fast_answer(state, renderer)
+    if ans is not None:
+        sink(ans)
+        return sink.result("template")
+    prompt = _prompt(state, synth)
+    async for token in synth.astream_compose(
+        user_query=state["user_query"],
+        sql_rows=state.get("sql_rows", []),
+        citations=state.get("citations", []),
+        sql_tables=state.get("sql_tables"),
+        prompt=prompt
+    ):
+        sink(token)
+    return sink.result("llm", prompt.tokens)
+
+def remember_node(state: AgentState, sessions: SessionStore | None = None,
+                  tracer: Tracer | None = None) -> Dict[str, Any]:
+    if sessions is not None and state.get("session_id"):
+        sessions.record(state["session_id"], state)
+    if tracer is not None and state.get("trace_id"):
+        tracer.record_turn(state["trace_id"], state["turn_start_s"],
+                           **{k: state[k] for k in ("intent", "follow_up", "answer_path", "sql_source",
+                                                    "prompt_tokens", "ttft_ms", "total_ms") if k in state})
+    return {}
+
+async def aremember_node(state: AgentState, sessions: SessionStore | None = None,
+                         tracer: Tracer | None = None) -> Dict[str, Any]:
+    return remember_node(state, sessions, tracer)
+
+def _node(fn: Callable, afn: Callable, **deps):
+    from langchain_core.runnables import RunnableLambda
+    return RunnableLambda(partial(fn, **deps), afunc=partial(afn, **deps))
 
 # ---- Graph ----
-def build_graph():
+def build_graph(search: AzureAISearch | None = None,
+                sql: AzureSQL | None = None,
+                synth: Synthesizer | None = None,
+                cube: KpiCube | None = None,
+                renderer: AnswerRenderer | None = None,
+                sessions: SessionStore | None = None,
+                tracer: Tracer | None = None):
+    """
+    Compiles the agent. Clients default to the process-wide Azure clients in
+    rag_agent.clients; pass stand-ins (see rag_agent.standins) to run without
+    cloud services. With AGENT_KPI_CUBE=true and no cube given, a KpiCube over
+    `sql` answers KPI plans in memory, falling back to SQL when it can't.
+    With AGENT_ANSWER_MODE=fast, small KPI results are phrased by the template
+    renderer instead of the LLM. Turns that carry a session_id are remembered
+    in `sessions` (default: the process-wide store) so follow-ups can reuse
+    the previous metric, window, citations and results. With a tracer (default:
+    the process-wide one, set by AGENT_TRACE=true) every node and client call
+    is recorded as a span.
+    """
+    from langgraph.graph import StateGraph, END
+    from . import clients
+    from .config import get_settings
+
+    agent = get_settings().agent
+    if sql is None:
+        sql = clients.get_sql()
+        cube = cube if cube is not None else clients.get_cube()
+    else:
+        cube = cube if cube is not None else clients.build_cube(sql, agent)
+        sql = clients.with_result_cache(sql, agent)
+    search = clients.with_search_cache(search, agent) if search is not None else clients.get_search()
+    synth = synth if synth is not None else clients.get_synth()
+    if renderer is None:
+        renderer = clients.get_renderer()
+    if sessions is None:
+        sessions = clients.get_sessions()
+    if tracer is None:
+        tracer = clients.get_tracer()
+    if tracer is not None:
+        from .tracing import TracedSearch, TracedSQL, TracedSynth, traced
+        search, sql, synth = (traced(search, TracedSearch, tracer), traced(sql, TracedSQL, tracer),
+                              traced(synth, TracedSynth, tracer))
+
     g = StateGraph(AgentState)
-    g.add_node("router", router_node)
-    g.add_node("retrieve", search_node)
-    g.add_node("compute", sql_node)
-    g.add_node("synthesize", synth_node)
+    g.add_node("router", _node(router_node, arouter_node, sessions=sessions, tracer=tracer))
+    g.add_node("retrieve", _node(search_node, asearch_node, search=search, tracer=tracer))
+    g.add_node("compute", _node(sql_node, asql_node, sql=sql, cube=cube, max_rows=agent.sql_max_rows,
+                                tracer=tracer))
+    g.add_node("synthesize", _node(synth_node, asynth_node, synth=synth, renderer=renderer, tracer=tracer))
+    g.add_node("remember", _node(remember_node, aremember_node, sessions=sessions, tracer=tracer))
 
     g.set_entry_point("router")
 
     def route_logic(state: AgentState):
         if state.get("intent") == "metrics":
-            # run both: SQL for numbers + Search for citations
-            return "retrieve"
-        else:
-            # explanation-only path uses Search only, but keep same flow for simplicity
-            return "retrieve"
+            # fan out: SQL for numbers and Search for citations run in parallel;
+            # a follow-up skips whichever of the two its session already answered
+            branches = [n for n, done in (("retrieve", state.get("search_reused")),
+                                          ("compute", "sql_rows" in state)) if not done]
+            return branches or ["synthesize"]
+        # explanation-only path uses Search only
+        return ["retrieve"]
 
-    g.add_conditional_edges("router", route_logic, {"retrieve": "retrieve"})
+    g.add_conditional_edges("router", route_logic, ["retrieve", "compute", "synthesize"])
 
-    # If metrics, also compute SQL, then synth
-    def after_retrieve(state: AgentState):
-        if state.get("intent") == "metrics":
-            return "compute"
-        return "synthesize"
-
-    g.add_conditional_edges("retrieve", after_retrieve, {"compute": "compute", "synthesize": "synthesize"})
+    # fan in: branches finishing in the same superstep trigger synthesize once
+    g.add_edge("retrieve", "synthesize")
     g.add_edge("compute", "synthesize")
-    g.add_edge("synthesize", END)
+    g.add_edge("synthesize", "remember")
+    g.add_edge("remember", END)
+
+    return g.compile()
 
-    return g.compile()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_graph():
+    """The Azure-backed agent, compiled once per process."""
+    return build_graph()
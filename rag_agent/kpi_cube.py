@@ -0,0 +1,248 @@
+# In-memory KPI cube: answers build_kpi_sql plans without a database round trip
+#
+# build_kpi_sql only emits 4 metrics x 5 breakdowns over month-aligned windows of
+# report.fact_membership, so every answer is a slice-and-sum of counts per
+# (metric, active month, grade, region, gender). The cube loads those counts in one
+# grouped query and keeps them in a dense NumPy array.
+#
+# Assumes dimension ids are unique (IDENTITY/PK in dwh.*), so a LEFT JOIN in the
+# bulk load never multiplies fact rows. Plans the cube cannot answer exactly
+# (unknown metric/breakdown, windows not aligned to whole months) return None and
+# the caller falls back to SQL.
+
+from __future__ import annotations
+import calendar, threading, time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .sql_templates import QueryPlan, MultiQueryPlan, label_sort_key, sort_rows, table_name
+
+METRICS = ("active", "admissions", "upgrades", "left")
+BREAKDOWNS = (None, "month", "grade", "region", "gender")
+
+# One scan of the fact table, grouped by every dimension the planner can break down
+# by. *_ok marks whether the INNER JOIN of the per-breakdown query would match.
+CUBE_SQL = """
+SELECT
+    fm.active_date_fk / 100 AS ym, d.year, d.month_no, d.mth_year,
+    CASE WHEN g.id IS NULL THEN 0 ELSE 1 END AS g_ok, g.grade_name,
+    CASE WHEN h.id IS NULL THEN 0 ELSE 1 END AS h_ok, h.regional_hub,
+    CASE WHEN m.id IS NULL THEN 0 ELSE 1 END AS m_ok, m.gender,
+    SUM(CASE WHEN fm.membership_status_original = 'Active' THEN 1 ELSE 0 END) AS n_active,
+    SUM(CASE WHEN fm.membership_type_original = 'Join' THEN 1 ELSE 0 END) AS n_admissions,
+    SUM(CASE WHEN fm.membership_type_original = 'Upgrade' THEN 1 ELSE 0 END) AS n_upgrades,
+    SUM(CASE WHEN fm.is_attrition = 1 OR fm.membership_status_original IN ('Resigned','Deceased')
+             THEN 1 ELSE 0 END) AS n_left
+FROM report.fact_membership fm
+JOIN report.dim_date d ON d.date_id = fm.active_date_fk
+LEFT JOIN report.dim_grade g ON g.id = fm.grade_fk
+LEFT JOIN report.dim_hub h ON h.id = fm.hub_fk
+LEFT JOIN report.dim_member m ON m.id = fm.member_fk
+GROUP BY fm.active_date_fk / 100, d.year, d.month_no, d.mth_year,
+         CASE WHEN g.id IS NULL THEN 0 ELSE 1 END, g.grade_name,
+         CASE WHEN h.id IS NULL THEN 0 ELSE 1 END, h.regional_hub,
+         CASE WHEN m.id IS NULL THEN 0 ELSE 1 END, m.gender
+"""
+
+# Cheap change detector for refresh_if_changed().
+SIGNATURE_SQL = """
+SELECT COUNT(*) AS n, MAX(membership_sk) AS max_sk, MAX(modified_date_fk) AS max_modified
+FROM report.fact_membership
+"""
+
+_UNMATCHED = object()   # dimension slot 0: fact rows with no dim row (excluded by the INNER JOIN)
+
+class _Axis:
+    """Label <-> index mapping for one dimension; index 0 is the unmatched slot."""
+
+    def __init__(self):
+        self.labels: List[Any] = [_UNMATCHED]
+        self._index: Dict[Any, int] = {}
+
+    def index(self, ok: int, label: Any) -> int:
+        if not ok:
+            return 0
+        i = self._index.get(label)
+        if i is None:
+            i = self._index[label] = len(self.labels)
+            self.labels.append(label)
+        return i
+
+@dataclass(frozen=True)
+class _Snapshot:
+    counts: np.ndarray                  # int64 [metric, month, grade, region, gender]
+    months: np.ndarray                  # int32 yyyymm per month index, ascending
+    month_rows: List[Tuple[int, int, Any]]   # (year, month_no, mth_year) per month index
+    grades: List[Any]
+    regions: List[Any]
+    genders: List[Any]
+    signature: Tuple[Any, ...]
+    loaded_at: float
+
+class KpiCube:
+    def __init__(self, sql: Any):
+        """`sql` is anything with query_dicts(sql, params) (AzureSQL or a stand-in)."""
+        self.sql = sql
+        self._snap: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()    # answer() runs on request threads, load() on the refresh thread
+        self.stats = {"loads": 0, "hits": 0, "misses": 0, "load_ms": 0.0}
+
+    # ---- loading ----
+    def _signature(self) -> Tuple[Any, ...]:
+        row = self.sql.query_dicts(SIGNATURE_SQL.strip())[0]
+        return (row["n"], row["max_sk"], row["max_modified"])
+
+    def load(self) -> None:
+        t0 = time.perf_counter()
+        signature = self._signature()
+        rows = self.sql.query_dicts(CUBE_SQL.strip())
+
+        month_meta: Dict[int, Tuple[int, int, Any]] = {}
+        grades, regions, genders = _Axis(), _Axis(), _Axis()
+        keyed: List[Tuple[int, int, int, int, Tuple[int, int, int, int]]] = []
+        for r in rows:
+            ym = int(r["ym"])
+            month_meta.setdefault(ym, (r["year"], r["month_no"], r["mth_year"]))
+            keyed.append((
+                ym,
+                grades.index(r["g_ok"], r["grade_name"]),
+                regions.index(r["h_ok"], r["regional_hub"]),
+                genders.index(r["m_ok"], r["gender"]),
+                (r["n_active"] or 0, r["n_admissions"] or 0, r["n_upgrades"] or 0, r["n_left"] or 0),
+            ))
+
+        months = np.array(sorted(month_meta), dtype=np.int32)
+        month_idx = {int(ym): i for i, ym in enumerate(months)}
+        counts = np.zeros((len(METRICS), len(months), len(grades.labels),
+                           len(regions.labels), len(genders.labels)), dtype=np.int64)
+        if keyed:
+            ym, gi, ri, si, n = zip(*keyed)
+            mi = np.fromiter((month_idx[y] for y in ym), dtype=np.intp, count=len(ym))
+            n_arr = np.asarray(n, dtype=np.int64).T
+            for k in range(len(METRICS)):
+                np.add.at(counts[k], (mi, np.asarray(gi), np.asarray(ri), np.asarray(si)), n_arr[k])
+
+        snap = _Snapshot(
+            counts=counts, months=months,
+            month_rows=[month_meta[int(ym)] for ym in months],
+            grades=grades.labels, regions=regions.labels, genders=genders.labels,
+            signature=signature, loaded_at=time.time(),
+        )
+        with self._lock:
+            self._snap = snap
+        with self._stats_lock:
+            self.stats["loads"] += 1
+            self.stats["load_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def refresh_if_changed(self) -> bool:
+        """Reloads when the fact table's row count / max key / max modified date moved."""
+        if self._snap is None or self._signature() != self._snap.signature:
+            self.load()
+            return True
+        return False
+
+    def start_auto_refresh(self, interval_s: float) -> None:
+        if interval_s <= 0 or self._thread is not None:
+            return
+
+        def loop() -> None:
+            while not self._stop.wait(interval_s):
+                try:
+                    self.refresh_if_changed()
+                except Exception:
+                    pass   # keep serving the last good snapshot; retry next tick
+
+        self._thread = threading.Thread(target=loop, name="kpi-cube-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout_s: float = 5.0) -> None:
+        """Stops the refresh thread, waiting up to timeout_s for a reload in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+            self._thread = None
+
+    # ---- answering ----
+    @staticmethod
+    def _month_span(start_fk: int, end_fk: int) -> Optional[Tuple[int, int]]:
+        """[start_fk, end_fk) as inclusive yyyymm bounds, or None if not whole months."""
+        sy, sm, sd = start_fk // 10000, (start_fk // 100) % 100, start_fk % 100
+        last = end_fk - 1
+        ey, em, ed = last // 10000, (last // 100) % 100, last % 100
+        if sd != 1 or not (1 <= sm <= 12 and 1 <= em <= 12):
+            return None
+        if ed != calendar.monthrange(ey, em)[1]:
+            return None
+        return sy * 100 + sm, ey * 100 + em
+
+    def answer(self, plan: QueryPlan) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the rows AzureSQL.query_dicts(plan.sql, plan.params) would, in the
+        shared order of sort_rows(), or None when the plan is outside the cube.
+        """
+        snap = self._snap
+        if (snap is None or plan.metric not in METRICS or plan.breakdown not in BREAKDOWNS
+                or plan.window is None):
+            self._count("misses")
+            return None
+        span = self._month_span(plan.window.start_fk, plan.window.end_fk)
+        if span is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+
+        lo = int(np.searchsorted(snap.months, span[0], side="left"))
+        hi = int(np.searchsorted(snap.months, span[1], side="right"))
+        sub = snap.counts[METRICS.index(plan.metric), lo:hi]     # [month, grade, region, gender]
+
+        if plan.breakdown is None:
+            return [{"count": int(sub.sum())}]
+        if plan.breakdown == "month":
+            per = sub.sum(axis=(1, 2, 3))
+            return [
+                {"year": snap.month_rows[lo + i][0], "month_no": snap.month_rows[lo + i][1],
+                 "label": snap.month_rows[lo + i][2], "count": int(c)}
+                for i, c in enumerate(per) if c > 0
+            ]
+        axis, labels = {
+            "grade": ((0, 2, 3), snap.grades),
+            "region": ((0, 1, 3), snap.regions),
+            "gender": ((0, 1, 2), snap.genders),
+        }[plan.breakdown]
+        per = sub.sum(axis=axis)
+        rows = [{"label": labels[i], "count": int(per[i])} for i in range(1, len(labels)) if per[i] > 0]
+        rows.sort(key=lambda r: label_sort_key(r["label"]))
+        return rows
+
+    def answer_multi(self, plan: MultiQueryPlan) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """plan.split(rows of plan.sql), slice by slice; None if any slice is outside the cube."""
+        tables: Dict[str, List[Dict[str, Any]]] = {}
+        for p in plan.slices():
+            rows = self.answer(p)
+            if rows is None:
+                return None
+            tables[table_name(p.metric, p.breakdown)] = rows
+        return tables
+
+def verify_parity(cube: KpiCube, sql: Any, plans: Sequence[QueryPlan]) -> List[str]:
+    """Runs each plan both ways; returns a description of every mismatch (empty = parity)."""
+    problems: List[str] = []
+    for p in plans:
+        expected = sort_rows(sql.query_dicts(p.sql, p.params), p.breakdown)
+        got = cube.answer(p)
+        if got is None:
+            problems.append(f"{p.metric}/{p.breakdown}/{p.window}: cube declined")
+        elif got != expected:
+            problems.append(f"{p.metric}/{p.breakdown}/{p.window}: cube={got!r} sql={expected!r}")
+    return problems
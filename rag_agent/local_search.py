@@ -0,0 +1,449 @@
+# In-process hybrid retrieval over a local snapshot of the search index
+#
+# Executes the same request bodies we send to Azure AI Search (search, filter,
+# vectorQueries, top, select, captions) and returns the same response shape
+# ({"value": [...], "@search.captions"}), so AzureAISearch and eval's SearchClient
+# can be swapped for it with AZURE_SEARCH_BACKEND=local.
+#
+#   text     BM25 (k1=1.2, b=0.75, the Azure defaults) over an inverted index
+#   vector   cosine over a memory-mapped float32 matrix; exact, or IVF when nprobe > 0
+#   hybrid   Reciprocal Rank Fusion (k=60), vector weight scales its RRF term
+#   filter   OData eq/ne on stored fields combined with and/or/not and parentheses
+#
+# Not reproduced: the semantic ranker (queryType=semantic keeps the fused order)
+# and extractive answers (@search.answers is empty). Captions are the chunk
+# sentence with the most query-term overlap.
+#
+# Index directory layout (written by LocalSearchIndex.build):
+#   manifest.json   embedder config, doc count, build time
+#   docs.jsonl      stored fields per doc, row-aligned with the matrices
+#   vectors.npy     float32 [n_docs, dim], L2-normalised
+#   bm25.npz        CSR postings (indptr, docs, tfs) + doc lengths
+#   vocab.json      term -> postings row
+#   ivf.npz         optional coarse quantizer (centroids, per-doc list id)
+
+from __future__ import annotations
+import asyncio, json, math, os, re, threading, time, zlib
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+MAX_TEXT_RECALL = 1000      # text hits that take part in fusion
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+# ---- embeddings ----
+class HashingEmbedder:
+    """
+    Deterministic, dependency-free text embedding: signed feature hashing of word
+    unigrams and bigrams, L2-normalised. Documents and queries must use the same
+    embedder, so its config is stored in the index manifest.
+    """
+
+    kind = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def config(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "dim": self.dim}
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            toks = tokenize(text)
+            for feat in toks + [a + " " + b for a, b in zip(toks, toks[1:])]:
+                h = zlib.crc32(feat.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+def embedder_from_config(cfg: Dict[str, Any]) -> HashingEmbedder:
+    if cfg.get("kind") != HashingEmbedder.kind:
+        raise ValueError(f"unsupported embedder in manifest: {cfg}")
+    return HashingEmbedder(dim=int(cfg["dim"]))
+
+# ---- OData filters ----
+_ODATA_TOKEN = re.compile(r"\s*(?:(\()|(\))|'((?:[^']|'')*)'|([-+]?\d+(?:\.\d+)?)|([A-Za-z_][\w/]*))")
+
+class ODataFilter:
+    """
+    Subset of OData $filter: `field eq|ne literal`, and/or/not, parentheses.
+    Literals are 'strings', numbers, true/false/null. `and` binds tighter than `or`.
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.tokens: List[Tuple[str, Any]] = []
+        pos = 0
+        while pos < len(expr):
+            if expr[pos:].strip() == "":
+                break
+            m = _ODATA_TOKEN.match(expr, pos)
+            if m is None:
+                raise ValueError(f"cannot parse filter at {expr[pos:]!r}")
+            lp, rp, s, num, word = m.groups()
+            if lp: self.tokens.append(("(", None))
+            elif rp: self.tokens.append((")", None))
+            elif s is not None: self.tokens.append(("lit", s.replace("''", "'")))
+            elif num is not None: self.tokens.append(("lit", float(num) if "." in num else int(num)))
+            elif word.lower() in ("and", "or", "not", "eq", "ne"): self.tokens.append((word.lower(), None))
+            elif word.lower() in ("true", "false"): self.tokens.append(("lit", word.lower() == "true"))
+            elif word.lower() == "null": self.tokens.append(("lit", None))
+            else: self.tokens.append(("field", word))
+            pos = m.end()
+        self._i = 0
+        self.tree = self._or()
+        if self._i != len(self.tokens):
+            raise ValueError(f"unexpected {self.tokens[self._i][0]!r} in filter {expr!r}")
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self._i][0] if self._i < len(self.tokens) else None
+
+    def _take(self, kind: str) -> Any:
+        if self._peek() != kind:
+            raise ValueError(f"expected {kind!r} in filter {self.expr!r}")
+        self._i += 1
+        return self.tokens[self._i - 1][1]
+
+    def _or(self) -> Tuple:
+        node = self._and()
+        while self._peek() == "or":
+            self._i += 1
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self) -> Tuple:
+        node = self._not()
+        while self._peek() == "and":
+            self._i += 1
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self) -> Tuple:
+        if self._peek() == "not":
+            self._i += 1
+            return ("not", self._not())
+        if self._peek() == "(":
+            self._i += 1
+            node = self._or()
+            self._take(")")
+            return node
+        field = self._take("field")
+        op = self._peek()
+        if op not in ("eq", "ne"):
+            raise ValueError(f"only eq/ne comparisons are supported in filter {self.expr!r}")
+        self._i += 1
+        return (op, field, self._take("lit"))
+
+    def mask(self, column: Callable[[str], np.ndarray]) -> np.ndarray:
+        """Boolean mask over docs; `column(field)` returns that field's values as an object array."""
+        def ev(node: Tuple) -> np.ndarray:
+            op = node[0]
+            if op == "or": return ev(node[1]) | ev(node[2])
+            if op == "and": return ev(node[1]) & ev(node[2])
+            if op == "not": return ~ev(node[1])
+            eq = column(node[1]) == node[2]
+            return eq if op == "eq" else ~eq
+        return ev(self.tree)
+
+# ---- index ----
+class LocalSearchIndex:
+    def __init__(self, path: str, nprobe: int = 0):
+        """Opens an index directory; nprobe > 0 searches vectors through the IVF lists."""
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.embedder = embedder_from_config(self.manifest["embedder"])
+        with open(os.path.join(path, "docs.jsonl"), "r", encoding="utf-8") as f:
+            self.docs: List[Dict[str, Any]] = [json.loads(line) for line in f if line.strip()]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        bm = np.load(os.path.join(path, "bm25.npz"))
+        self.indptr, self.post_docs, self.post_tfs = bm["indptr"], bm["docs"], bm["tfs"]
+        self.doc_len = bm["doc_len"].astype(np.float64)
+        self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        self.nprobe = nprobe
+        self.ivf: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        ivf_path = os.path.join(path, "ivf.npz")
+        if nprobe > 0 and os.path.exists(ivf_path):
+            z = np.load(ivf_path)
+            self.ivf = (z["centroids"], z["assign"])
+        self._columns: Dict[str, np.ndarray] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    # ---- build ----
+    @staticmethod
+    def build(docs: Iterable[Dict[str, Any]], out_dir: str, embedder: Optional[HashingEmbedder] = None,
+              text_field: str = "chunk", ivf_lists: int = 0, batch: int = 1024, seed: int = 0) -> str:
+        """
+        Writes an index directory from docs (dicts with 'id' and `text_field`).
+        Vectors are embedded in batches straight into a memory-mapped .npy.
+        """
+        embedder = embedder or HashingEmbedder()
+        docs = list(docs)
+        os.makedirs(out_dir, exist_ok=True)
+        vocab: Dict[str, int] = {}
+        rows: List[Tuple[int, int, int]] = []        # (term, doc, tf)
+        doc_len = np.zeros(len(docs), dtype=np.int32)
+        with open(os.path.join(out_dir, "docs.jsonl"), "w", encoding="utf-8") as f:
+            for i, d in enumerate(docs):
+                f.write(json.dumps(d, ensure_ascii=False) + "\n")
+                toks = tokenize(str(d.get(text_field) or ""))
+                doc_len[i] = len(toks)
+                for term, tf in Counter(toks).items():
+                    rows.append((vocab.setdefault(term, len(vocab)), i, tf))
+
+        arr = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        arr = arr[np.lexsort((arr[:, 1], arr[:, 0]))]
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.add.at(indptr, arr[:, 0] + 1, 1)
+        np.savez(os.path.join(out_dir, "bm25.npz"), indptr=np.cumsum(indptr), docs=arr[:, 1].astype(np.int32),
+                 tfs=arr[:, 2].astype(np.int32), doc_len=doc_len)
+        with open(os.path.join(out_dir, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f)
+
+        vec_path = os.path.join(out_dir, "vectors.npy")
+        vecs = np.lib.format.open_memmap(vec_path, mode="w+", dtype=np.float32, shape=(len(docs), embedder.dim))
+        for s in range(0, len(docs), batch):
+            vecs[s:s + batch] = embedder.embed([str(d.get(text_field) or "") for d in docs[s:s + batch]])
+        vecs.flush()
+
+        if ivf_lists > 0 and len(docs):
+            centroids, assign = _kmeans(np.asarray(vecs), min(ivf_lists, len(docs)), seed=seed)
+            np.savez(os.path.join(out_dir, "ivf.npz"), centroids=centroids, assign=assign)
+        del vecs
+
+        manifest = {"embedder": embedder.config(), "n_docs": len(docs), "text_field": text_field,
+                    "ivf_lists": ivf_lists, "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return out_dir
+
+    # ---- scoring ----
+    def column(self, field: str) -> np.ndarray:
+        col = self._columns.get(field)
+        if col is None:
+            col = np.empty(len(self.docs), dtype=object)
+            col[:] = [d.get(field) for d in self.docs]
+            with self._lock:
+                self._columns[field] = col
+        return col
+
+    def filter_mask(self, expr: str) -> np.ndarray:
+        """Parsed and evaluated once per distinct filter string (the eval/agent use a handful)."""
+        mask = self._masks.get(expr)
+        if mask is None:
+            mask = ODataFilter(expr).mask(self.column)
+            mask.setflags(write=False)
+            with self._lock:
+                if len(self._masks) >= 256:
+                    self._masks.clear()
+                self._masks[expr] = mask
+        return mask
+
+    def bm25(self, query: str) -> np.ndarray:
+        """BM25 score per doc (0 for docs matching no query term)."""
+        scores = np.zeros(len(self.docs), dtype=np.float64)
+        n = len(self.docs)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            docs, tfs = self.post_docs[lo:hi], self.post_tfs[lo:hi].astype(np.float64)
+            idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[docs] / max(self.avgdl, 1e-9))
+            scores[docs] += idf * tfs * (BM25_K1 + 1.0) / (tfs + norm)   # docs are unique per term
+        return scores
+
+    def knn(self, qvec: np.ndarray, k: int, allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc indices, cosine) of the k nearest docs, best first, among `allowed`."""
+        if self.ivf is not None:
+            centroids, assign = self.ivf
+            lists = np.argsort(-(centroids @ qvec))[: self.nprobe]
+            cand = np.isin(assign, lists)
+            allowed = cand if allowed is None else (allowed & cand)
+        if allowed is None:
+            idx = np.arange(len(self.docs))
+            sims = np.asarray(self.vectors @ qvec)
+        else:
+            idx = np.flatnonzero(allowed)
+            sims = np.asarray(self.vectors[idx] @ qvec)
+        return _top(idx, sims, k)
+
+    # ---- request execution ----
+    def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        top = int(body.get("top", 50))
+        skip = int(body.get("skip", 0))
+        allowed = self.filter_mask(body["filter"]) if body.get("filter") else None
+
+        rankings: List[Tuple[np.ndarray, np.ndarray, float]] = []      # (docs, scores, weight)
+        text = (body.get("search") or "").strip()
+        if text and text != "*":
+            s = self.bm25(text)
+            hit = s > 0 if allowed is None else (s > 0) & allowed
+            idx = np.flatnonzero(hit)
+            rankings.append((*_top(idx, s[idx], MAX_TEXT_RECALL), 1.0))
+        for vq in body.get("vectorQueries") or []:
+            if vq.get("kind") == "text":
+                qvec = self.embedder.embed([vq["text"]])[0]
+            else:
+                qvec = np.asarray(vq["vector"], dtype=np.float32)
+                qvec = qvec / max(float(np.linalg.norm(qvec)), 1e-12)
+            k = int(vq.get("k") or vq.get("k_nearest_neighbors") or 50)
+            rankings.append((*self.knn(qvec, k, allowed), float(vq.get("weight", 1.0))))
+
+        if not rankings:                                # match-all (e.g. search="*")
+            idx = np.arange(len(self.docs)) if allowed is None else np.flatnonzero(allowed)
+            order, scores = idx, np.ones(len(idx))
+        elif len(rankings) == 1:
+            order, scores, _ = rankings[0]
+        else:
+            docs = np.concatenate([d for d, _, _ in rankings])
+            contrib = np.concatenate([w / (RRF_K + np.arange(1, len(d) + 1)) for d, _, w in rankings])
+            uniq, inv = np.unique(docs, return_inverse=True)
+            fused = np.bincount(inv, weights=contrib)
+            order, scores = _top(uniq, fused, len(uniq))
+
+        fields = [f.strip() for f in (body.get("select") or "").split(",") if f.strip() and f.strip() != "*"]
+        want_captions = bool(body.get("captions"))
+        caption_terms = set(tokenize(text)) if want_captions else set()
+        text_field = self.manifest.get("text_field", "chunk")
+        value: List[Dict[str, Any]] = []
+        for d, s in zip(order[skip:skip + top].tolist(), scores[skip:skip + top].tolist()):
+            doc = self.docs[d]
+            hit = {"@search.score": float(s)}
+            hit.update({f: doc.get(f) for f in fields} if fields else doc)
+            if want_captions:
+                hit["@search.captions"] = [{"text": _caption(str(doc.get(text_field) or ""), caption_terms),
+                                            "highlights": ""}]
+            value.append(hit)
+        out: Dict[str, Any] = {"value": value}
+        if body.get("count"):
+            out["@odata.count"] = len(order)
+        if body.get("answers"):
+            out["@search.answers"] = []
+        return out
+
+def _top(idx: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k of (idx, scores), descending score, ties by doc index."""
+    if len(idx) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        idx, scores = idx[part], scores[part]
+    order = np.lexsort((idx, -scores))
+    return idx[order], scores[order]
+
+def _caption(text: str, terms: set) -> str:
+    sentences = [s for s in _SENTENCE.split(text) if s.strip()] or [text]
+    return max(sentences, key=lambda s: len(terms.intersection(tokenize(s))))
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means for the IVF coarse quantizer; returns (centroids, assign)."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    assign = np.zeros(len(x), dtype=np.int32)
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1).astype(np.int32)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                v = members.sum(axis=0)
+                centroids[c] = v / max(float(np.linalg.norm(v)), 1e-12)
+    return centroids.astype(np.float32), assign
+
+# ---- client facade ----
+class LocalSearch:
+    """
+    Drop-in for AzureAISearch (hybrid_semantic / ahybrid_semantic / index_generation)
+    and for eval's SearchClient (post(body)), backed by a LocalSearchIndex.
+    """
+
+    def __init__(self, path: Optional[str] = None, nprobe: Optional[int] = None):
+        if path is None or nprobe is None:
+            from .config import get_settings
+            b = get_settings().search_backend
+            path = path or b.local_path
+            nprobe = b.local_nprobe if nprobe is None else nprobe
+        self.engine = LocalSearchIndex(path, nprobe=nprobe)
+        # identity fields, as on AzureAISearch (CachedSearch keys on them)
+        self.endpoint, self.index, self.api_version = "local", path, None
+        self.stats = {"requests": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def post(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._stats_lock:
+            self.stats["requests"] += 1
+        return self.engine.search(body)
+
+    def build_body(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        from .search_client import hybrid_semantic_body
+        return hybrid_semantic_body(query, top, select)
+
+    def hybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        return self.post(self.build_body(query, top, select))
+
+    async def ahybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        # CPU-bound and short; a worker thread keeps the event loop free during the NumPy work
+        return await asyncio.to_thread(self.hybrid_semantic, query, top, select)
+
+    def index_generation(self) -> str:
+        m = self.engine.manifest
+        return f"local:{m.get('built_at')}:{m.get('n_docs')}"
+
+    async def aclose(self) -> None:
+        return None
+
+# ---- snapshot sources ----
+def docs_from_azure(page: int = 1000) -> Iterable[Dict[str, Any]]:
+    """Pages every stored field of the live index (vectors are not retrievable and are rebuilt locally)."""
+    from .search_client import AzureAISearch
+    az = AzureAISearch()
+    skip = 0
+    while True:
+        resp = az.session.post(az.url, json={"search": "*", "top": page, "skip": skip}, timeout=60)
+        resp.raise_for_status()
+        hits = resp.json().get("value", [])
+        for h in hits:
+            yield {k: v for k, v in h.items() if not k.startswith("@search.")}
+        if len(hits) < page:
+            return
+        skip += page
+
+def docs_from_jsonl(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def main() -> None:
+    import argparse
+    ap = argparse.ArgumentParser(description="Build a local search index snapshot")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--from-azure", action="store_true", help="snapshot the live Azure AI Search index")
+    src.add_argument("--from-jsonl", metavar="PATH", help="docs as JSON lines (id, chunk, filter fields)")
+    ap.add_argument("--out", default="data/search_index")
+    ap.add_argument("--dim", type=int, default=384, help="hashing embedder dimension")
+    ap.add_argument("--ivf-lists", type=int, default=0, help="IVF lists for approximate vector search (0 = exact only)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    docs = docs_from_azure() if args.from_azure else docs_from_jsonl(args.from_jsonl)
+    LocalSearchIndex.build(docs, args.out, HashingEmbedder(args.dim), ivf_lists=args.ivf_lists)
+    idx = LocalSearchIndex(args.out)
+    print(f"{len(idx)} docs -> {args.out} in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
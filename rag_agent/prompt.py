@@ -0,0 +1,162 @@
+# Token-budgeted synthesizer prompts
+#
+# The user message is the query, the SQL tables as CSV, the citation snippets
+# and the rules. To keep it bounded:
+#   - breakdowns longer than top_n rows keep the top_n labels by count plus one
+#     "other" row (month series keep the latest top_n months plus "earlier")
+#   - snippets are deduplicated (same doc id or same text) and cut to snippet_chars
+#   - if the prompt is still over budget, snippets are dropped from the end, then
+#     top_n is halved, until it fits or nothing is left to shrink
+# Token counts use the tiktoken encoding named by AGENT_PROMPT_TOKENIZER, loaded
+# once when the PromptBuilder is built (at startup, not on the first request).
+# tiktoken fetches an encoding it has not cached, so offline hosts should set
+# TIKTOKEN_CACHE_DIR to a pre-seeded directory or use "approx" (~4 characters
+# per token, tiktoken never imported). Without tiktoken installed, also "approx".
+
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+USER_TEMPLATE = """
+User query:
+{user_query}
+
+SQL results (CSV):
+{tables}
+
+Citations (snippets from Azure AI Search):
+{cites}
+
+Rules:
+- Report the number(s) directly from SQL results.
+- If multiple rows exist, summarize patterns and mention the grouping column name.
+- If there are several [named] tables, report each one under its name.
+- A row labelled "other (...)" or "earlier (...)" is the sum of the rows not listed.
+- End with “Sources: Azure SQL, Azure AI Search”.
+"""
+
+DEFAULT_TOKENIZER = "o200k_base"
+
+@lru_cache(maxsize=4)
+def _encoder(name: str) -> Any:
+    if name == "approx":
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:      # not installed, or the encoding can't be loaded offline
+        return None
+
+def count_tokens(text: str, tokenizer: str = DEFAULT_TOKENIZER) -> int:
+    enc = _encoder(tokenizer)
+    return len(enc.encode(text)) if enc is not None else (len(text) + 3) // 4
+
+def roll_up(rows: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+    """At most top_n + 1 rows: the largest labels (or latest months) plus one row summing the rest."""
+    if len(rows) <= top_n + 1 or "label" not in rows[0]:
+        return rows
+    blank = {k: None for k in rows[0]}
+    if "month_no" in rows[0]:
+        kept, rest = rows[-top_n:], rows[:-top_n]
+        other = {**blank, "label": f"earlier ({len(rest)} months)", "count": sum(int(r["count"]) for r in rest)}
+        return [other, *kept]
+    order = sorted(range(len(rows)), key=lambda i: -int(rows[i]["count"]))
+    kept = [rows[i] for i in order[:top_n]]
+    rest = [rows[i] for i in order[top_n:]]
+    return [*kept, {**blank, "label": f"other ({len(rest)} labels)", "count": sum(int(r["count"]) for r in rest)}]
+
+def to_csv(rows: List[Dict[str, Any]]) -> str:
+    if rows and isinstance(rows[0], dict) and "count" in rows[0]:
+        headers = [k for k in rows[0].keys()]
+        lines = [", ".join(headers)]
+        for r in rows:
+            lines.append(", ".join(str(r[h]) for h in headers))
+        return "\n".join(lines)
+    return "count\n0"
+
+def _cut(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0] or text[:max_chars]
+    return cut + "…"
+
+def clean_citations(citations: List[Tuple[str, str]], max_chars: int) -> List[Tuple[str, str]]:
+    """Drops repeated doc ids and repeated snippet text, and cuts each snippet to max_chars."""
+    docs, texts = set(), set()
+    out: List[Tuple[str, str]] = []
+    for doc, snippet in citations:
+        key = " ".join(snippet.lower().split())
+        if doc in docs or (key and key in texts):
+            continue
+        docs.add(doc)
+        texts.add(key)
+        out.append((doc, _cut(snippet, max_chars)))
+    return out
+
+@dataclass(frozen=True)
+class Prompt:
+    messages: List[Dict[str, str]]
+    tokens: int              # system + user message
+    rows_in: int             # SQL rows given
+    rows_shown: int          # rows written after roll-up
+    snippets: int            # citation snippets written
+    shrunk: bool             # something was rolled up, cut or dropped
+
+class PromptBuilder:
+    def __init__(self, system: str = "", budget_tokens: int = 2000, top_n: int = 15, snippet_chars: int = 300,
+                 tokenizer: str = DEFAULT_TOKENIZER):
+        self.system = system
+        self.budget_tokens = budget_tokens
+        self.top_n = max(1, top_n)
+        self.snippet_chars = snippet_chars
+        self.tokenizer = tokenizer
+        _encoder(tokenizer)                  # load (or fail over to "approx") now, not on the first turn
+        self._system_tokens = count_tokens(system, tokenizer)
+
+    @classmethod
+    def from_settings(cls, system: str = "") -> "PromptBuilder":
+        from .config import get_settings
+        a = get_settings().agent
+        return cls(system, a.prompt_budget_tokens, a.prompt_top_n, a.snippet_chars, a.prompt_tokenizer)
+
+    def _tables(self, sql_rows: List[Dict[str, Any]], sql_tables: Optional[Dict[str, List[Dict[str, Any]]]],
+                top_n: int, sql_truncated: bool) -> Tuple[str, int]:
+        named = sql_tables if sql_tables else {"": sql_rows}
+        parts, shown = [], 0
+        for name, rows in named.items():
+            kept = roll_up(rows, top_n)
+            shown += len(kept)
+            csv = to_csv(kept)
+            parts.append(f"[{name}]\n{csv}" if name else csv)
+        text = "\n\n".join(parts)
+        if sql_truncated:
+            text += "\n(result cut at the row limit; totals may be incomplete)"
+        return text, shown
+
+    def build(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+              sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, sql_truncated: bool = False) -> Prompt:
+        rows_in = sum(len(r) for r in sql_tables.values()) if sql_tables else len(sql_rows)
+        cites = clean_citations(citations, self.snippet_chars)
+        shrunk = sql_truncated or cites != [(doc, " ".join(s.split())) for doc, s in citations]
+        top_n = self.top_n
+        while True:
+            tables, shown = self._tables(sql_rows, sql_tables, top_n, sql_truncated)
+            user = USER_TEMPLATE.format(user_query=user_query, tables=tables,
+                                        cites="\n".join(f"- {doc}: {snippet}" for doc, snippet in cites))
+            tokens = self._system_tokens + count_tokens(user, self.tokenizer)
+            if tokens <= self.budget_tokens:
+                break
+            if cites:
+                cites = cites[:-1]
+            elif top_n > 1:
+                top_n = max(1, top_n // 2)
+            else:
+                break              # query + rules alone exceed the budget; send as is
+            shrunk = True
+        return Prompt(
+            messages=[{"role": "system", "content": self.system}, {"role": "user", "content": user}],
+            tokens=tokens, rows_in=rows_in, rows_shown=shown, snippets=len(cites),
+            shrunk=shrunk or shown < rows_in,
+        )
@@ -0,0 +1,214 @@
+# One-pass query understanding: intent, metric, breakdown, time window, retrieval anchor
+#
+# The query is lower-cased once and scanned once with a single compiled pattern
+# whose named groups cover every cue the router, SQL templates and eval
+# normalisation look for. Precedence then reproduces the original per-feature
+# rules (upgrades > admissions > left > active; explicit month > last month >
+# this month > this year > latest completed month; a list/count cue or two named
+# metrics make it a metrics question). Results are immutable and
+# memoised per (text, today).
+#
+# `metric` and `breakdown` keep those single-answer rules. `metrics` and
+# `breakdowns` list every metric and breakdown the query names, in order of
+# appearance ("admissions and leavers by region and grade"), for plans that
+# answer several slices at once.
+
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from .intent_router import Metric, Breakdown
+from .sql_templates import TimeWindow, month_bounds
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4, "may": 5,
+    "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+
+# OData filter per metric, aligned with the SQL template predicates
+SEARCH_FILTERS: Dict[str, str] = {
+    "active": "membership_status_original eq 'Active'",
+    "admissions": "membership_type_original eq 'Join'",
+    "upgrades": "membership_type_original eq 'Upgrade'",
+    "left": "(membership_status_original eq 'Resigned' or membership_status_original eq 'Deceased')",
+}
+
+_MONTH_ALT = ("jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+              "|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?")
+
+# Order matters only where two cues can start at the same position. The leading
+# lookahead lists every character a cue can start with, so other positions fail fast.
+_CUES = re.compile(r"""
+    (?=[abcdfhjlmnorstuy,\ ])
+    (?:
+    (?P<month_year>(?P<mon>""" + _MONTH_ALT + r""")\s+(?P<year>\d{4}))
+  | (?P<last_month>last\ month)
+  | (?P<this_month>this\ month|current\ month)
+  | (?P<this_year>this\ year|current\ year)
+  | (?P<ytd>\byear\ to\ date\b|\bytd\b)
+  | by\ (?P<breakdown>month|grade|region|gender)
+  | (?:,\ *|\ and\ )(?P<more_breakdown>month|grade|region|gender)\b
+  | (?P<upgrade>\bupgrade(?P<upgrade_s>s)?\b)
+  | (?P<admission>\b(?:admission|join(?P<join_s>s)?)\b)
+  | (?P<left>\b(?:left|leavers|attrition|resign(?:ed|ations)?)\b)
+  | (?P<plural>\b(?:admissions|joiners)\b)
+  | (?P<active>\bactive\b)
+  | (?P<list_word>\bhow\ many|count|number\ of|list|show\b|\bleaver\b)
+    )
+""", re.VERBOSE)
+
+_BREAKDOWN_ORDER = ("month", "grade", "region", "gender")
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    text: str
+    intent: str                   # "metrics" | "explain"
+    metric: Metric
+    breakdown: Breakdown
+    granularity: str              # "month" | "year"
+    window: TimeWindow
+    anchor: str                   # "2025-10" for a month, "2025" for a year
+    search_filter: Optional[str]  # OData $filter for the metric
+    metrics: Tuple[Metric, ...] = ()          # every metric named, in order; (metric,) if one
+    breakdowns: Tuple[Breakdown, ...] = ()    # every breakdown named, in order; (breakdown,) if <= 1
+    # which parts the text states (the rest are defaults), for follow-up resolution
+    metric_given: bool = False
+    time_given: bool = False
+    breakdown_given: bool = False
+
+    @property
+    def is_multi(self) -> bool:
+        """True when the query asks for more than one metric or breakdown."""
+        return len(self.metrics) > 1 or len(self.breakdowns) > 1
+
+    @property
+    def lexical_query(self) -> str:
+        # explicit temporal hint so lexical + semantic models can match "Active: YYYY-MM-DD"
+        return f"{self.text.strip()} {self.anchor}"
+
+    @property
+    def vector_text(self) -> str:
+        return f"{self.metric} memberships in {self.anchor}"
+
+    def retrieval(self) -> Tuple[str, str, Optional[str]]:
+        """(lexical_query, vector_text, optional_filter), as eval.normalize returns it."""
+        return self.lexical_query, self.vector_text, self.search_filter
+
+@lru_cache(maxsize=512)
+def _month(year: int, month: int) -> Tuple[TimeWindow, str]:
+    return month_bounds(year, month), f"{year:04d}-{month:02d}"
+
+@lru_cache(maxsize=64)
+def _relative(today: date) -> Dict[str, Tuple[str, TimeWindow, str]]:
+    """(granularity, window, anchor) for the relative cues, per clock date."""
+    lm = today.replace(day=1) - timedelta(days=1)
+    year = TimeWindow(int(f"{today.year:04d}0101"), int(f"{today.year:04d}1231") + 1)
+    return {
+        "last_month": ("month", *_month(lm.year, lm.month)),
+        "this_month": ("month", *_month(today.year, today.month)),
+        "this_year": ("year", year, f"{today.year:04d}"),
+    }
+
+def anchor_label(granularity: str, start_fk: int) -> str:
+    y = start_fk // 10000
+    m = (start_fk // 100) % 100
+    return f"{y:04d}-{m:02d}" if granularity == "month" else f"{y:04d}"
+
+def parse_query(text: str, today: Optional[date] = None) -> ParsedQuery:
+    """Parses `text` relative to `today` (default: the eval clock, EVAL_TODAY or the real date)."""
+    if today is None:
+        from eval.eval_common import get_eval_today
+        today = get_eval_today()
+    return _parse(text, today)
+
+@lru_cache(maxsize=4096)
+def _parse(text: str, today: date) -> ParsedQuery:
+    month_year: Optional[Tuple[str, str]] = None
+    seen = set()
+    breakdowns = set()
+    named: Dict[str, None] = {}        # metrics in order of appearance (dict as ordered set)
+    dims: Dict[str, None] = {}         # breakdowns in order of appearance
+    last_dim_end = -1
+    for m in _CUES.finditer(text.lower()):
+        kind = m.lastgroup
+        if kind == "month_year":
+            if month_year is None:
+                month_year = (m.group("mon"), m.group("year"))
+        elif kind == "breakdown":
+            breakdowns.add(m.group("breakdown"))
+            dims.setdefault(m.group("breakdown"))
+            last_dim_end = m.end()
+        elif kind == "more_breakdown":
+            if m.start() == last_dim_end:    # "by region and grade", "by region, gender"
+                dims.setdefault(m.group("more_breakdown"))
+                last_dim_end = m.end()
+        elif kind == "upgrade":
+            seen.add("upgrade")
+            named.setdefault("upgrades")
+            if not m.group("upgrade_s"):
+                seen.add("list_word")        # the intent cue matches "upgrade", not "upgrades"
+        elif kind == "admission":
+            seen.add("admission")
+            named.setdefault("admissions")
+            if not m.group("join_s"):
+                seen.add("list_word")        # ... and "join", not "joins"
+        elif kind == "left":
+            seen.add("left")
+            named.setdefault("left")
+            if m.group("left") == "left":
+                seen.add("list_word")
+        elif kind == "plural":
+            seen.add("admission")            # "admissions"/"joiners" pick the metric too, not the list cue
+            named.setdefault("admissions")
+        elif kind == "active":
+            seen.add("list_word")
+            named.setdefault("active")
+        else:
+            seen.add(kind)
+            if m.group("list_word") == "leaver":
+                named.setdefault("left")
+
+    if "upgrade" in seen:
+        metric: Metric = "upgrades"
+    elif "admission" in seen:
+        metric = "admissions"
+    elif "left" in seen:
+        metric = "left"
+    else:
+        metric = "active"
+
+    breakdown: Breakdown = next((b for b in _BREAKDOWN_ORDER if b in breakdowns), None)
+
+    rel = _relative(today)
+    if month_year is not None:
+        granularity = "month"
+        window, anchor = _month(int(month_year[1]), MONTHS[month_year[0][:3]])
+    elif "last_month" in seen:
+        granularity, window, anchor = rel["last_month"]
+    elif "this_month" in seen:
+        granularity, window, anchor = rel["this_month"]
+    elif "this_year" in seen or "ytd" in seen:
+        granularity, window, anchor = rel["this_year"]
+    else:
+        # default latest completed month (repo convention)
+        granularity, window, anchor = rel["last_month"]
+
+    return ParsedQuery(
+        text=text,
+        # naming two metrics ("admissions and leavers ...") is a KPI question too
+        intent="metrics" if "list_word" in seen or len(named) > 1 else "explain",
+        metric=metric,
+        breakdown=breakdown,
+        granularity=granularity,
+        window=window,
+        anchor=anchor,
+        search_filter=SEARCH_FILTERS.get(metric),
+        metrics=tuple(named) if len(named) > 1 else (metric,),
+        breakdowns=tuple(dims) if len(dims) > 1 else (breakdown,),
+        metric_given=bool(named),
+        time_given=month_year is not None or not seen.isdisjoint(("last_month", "this_month", "this_year", "ytd")),
+        breakdown_given=bool(dims),
+    )
@@ -0,0 +1,123 @@
+# Deterministic answer templates for simple KPI results (no LLM call)
+
+from __future__ import annotations
+import calendar, threading
+from typing import Any, Dict, List, Optional, Tuple
+
+SOURCES_LINE = "Sources: Azure SQL, Azure AI Search"
+
+METRIC_PHRASES = {
+    "active": "Active memberships",
+    "admissions": "Admissions (joins)",
+    "upgrades": "Upgrades",
+    "left": "Members who left",
+}
+
+BREAKDOWN_COLUMNS = {"month": "month", "grade": "grade", "region": "region", "gender": "gender"}
+
+def period_label(granularity: str, start_fk: int, end_fk: int) -> str:
+    """'October 2025' for a month window, '2025' for a calendar year, else the date range."""
+    sy, sm = start_fk // 10000, (start_fk // 100) % 100
+    last = end_fk - 1
+    ey, em = last // 10000, (last // 100) % 100
+    if granularity == "month" and (sy, sm) == (ey, em):
+        return f"{calendar.month_name[sm]} {sy}"
+    if granularity == "year" and sy == ey and start_fk % 10000 == 101 and last % 10000 == 1231:
+        return str(sy)
+    return f"{start_fk} to {last}"
+
+def _fmt(n: Any) -> str:
+    return f"{int(n):,}"
+
+class AnswerRenderer:
+    """
+    Renders the final text for metric turns whose SQL result is small enough to
+    phrase exactly: one count, or a breakdown of at most `max_rows` labelled rows.
+    mode='llm' disables the fast path; mode='fast' uses it whenever it applies.
+    """
+
+    def __init__(self, mode: str = "llm", max_rows: int = 12):
+        if mode not in ("llm", "fast"):
+            raise ValueError(f"unknown answer mode: {mode}")
+        self.mode = mode
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self.stats = {"turns": 0, "fast_path": 0}
+
+    @classmethod
+    def from_settings(cls) -> "AnswerRenderer":
+        from .config import get_settings
+        a = get_settings().agent
+        return cls(mode=a.answer_mode, max_rows=a.fast_path_max_rows)
+
+    def record(self, fast: bool) -> None:
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats["fast_path"] += int(fast)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+        out["fast_path_ratio"] = out["fast_path"] / max(1, out["turns"])
+        return out
+
+    def _table_lines(self, what: str, period: str, breakdown: Optional[str],
+                     rows: List[Dict[str, Any]]) -> Optional[List[str]]:
+        if len(rows) > self.max_rows:
+            return None
+        if any(not isinstance(r, dict) or "count" not in r or r["count"] is None for r in rows):
+            return None
+        lines: List[str] = []
+        if breakdown is None:
+            if len(rows) > 1:
+                return None
+            total = rows[0]["count"] if rows else 0
+            lines.append(f"{what} in {period}: {_fmt(total)}.")
+        else:
+            if breakdown not in BREAKDOWN_COLUMNS or any("label" not in r for r in rows):
+                return None
+            if not rows:
+                lines.append(f"{what} in {period} by {BREAKDOWN_COLUMNS[breakdown]}: none recorded.")
+            else:
+                total = sum(int(r["count"]) for r in rows)
+                lines.append(f"{what} in {period} by {BREAKDOWN_COLUMNS[breakdown]} (total {_fmt(total)}):")
+                for r in rows:
+                    label = r["label"] if r["label"] not in (None, "") else "(not set)"
+                    lines.append(f"- {label}: {_fmt(r['count'])}")
+        return lines
+
+    def render(self, state: Dict[str, Any]) -> Optional[str]:
+        """Returns the answer text, or None if the turn should go to the LLM."""
+        if self.mode != "fast" or state.get("intent") != "metrics":
+            return None
+        period = period_label(state.get("granularity", "month"), state["time_start_fk"], state["time_end_fk"])
+        tables = state.get("sql_tables")
+        if tables:
+            # multi-slice turn: one block per (metric, breakdown) table, totals first
+            from .sql_templates import table_name
+            lines: List[str] = []
+            for metric in state.get("metrics") or []:
+                for breakdown in (None, *[b for b in state.get("breakdowns") or [] if b is not None]):
+                    rows = tables.get(table_name(metric, breakdown))
+                    if metric not in METRIC_PHRASES or rows is None:
+                        return None
+                    block = self._table_lines(METRIC_PHRASES[metric], period, breakdown, rows)
+                    if block is None:
+                        return None
+                    lines += block
+        else:
+            metric = state.get("metric")
+            if metric not in METRIC_PHRASES:
+                return None
+            block = self._table_lines(METRIC_PHRASES[metric], period, state.get("breakdown"),
+                                      state.get("sql_rows") or [])
+            if block is None:
+                return None
+            lines = block
+
+        citations: List[Tuple[str, str]] = state.get("citations") or []
+        if citations:
+            lines.append("")
+            lines.append("Supporting records: " + ", ".join(doc for doc, _ in citations) + ".")
+        lines.append(SOURCES_LINE)
+        return "\n".join(lines)
@@ -2,49 +2,101 @@
 
 
 from __future__ import annotations
-import requests
-from typing import Dict, Any, List, Tuple
-from .config import get_settings
+from typing import Dict, Any, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+def hybrid_semantic_body(query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+    """
+    Runs Modern RAG hybrid query:
+      - lexical `search`
+      - vectorQueries=[{kind:'text'}] against 'chunkVector'
+      - queryType='semantic' with answers/captions
+    """
+    body = {
+        "search": query,
+        "queryType": "semantic",
+        "semanticConfiguration": "mem-semantic",
+        "answers": "extractive|count-3",
+        "captions": "extractive|highlight-true",
+        "vectorQueries": [
+            {"kind": "text", "text": query, "fields": "chunkVector", "k": 50, "weight": 1.0}
+        ],
+        "top": top
+    }
+    if select:
+        body["select"] = select
+    return body
 
 class AzureAISearch:
     def __init__(self):
+        # imported here so that importing the module (e.g. for extract_citations) stays cheap
+        import requests
+        from .config import get_settings
         s = get_settings().search
         self.endpoint = s.endpoint.rstrip("/")
         self.api_key = s.api_key
         self.index = s.index
         self.api_version = s.api_version
+        self.indexer = s.indexer
         self.session = requests.Session()
         self.session.headers.update({
             "Content-Type": "application/json",
             "api-key": self.api_key
         })
+        self._aclient: httpx.AsyncClient | None = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.endpoint}/indexes/{self.index}/docs/search?api-version={self.api_version}"
+
+    def build_body(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        return hybrid_semantic_body(query, top, select)
 
     def hybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        resp = self.session.post(self.url, json=self.build_body(query, top, select), timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def ahybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
         """
-        Runs Modern RAG hybrid query:
-          - lexical `search`
-          - vectorQueries=[{kind:'text'}] against 'chunkVector'
-          - queryType='semantic' with answers/captions
+        Non-blocking variant of hybrid_semantic on a pooled httpx.AsyncClient.
         """
-        body = {
-            "search": query,
-            "queryType": "semantic",
-            "semanticConfiguration": "mem-semantic",
-            "answers": "extractive|count-3",
-            "captions": "extractive|highlight-true",
-            "vectorQueries": [
-                {"kind": "text", "text": query, "fields": "chunkVector", "k": 50, "weight": 1.0}
-            ],
-            "top": top
-        }
-        if select:
-            body["select"] = select
-
-        url = f"{self.endpoint}/indexes/{self.index}/docs/search?api-version={self.api_version}"
-        resp = self.session.post(url, json=body, timeout=30)
+        if self._aclient is None:
+            import httpx
+            self._aclient = httpx.AsyncClient(
+                headers={"Content-Type": "application/json", "api-key": self.api_key},
+                timeout=30,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        resp = await self._aclient.post(self.url, json=self.build_body(query, top, select))
         resp.raise_for_status()
         return resp.json()
 
+    def index_generation(self) -> str:
+        """
+        Fingerprint that changes when the index is rebuilt or re-indexed: the
+        indexer's last run end time if AZURE_SEARCH_INDEXER is set, otherwise
+        the index document count and storage size.
+        """
+        if self.indexer:
+            url = f"{self.endpoint}/indexers/{self.indexer}/status?api-version={self.api_version}"
+            resp = self.session.get(url, timeout=10)
+            resp.raise_for_status()
+            last = resp.json().get("lastResult") or {}
+            return f"indexer:{last.get('endTime')}:{last.get('status')}"
+        url = f"{self.endpoint}/indexes/{self.index}/stats?api-version={self.api_version}"
+        resp = self.session.get(url, timeout=10)
+        resp.raise_for_status()
+        st = resp.json()
+        return f"stats:{st.get('documentCount')}:{st.get('storageSize')}"
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
 def extract_citations(search_json: Dict[str, Any], max_snippets: int = 3) -> List[Tuple[str, str]]:
     """
     Returns [(doc_id, snippet)] from top results.
@@ -0,0 +1,185 @@
+# Session-level short-term memory for follow-up turns
+#
+# A session remembers what its last metrics turn resolved (metric, window,
+# breakdowns, citations and the search query) plus the KPI results it has
+# already fetched. A follow-up such as "and by gender?" or "what about last
+# month?" states only what changes; the router fills in the rest from the
+# session, reuses the citations when the metric and window are unchanged, and
+# serves any (metric, breakdown, window) slice it has already seen without SQL.
+#
+# Bounded: at most max_sessions sessions (least recently used evicted), each
+# holding its last max_turns turns and max_results result slices. Sessions idle
+# longer than idle_s are dropped on the next store access.
+
+from __future__ import annotations
+import re, threading, time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from .query_parser import ParsedQuery, anchor_label
+from .sql_templates import table_name
+
+# "and by gender?", "what about upgrades", "same for last month", "now by region"
+_FOLLOW_UP_LEAD = re.compile(r"^\s*(?:and|what about|how about|same for|same but|now|also|then)\b", re.I)
+_FOLLOW_UP_MAX_WORDS = 5
+# "how many members last month?" asks afresh even without a metric word
+_QUESTION_LEAD = re.compile(r"^\s*(?:how (?:many|much)|what (?:is|are|was|were)|show|list|count|give)\b", re.I)
+
+SliceKey = Tuple[str, Optional[str], int, int]      # (metric, breakdown, start_fk, end_fk)
+
+@dataclass
+class Session:
+    last_used: float
+    context: Optional[Dict[str, Any]] = None          # resolved fields of the last metrics turn
+    turns: Deque[Tuple[str, str]] = field(default_factory=deque)     # (query, answer)
+    results: "OrderedDict[SliceKey, List[Dict[str, Any]]]" = field(default_factory=OrderedDict)
+
+def is_follow_up(p: ParsedQuery, text: str) -> bool:
+    """Elliptical turns that only make sense against the previous question."""
+    if p.metric_given and p.time_given:
+        return False                    # stands alone
+    if not p.metric_given and (p.breakdown_given or p.time_given):
+        # "and by gender?", "by gender?", "last month instead" -- but not
+        # "How many members in November 2025?", which is a new question
+        if _FOLLOW_UP_LEAD.match(text):
+            return True
+        return len(text.split()) <= _FOLLOW_UP_MAX_WORDS and not _QUESTION_LEAD.match(text)
+    # "what about upgrades?" -- but not "what about the rules for upgrades?"
+    return p.metric_given and len(text.split()) <= _FOLLOW_UP_MAX_WORDS and bool(_FOLLOW_UP_LEAD.match(text))
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 1000, idle_s: float = 1800.0, max_turns: int = 8, max_results: int = 32):
+        self.max_sessions = max_sessions
+        self.idle_s = idle_s
+        self.max_turns = max_turns
+        self.max_results = max_results
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"follow_ups": 0, "search_reused": 0, "sql_reused": 0, "evicted_idle": 0, "evicted_lru": 0}
+
+    @classmethod
+    def from_settings(cls) -> "SessionStore":
+        from .config import get_settings
+        a = get_settings().agent
+        return cls(a.session_max, a.session_idle_s, a.session_max_turns, a.session_max_results)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # ---- bookkeeping (callers hold the lock) ----
+    def _evict_idle(self, now: float) -> None:
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if now - s.last_used <= self.idle_s:
+                break
+            del self._sessions[sid]
+            self.stats["evicted_idle"] += 1
+
+    def _touch(self, session_id: str, create: bool) -> Optional[Session]:
+        now = time.monotonic()
+        self._evict_idle(now)
+        s = self._sessions.get(session_id)
+        if s is None:
+            if not create:
+                return None
+            s = self._sessions[session_id] = Session(last_used=now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted_lru"] += 1
+        s.last_used = now
+        self._sessions.move_to_end(session_id)
+        return s
+
+    # ---- router side ----
+    def resolve(self, session_id: str, p: ParsedQuery, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Router state for a follow-up turn: the previous context with whatever
+        this turn states applied on top, plus reused citations and, when every
+        slice is already known, sql_rows (single) or sql_tables (multi). None
+        when the turn stands alone or the session has no metrics turn yet.
+        """
+        with self._lock:
+            s = self._touch(session_id, create=False)
+            if s is None or s.context is None or not is_follow_up(p, text):
+                return None
+            prev = s.context
+            out: Dict[str, Any] = {"intent": "metrics", "follow_up": True}
+            if p.metric_given:
+                metrics = list(p.metrics)
+            else:
+                metrics = list(prev.get("metrics") or [prev["metric"]])
+            if p.time_given:
+                out.update(granularity=p.granularity, time_start_fk=p.window.start_fk, time_end_fk=p.window.end_fk)
+            else:
+                out.update(granularity=prev["granularity"], time_start_fk=prev["time_start_fk"],
+                           time_end_fk=prev["time_end_fk"])
+            if p.breakdown_given:
+                breakdowns = list(p.breakdowns)
+            else:
+                breakdowns = list(prev.get("breakdowns") or [prev.get("breakdown")])
+            out.update(metric=metrics[0], breakdown=breakdowns[0])
+            if len(metrics) > 1 or len(breakdowns) > 1:
+                out.update(metrics=metrics, breakdowns=breakdowns)
+
+            same_topic = (metrics == list(prev.get("metrics") or [prev["metric"]])
+                          and (out["time_start_fk"], out["time_end_fk"]) == (prev["time_start_fk"], prev["time_end_fk"]))
+            if same_topic and prev.get("citations") is not None:
+                out.update(citations=prev["citations"], search_reused=True)
+                self.stats["search_reused"] += 1
+            else:
+                anchor = anchor_label(out["granularity"], out["time_start_fk"])
+                out["search_query"] = f"{' and '.join(metrics)} memberships in {anchor}"
+
+            window = (out["time_start_fk"], out["time_end_fk"])
+            if "metrics" in out:
+                slices = [(m, b) for m in metrics for b in (None, *[x for x in breakdowns if x])]
+            else:
+                slices = [(metrics[0], breakdowns[0])]
+            hits = [s.results.get((m, b, *window)) for m, b in slices]
+            if all(h is not None for h in hits):
+                if "metrics" in out:
+                    out["sql_tables"] = {table_name(m, b): rows for (m, b), rows in zip(slices, hits)}
+                else:
+                    out["sql_rows"] = hits[0]
+                self.stats["sql_reused"] += 1
+            self.stats["follow_ups"] += 1
+            return out
+
+    # ---- after the turn ----
+    def record(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            s = self._touch(session_id, create=True)
+            s.turns.append((state.get("user_query", ""), state.get("answer", "")))
+            while len(s.turns) > self.max_turns:
+                s.turns.popleft()
+            if state.get("intent") != "metrics":
+                return
+            s.context = {k: state.get(k) for k in ("metric", "metrics", "breakdown", "breakdowns", "granularity",
+                                                   "time_start_fk", "time_end_fk", "citations")}
+            window = (state["time_start_fk"], state["time_end_fk"])
+            if state.get("sql_truncated"):
+                return                   # never serve a partial result again
+            if state.get("sql_tables"):
+                for m in state.get("metrics") or []:
+                    for b in (None, *[x for x in state.get("breakdowns") or [] if x]):
+                        rows = state["sql_tables"].get(table_name(m, b))
+                        if rows is not None:
+                            self._remember(s, (m, b, *window), rows)
+            elif "sql_rows" in state:
+                self._remember(s, (state["metric"], state.get("breakdown"), *window), state["sql_rows"])
+
+    def _remember(self, s: Session, key: SliceKey, rows: List[Dict[str, Any]]) -> None:
+        s.results[key] = rows
+        s.results.move_to_end(key)
+        while len(s.results) > self.max_results:
+            s.results.popitem(last=False)
+
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        with self._lock:
+            s = self._sessions.get(session_id)
+            return list(s.turns) if s is not None else []
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return {**self.stats, "sessions": len(self._sessions)}
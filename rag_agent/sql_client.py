@@ -3,12 +3,237 @@
 # We read from report.* for safety
 
 from __future__ import annotations
-import pyodbc
-from typing import Iterable, Any, List, Dict, Tuple
+import asyncio, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterable, Any, Callable, List, Dict, Optional, Sequence, Tuple, Iterator
 from .config import get_settings
 
+# SQLSTATEs that mean the connection itself is gone (network drop, server
+# closed an idle session, failover) rather than a problem with the statement.
+_DISCONNECT_STATES = {"08S01", "08001", "08003", "08004", "08007", "HYT00", "HYT01"}
+
+def is_disconnect(err: Exception) -> bool:
+    # pyodbc errors carry the SQLSTATE as args[0]
+    state = err.args[0] if getattr(err, "args", None) else ""
+    return str(state) in _DISCONNECT_STATES
+
+class ColumnarResult:
+    """
+    A result set held as one list per column. Rows are streamed in with
+    fetchmany, so no fetchall() list of driver rows and no dict per row is
+    built; to_dicts() makes the dict view (the agent's compute node does, for
+    graph state).
+    `truncated` is True when the statement had more than `max_rows` rows.
+    """
+
+    __slots__ = ("columns", "data", "truncated")
+
+    def __init__(self, columns: Sequence[str], data: List[List[Any]] | None = None, truncated: bool = False):
+        self.columns = tuple(columns)
+        self.data = data if data is not None else [[] for _ in self.columns]
+        self.truncated = truncated
+
+    def __len__(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def column(self, name: str) -> List[Any]:
+        return self.data[self.columns.index(name)]
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        return zip(*self.data) if self.data else iter(())
+
+    def to_dicts(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        cols = self.columns
+        rows = self.rows() if limit is None else zip(*(c[:limit] for c in self.data))
+        return [dict(zip(cols, r)) for r in rows]
+
+    @classmethod
+    def from_dicts(cls, rows: List[Dict[str, Any]], max_rows: Optional[int] = None) -> "ColumnarResult":
+        if not rows:
+            return cls(())
+        cols = tuple(rows[0].keys())
+        kept = rows if max_rows is None else rows[:max_rows]
+        return cls(cols, [[r[c] for r in kept] for c in cols], truncated=len(kept) < len(rows))
+
+def fetch_columns(cur: Any, max_rows: Optional[int] = None, batch_size: int = 500) -> ColumnarResult:
+    """Drains an executed DB-API cursor into a ColumnarResult, batch_size rows at a time."""
+    if cur.description is None:
+        return ColumnarResult(())
+    result = ColumnarResult([d[0] for d in cur.description])
+    data, n = result.data, 0
+    while True:
+        batch = cur.fetchmany(batch_size)
+        if not batch:
+            break
+        if max_rows is not None and n + len(batch) > max_rows:
+            batch = batch[: max_rows - n]
+            result.truncated = True
+        for col, values in zip(data, zip(*batch)):
+            col.extend(values)
+        n += len(batch)
+        if result.truncated:
+            break
+    return result
+
+class PoolTimeout(RuntimeError):
+    pass
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+      - at most `size` connections are open; callers wait up to `timeout_s`
+      - connections idle longer than `recycle_s` are closed and replaced
+      - connections idle longer than `ping_after_s` are health-checked first
+      - (re)connects retry with exponential backoff and jitter
+    stats() exposes checkout timings and lifecycle counters for monitoring.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = 5, timeout_s: float = 30.0,
+                 recycle_s: float = 1800.0, ping_after_s: float = 60.0,
+                 retries: int = 3, backoff_s: float = 0.5, ping_sql: str = "SELECT 1"):
+        self._connect = connect
+        self.size = size
+        self.timeout_s = timeout_s
+        self.recycle_s = recycle_s
+        self.ping_after_s = ping_after_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.ping_sql = ping_sql
+        self._idle: List[Tuple[Any, float]] = []     # (conn, last_returned) LIFO
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "timeouts": 0,
+            "connects": 0, "connect_failures": 0, "recycled": 0, "ping_failures": 0, "discarded": 0,
+        }
+
+    # ---- lifecycle ----
+    def _new_connection(self) -> Any:
+        delay = self.backoff_s
+        for attempt in range(self.retries + 1):
+            try:
+                conn = self._connect()
+                with self._cond:
+                    self._stats["connects"] += 1
+                return conn
+            except Exception:
+                with self._cond:
+                    self._stats["connect_failures"] += 1
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay * (1 + random.random() * 0.25))
+                delay *= 2
+
+    def _healthy(self, conn: Any) -> bool:
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(self.ping_sql)
+                cur.fetchall()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ---- checkout / return ----
+    def acquire(self) -> Any:
+        t0 = time.perf_counter()
+        deadline = t0 + self.timeout_s
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"no SQL connection free within {self.timeout_s}s (size={self.size})")
+                self._cond.wait(remaining)
+            if self._idle:
+                conn, last = self._idle.pop()
+            else:
+                conn, last = None, 0.0
+                self._open += 1   # reserve the slot before connecting outside the lock
+
+        try:
+            idle_for = time.monotonic() - last
+            if conn is not None and idle_for > self.recycle_s:
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self._stats["recycled"] += 1
+            elif conn is not None and idle_for > self.ping_after_s and not self._healthy(conn):
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+            if conn is None:
+                conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        wait_ms = (time.perf_counter() - t0) * 1000.0
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        with self._cond:
+            if discard:
+                self._open -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception as e:
+            dropped = is_disconnect(e)
+            self.release(conn, discard=dropped)
+            if dropped:
+                # a dropped link usually means its idle siblings are stale too
+                self.close()
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Closes idle connections; checked-out ones close when returned with discard."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._stats["discarded"] += len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out.update({"size": self.size, "open": self._open, "idle": len(self._idle),
+                        "in_use": self._open - len(self._idle)})
+        out["wait_ms_avg"] = out["wait_ms_total"] / max(1, out["checkouts"])
+        return out
+
 class AzureSQL:
-    def __init__(self):
+    def __init__(self, connect: Callable[[], Any] | None = None):
         s = get_settings().sql
         conn_str = (
             f"Driver={{{s.odbc_driver}}};"
@@ -17,16 +242,60 @@ class AzureSQL:
             f"Uid={s.username};Pwd={s.password};"
             "Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;"
         )
-        self.conn = pyodbc.connect(conn_str)
+        def odbc_connect() -> Any:
+            import pyodbc   # imported on first connect so importing this module stays cheap
+            return pyodbc.connect(conn_str)
+
+        self.pool = ConnectionPool(
+            connect or odbc_connect,
+            size=s.pool_size, timeout_s=s.pool_timeout_s, recycle_s=s.pool_recycle_s,
+            ping_after_s=s.pool_ping_after_s, retries=s.connect_retries, backoff_s=s.connect_backoff_s,
+        )
+        self.fetch_batch = s.fetch_batch
+        # pyodbc blocks, so async callers run it off-loop; one worker per pooled connection.
+        self._executor = ThreadPoolExecutor(max_workers=s.pool_size, thread_name_prefix="azuresql")
+
+    def _run(self, fn: Callable[[Any], Any]) -> Any:
+        # A statement that fails because the connection dropped is retried once on a fresh one.
+        for attempt in (0, 1):
+            try:
+                with self.pool.connection() as conn:
+                    return fn(conn)
+            except Exception as e:
+                if attempt == 1 or not is_disconnect(e):
+                    raise
 
     def query(self, sql: str, params: Iterable[Any] = ()) -> List[Tuple]:
-        with self.conn.cursor() as cur:
-            cur.execute(sql, list(params))
-            rows = cur.fetchall()
-        return [tuple(r) for r in rows]
+        params = list(params)
+        def run(conn) -> List[Tuple]:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return [tuple(r) for r in cur.fetchall()]
+        return self._run(run)
+
+    def query_columns(self, sql: str, params: Iterable[Any] = (), max_rows: Optional[int] = None) -> ColumnarResult:
+        """Streams the result with fetchmany; stops reading after max_rows rows."""
+        params = list(params)
+        def run(conn) -> ColumnarResult:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return fetch_columns(cur, max_rows, self.fetch_batch)
+        return self._run(run)
+
+    async def aquery_columns(self, sql: str, params: Iterable[Any] = (), max_rows: Optional[int] = None) -> ColumnarResult:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query_columns, sql, tuple(params), max_rows)
 
     def query_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
-        with self.conn.cursor() as cur:
-            cur.execute(sql, list(params))
-            cols = [d[0] for d in cur.description]
-            return [dict(zip(cols, row)) for row in cur.fetchall()]
+        return self.query_columns(sql, params).to_dicts()
+
+    async def aquery_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query_dicts, sql, tuple(params))
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.pool.stats()
+
+    def close(self) -> None:
+        self.pool.close()
+        self._executor.shutdown(wait=False)
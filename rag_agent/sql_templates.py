@@ -1,11 +1,10 @@
  # safe query builder for KPIs
 
 from __future__ import annotations
-import re, calendar
+import calendar
 from dataclasses import dataclass
-from datetime import date, datetime, timedelta
-from typing import Dict, Any, List, Tuple, Optional
-from eval.eval_common import get_eval_today
+from datetime import date, datetime
+from typing import Dict, Any, List, Sequence, Tuple, Optional
 
 # Business mapping from repo:
 # - Active membership counts use active_date_fk month. (Copilot validation guidance) 
@@ -24,45 +23,27 @@ def month_bounds(year: int, month: int) -> TimeWindow:
     return TimeWindow(start_fk, end_fk)
 
 def parse_time_window(text: str, today: Optional[date] = None) -> Tuple[str, TimeWindow]:
-    t = text.lower()
-    today = get_eval_today()
-
-    # explicit month-year like "november 2025", "oct 2025"
-    m = re.search(r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|january|february|march|april|june|july|august|september|october|november|december)\s+(\d{4})", t)
-    if m:
-        month_str, year_str = m.group(1), m.group(2)
-        month_map = {
-            "jan":1,"january":1,"feb":2,"february":2,"mar":3,"march":3,"apr":4,"april":4,"may":5,
-            "jun":6,"june":6,"jul":7,"july":7,"aug":8,"august":8,"sep":9,"sept":9,"september":9,
-            "oct":10,"october":10,"nov":11,"november":11,"dec":12,"december":12
-        }
-        mo = month_map[month_str[:3]]
-        tw = month_bounds(int(year_str), mo)
-        return ("month", tw)
-
-    # this month / last month
-    if "last month" in t:
-        y = (today.replace(day=1) - timedelta(days=1)).year
-        m = (today.replace(day=1) - timedelta(days=1)).month
-        return ("month", month_bounds(y, m))
-    if "this month" in t or "current month" in t:
-        return ("month", month_bounds(today.year, today.month))
-
-    # this year
-    if "this year" in t or "current year" in t or re.search(r"\byear to date\b|\bytd\b", t):
-        start_fk = int(f"{today.year:04d}0101")
-        end_fk   = int(f"{today.year:04d}1231") + 1
-        return ("year", TimeWindow(start_fk, end_fk))
-
-    # default latest completed month (repo convention) :contentReference[oaicite:7]{index=7}
-    lm = today.replace(day=1) - timedelta(days=1)
-    return ("month", month_bounds(lm.year, lm.month))
+    """(granularity, window) for `text`; see query_parser for the precedence rules."""
+    from .query_parser import parse_query
+    q = parse_query(text, today)
+    return q.granularity, q.window
+
+METRIC_PREDICATES: Dict[str, str] = {
+    "active": "fm.membership_status_original = 'Active'",
+    "admissions": "fm.membership_type_original = 'Join'",
+    "upgrades": "fm.membership_type_original = 'Upgrade'",
+    "left": "(fm.is_attrition = 1 OR fm.membership_status_original IN ('Resigned','Deceased'))",
+}
 
 @dataclass
 class QueryPlan:
     sql: str
     params: Tuple[Any, ...]
     group_cols: List[str]
+    # the inputs the SQL was built from, so non-SQL backends (KPI cube) can answer it
+    metric: Optional[str] = None
+    breakdown: Optional[str] = None
+    window: Optional[TimeWindow] = None
 
 def build_kpi_sql(
     metric: str,           # 'active' | 'admissions' | 'upgrades' | 'left'
@@ -77,16 +58,9 @@ def build_kpi_sql(
     params: List[Any] = [window.start_fk, window.end_fk]
 
     # filter by metric
-    if metric == "active":
-        where.append("fm.membership_status_original = 'Active'")
-    elif metric == "admissions":
-        where.append("fm.membership_type_original = 'Join'")
-    elif metric == "upgrades":
-        where.append("fm.membership_type_original = 'Upgrade'")
-    elif metric == "left":
-        where.append("(fm.is_attrition = 1 OR fm.membership_status_original IN ('Resigned','Deceased'))")
-    else:
+    if metric not in METRIC_PREDICATES:
         raise ValueError(f"unknown metric: {metric}")
+    where.append(METRIC_PREDICATES[metric])
 
     joins: List[str] = ["JOIN report.dim_date d ON d.date_id = fm.active_date_fk"]
     select_cols: List[str] = []
@@ -124,4 +98,162 @@ def build_kpi_sql(
     """
     if group_cols:
         base += f" GROUP BY {', '.join(group_cols)} {order_by}"
-    return QueryPlan(sql=base.strip(), params=tuple(params), group_cols=group_cols)
\ No newline at end of file
+    return QueryPlan(sql=base.strip(), params=tuple(params), group_cols=group_cols,
+                     metric=metric, breakdown=breakdown,
+                     window=TimeWindow(window.start_fk, window.end_fk))
+# Multi-metric / multi-breakdown plans
+#
+# One statement answers every (metric, breakdown) slice of a question: the
+# window is scanned once, each metric is a conditional SUM over the rows, and
+# each breakdown (plus the overall total) is one grouping set. Dimensions are
+# LEFT JOINed with a *_ok flag so a slice can drop the rows its single-slice
+# INNER JOIN would have dropped. split() turns the rows back into exactly the
+# per-slice tables build_kpi_sql would return.
+#
+# SQL Server uses GROUP BY GROUPING SETS. SQLite (the stand-in warehouse) has no
+# grouping sets, so dialect="sqlite" reads a MATERIALIZED CTE once and UNION ALLs
+# one GROUP BY per set; both produce the same columns. Only the sqlite form is
+# executed by bench.kpi_cube; the GROUPING SETS text has not been run against SQL
+# Server yet.
+
+# breakdown -> (join, derived-table columns, grouping columns, matched flag)
+_DIMENSIONS: Dict[str, Tuple[Optional[str], List[str], List[str], Optional[str]]] = {
+    "month": (None, ["d.year", "d.month_no", "d.mth_year"], ["year", "month_no", "mth_year"], None),
+    "grade": ("LEFT JOIN report.dim_grade g ON g.id = fm.grade_fk",
+              ["CASE WHEN g.id IS NULL THEN 0 ELSE 1 END AS g_ok", "g.grade_name"], ["g_ok", "grade_name"], "g_ok"),
+    "region": ("LEFT JOIN report.dim_hub h ON h.id = fm.hub_fk",
+               ["CASE WHEN h.id IS NULL THEN 0 ELSE 1 END AS h_ok", "h.regional_hub"], ["h_ok", "regional_hub"], "h_ok"),
+    "gender": ("LEFT JOIN report.dim_member m ON m.id = fm.member_fk",
+               ["CASE WHEN m.id IS NULL THEN 0 ELSE 1 END AS m_ok", "m.gender"], ["m_ok", "gender"], "m_ok"),
+}
+
+def table_name(metric: str, breakdown: Optional[str]) -> str:
+    """Key of one slice in a split result: 'admissions' or 'admissions by region'."""
+    return metric if breakdown is None else f"{metric} by {breakdown}"
+
+# Row order of a breakdown, shared by every path (SQL, split(), the KPI cube):
+# months by (year, month_no); labels NULL first, then case-insensitively with
+# ties broken by code point. ORDER BY follows the column collation (SQL Server's
+# is usually case-insensitive, SQLite's binary), so SQL results are re-sorted
+# with sort_rows() instead of being trusted as returned.
+def label_sort_key(label: Any) -> Tuple[bool, str, str]:
+    if label is None:
+        return (False, "", "")
+    text = str(label)
+    return (True, text.casefold(), text)
+
+def sort_rows(rows: List[Dict[str, Any]], breakdown: Optional[str]) -> List[Dict[str, Any]]:
+    """Sorts build_kpi_sql-shaped rows in place into the shared order; returns them."""
+    if breakdown == "month":
+        rows.sort(key=lambda r: (r.get("year") or 0, r.get("month_no") or 0))
+    elif breakdown is not None:
+        rows.sort(key=lambda r: label_sort_key(r.get("label")))
+    return rows
+
+@dataclass
+class MultiQueryPlan:
+    sql: str
+    params: Tuple[Any, ...]
+    metrics: Tuple[str, ...]
+    breakdowns: Tuple[str, ...]          # requested breakdowns; the total is always included
+    granularity: str
+    window: TimeWindow
+
+    def slices(self) -> List[QueryPlan]:
+        """The equivalent single-slice plans, totals first (what a KPI cube answers)."""
+        return [build_kpi_sql(m, self.granularity, self.window, b)
+                for m in self.metrics for b in (None, *self.breakdowns)]
+
+    def split(self, rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Rows of self.sql -> {table_name(metric, breakdown): rows as build_kpi_sql returns them}."""
+        tables: Dict[str, List[Dict[str, Any]]] = {}
+        for m in self.metrics:
+            tables[table_name(m, None)] = [{"count": 0}]
+            for b in self.breakdowns:
+                tables[table_name(m, b)] = []
+        for r in rows:
+            b = next((b for b in self.breakdowns if r.get(f"grp_{b}", 1) == 0), None)
+            ok = _DIMENSIONS[b][3] if b is not None else None
+            if ok is not None and not r.get(ok):
+                continue                       # no dimension row: excluded by the single-slice INNER JOIN
+            for m in self.metrics:
+                n = int(r.get(f"n_{m}") or 0)
+                if b is None:
+                    tables[table_name(m, None)] = [{"count": n}]
+                elif n > 0:
+                    if b == "month":
+                        row = {"year": r["year"], "month_no": r["month_no"], "label": r["mth_year"], "count": n}
+                    else:
+                        row = {"label": r[_DIMENSIONS[b][2][1]], "count": n}
+                    tables[table_name(m, b)].append(row)
+        for b in self.breakdowns:
+            for m in self.metrics:
+                sort_rows(tables[table_name(m, b)], b)
+        return tables
+
+def build_kpi_multi_sql(
+    metrics: Sequence[str],
+    granularity: str,
+    window: TimeWindow,
+    breakdowns: Sequence[Optional[str]] = (),
+    dialect: str = "mssql",             # 'mssql' | 'sqlite'
+) -> MultiQueryPlan:
+    """One SELECT for every (metric, breakdown) slice plus per-metric totals; see split()."""
+    metrics = tuple(dict.fromkeys(metrics))
+    breakdowns = tuple(b for b in dict.fromkeys(breakdowns) if b is not None)
+    if not metrics:
+        raise ValueError("no metrics")
+    for m in metrics:
+        if m not in METRIC_PREDICATES:
+            raise ValueError(f"unknown metric: {m}")
+    for b in breakdowns:
+        if b not in _DIMENSIONS:
+            raise ValueError(f"unknown breakdown: {b}")
+    if dialect not in ("mssql", "sqlite"):
+        raise ValueError(f"unknown SQL dialect: {dialect}")
+
+    joins = ["JOIN report.dim_date d ON d.date_id = fm.active_date_fk"]
+    inner_cols: List[str] = []
+    for b in breakdowns:
+        join, cols, _, _ = _DIMENSIONS[b]
+        if join:
+            joins.append(join)
+        inner_cols += cols
+    inner_cols += [f"CASE WHEN {METRIC_PREDICATES[m]} THEN 1 ELSE 0 END AS is_{m}" for m in metrics]
+    any_metric = " OR ".join(METRIC_PREDICATES[m] for m in metrics)
+    derived = f"""SELECT {", ".join(inner_cols)}
+        FROM report.fact_membership fm
+        {' '.join(joins)}
+        WHERE fm.active_date_fk >= ? AND fm.active_date_fk < ? AND ({any_metric})"""
+
+    group_cols = [c for b in breakdowns for c in _DIMENSIONS[b][2]]
+    sums = [f"SUM(x.is_{m}) AS n_{m}" for m in metrics]
+    if dialect == "mssql":
+        flags = [f"GROUPING(x.{_DIMENSIONS[b][2][-1]}) AS grp_{b}" for b in breakdowns]
+        sets = [f"({', '.join('x.' + c for c in _DIMENSIONS[b][2])})" for b in breakdowns] + ["()"]
+        sql = f"""
+    SELECT
+        {", ".join(["x." + c for c in group_cols] + flags + sums)}
+    FROM (
+        {derived}
+    ) x
+    GROUP BY GROUPING SETS ({", ".join(sets)})
+    """
+    else:
+        selects = []
+        for current in (*breakdowns, None):
+            own = _DIMENSIONS[current][2] if current is not None else []
+            cols = [f"x.{c} AS {c}" if c in own else f"NULL AS {c}" for c in group_cols]
+            cols += [f"{0 if b == current else 1} AS grp_{b}" for b in breakdowns]
+            group_by = f" GROUP BY {', '.join('x.' + c for c in own)}" if own else ""
+            selects.append(f"SELECT {', '.join(cols + sums)} FROM x{group_by}")
+        union = "\n    UNION ALL\n    ".join(selects)
+        sql = f"""
+    WITH x AS MATERIALIZED (
+        {derived}
+    )
+    {union}
+    """
+    return MultiQueryPlan(sql=sql.strip(), params=(window.start_fk, window.end_fk), metrics=metrics,
+                          breakdowns=breakdowns, granularity=granularity,
+                          window=TimeWindow(window.start_fk, window.end_fk))
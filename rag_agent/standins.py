@@ -0,0 +1,226 @@
+# Local stand-ins for Azure AI Search, Azure SQL and Azure OpenAI.
+# Same method names and return shapes as the real clients, with a simulated
+# latency, so the graph and serving path can be load-tested offline.
+#
+# latency_s is either a fixed delay in seconds or a LatencyProfile, which draws
+# each call's delay from a lognormal fitted to a median and p95 and fails a
+# share of calls with StandInError (the benchmark's error profiles).
+
+from __future__ import annotations
+import asyncio, math, random, threading, time
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+class StandInError(RuntimeError):
+    """An injected failure (LatencyProfile.error_rate)."""
+
+class LatencyProfile:
+    def __init__(self, median_s: float, p95_s: Optional[float] = None, error_rate: float = 0.0,
+                 seed: Optional[int] = None, name: str = "call"):
+        self.median_s = median_s
+        self.p95_s = p95_s if p95_s is not None else median_s
+        self.error_rate = error_rate
+        self.seed = seed
+        self.name = name
+        # lognormal: median = exp(mu), p95 = exp(mu + 1.645 sigma)
+        self._mu = math.log(median_s) if median_s > 0 else None
+        self._sigma = math.log(self.p95_s / median_s) / 1.645 if median_s > 0 and self.p95_s > median_s else 0.0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()   # stand-ins are called from many threads
+
+    def scaled(self, factor: float) -> "LatencyProfile":
+        return LatencyProfile(self.median_s * factor, self.p95_s * factor, self.error_rate, self.seed, self.name)
+
+    def draw(self) -> float:
+        """Delay in seconds for one call; raises StandInError for an injected failure."""
+        with self._lock:
+            fail = self.error_rate > 0 and self._rnd.random() < self.error_rate
+            delay = self._rnd.lognormvariate(self._mu, self._sigma) if self._mu is not None else 0.0
+        if fail:
+            raise StandInError(f"injected {self.name} failure")
+        return delay
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"median_s": self.median_s, "p95_s": self.p95_s, "error_rate": self.error_rate}
+
+Latency = Union[float, LatencyProfile]
+
+def _delay(latency: Latency) -> float:
+    return latency.draw() if isinstance(latency, LatencyProfile) else latency
+
+class StandInSearch:
+    def __init__(self, latency_s: Latency = 0.05, n_hits: int = 5):
+        self.latency_s = latency_s
+        self.n_hits = n_hits
+
+    def _response(self, query: str, top: int) -> Dict[str, Any]:
+        hits = [
+            {"id": f"doc-{i}", "chunk": f"Snippet {i} for: {query}",
+             "@search.captions": [{"text": f"Caption {i} for: {query}"}]}
+            for i in range(min(top, self.n_hits))
+        ]
+        return {"value": hits}
+
+    def hybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        time.sleep(_delay(self.latency_s))
+        return self._response(query, top)
+
+    async def ahybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        await asyncio.sleep(_delay(self.latency_s))
+        return self._response(query, top)
+
+class StandInSQL:
+    def __init__(self, latency_s: Latency = 0.05, rows: List[Dict[str, Any]] | None = None):
+        self.latency_s = latency_s
+        self.rows = rows if rows is not None else [{"count": 1234}]
+
+    def query_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        time.sleep(_delay(self.latency_s))
+        return [dict(r) for r in self.rows]
+
+    async def aquery_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        await asyncio.sleep(_delay(self.latency_s))
+        return [dict(r) for r in self.rows]
+
+    def query_columns(self, sql: str, params: Iterable[Any] = (), max_rows: int | None = None):
+        from .sql_client import ColumnarResult
+        return ColumnarResult.from_dicts(self.query_dicts(sql, params), max_rows)
+
+    async def aquery_columns(self, sql: str, params: Iterable[Any] = (), max_rows: int | None = None):
+        from .sql_client import ColumnarResult
+        return ColumnarResult.from_dicts(await self.aquery_dicts(sql, params), max_rows)
+
+class StandInSynthesizer:
+    def __init__(self, latency_s: Latency = 0.2):
+        from .prompt import PromptBuilder
+        self.latency_s = latency_s
+        self.prompts = PromptBuilder()
+
+    def build_prompt(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                     sql_tables: Dict[str, List[Dict[str, Any]]] | None = None, sql_truncated: bool = False):
+        return self.prompts.build(user_query, sql_rows, citations, sql_tables, sql_truncated)
+
+    def _answer(self, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                sql_tables: Dict[str, List[Dict[str, Any]]] | None = None) -> str:
+        docs = ", ".join(doc for doc, _ in citations)
+        if sql_tables:
+            counts = "; ".join(f"{name}: {sum(int(r.get('count', 0)) for r in rows)}" for name, rows in sql_tables.items())
+            return f"Counts: {counts} ({docs}).\nSources: Azure SQL, Azure AI Search"
+        total = sum(int(r.get("count", 0)) for r in sql_rows)
+        return f"Count: {total} ({docs}).\nSources: Azure SQL, Azure AI Search"
+
+    def compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                sql_tables: Dict[str, List[Dict[str, Any]]] | None = None,
+                prompt: Any = None) -> str:
+        time.sleep(_delay(self.latency_s))
+        return self._answer(sql_rows, citations, sql_tables)
+
+    async def acompose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                       sql_tables: Dict[str, List[Dict[str, Any]]] | None = None,
+                       prompt: Any = None) -> str:
+        await asyncio.sleep(_delay(self.latency_s))
+        return self._answer(sql_rows, citations, sql_tables)
+
+    def _tokens(self, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                sql_tables: Dict[str, List[Dict[str, Any]]] | None = None) -> List[str]:
+        words = self._answer(sql_rows, citations, sql_tables).split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def stream_compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                       sql_tables: Dict[str, List[Dict[str, Any]]] | None = None,
+                       prompt: Any = None) -> Iterator[str]:
+        # latency is spread evenly across tokens, like a model generating them
+        tokens = self._tokens(sql_rows, citations, sql_tables)
+        delay = _delay(self.latency_s)
+        for t in tokens:
+            time.sleep(delay / len(tokens))
+            yield t
+
+    async def astream_compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str, str]],
+                              sql_tables: Dict[str, List[Dict[str, Any]]] | None = None,
+                              prompt: Any = None) -> AsyncIterator[str]:
+        tokens = self._tokens(sql_rows, citations, sql_tables)
+        delay = _delay(self.latency_s)
+        for t in tokens:
+            await asyncio.sleep(delay / len(tokens))
+            yield t
+
+class StandInWarehouse:
+    """
+    SQLite copy of the report.* tables build_kpi_sql reads, filled with random
+    rows. The KPI SQL runs unchanged (report is an ATTACHed schema), so it is the
+    reference for checking non-SQL answer paths such as the KPI cube.
+    """
+
+    GRADES = ["Applicant", "Member", "Fellow", "Retired Member", "TechCIOB", "Educator Pathway", None]
+    HUBS = [("London", "UK South"), ("Bristol", "UK South"), ("Leeds", "UK North"),
+            ("Glasgow", "Scotland"), ("Dubai", "Middle East"), ("Hong Kong", "Asia Pacific"), ("Other", None)]
+    GENDERS = ["Female", "Male", "Other", None]
+    STATUSES = ["Active", "Active", "Active", "Resigned", "Deceased", "Lapsed", None]
+    TYPES = ["Join", "Upgrade", "Renewal", "Renewal", "Rejoin", None]
+    dialect = "sqlite"      # for build_kpi_multi_sql (no GROUPING SETS)
+
+    def __init__(self, latency_s: Latency = 0.0, path: str = ":memory:", report_path: str = ":memory:"):
+        """report_path: a file written by seed_db.py --sqlite to query instead of populate()."""
+        import sqlite3
+        self.latency_s = latency_s
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("ATTACH DATABASE ? AS report", (report_path,))
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS report.dim_date(date_id TEXT, year INTEGER, month_no INTEGER, mth_year TEXT);
+        CREATE TABLE IF NOT EXISTS report.dim_grade(id INTEGER PRIMARY KEY, grade_name TEXT);
+        CREATE TABLE IF NOT EXISTS report.dim_hub(id INTEGER PRIMARY KEY, local_hub TEXT, regional_hub TEXT);
+        CREATE TABLE IF NOT EXISTS report.dim_member(id INTEGER PRIMARY KEY, gender TEXT);
+        CREATE TABLE IF NOT EXISTS report.fact_membership(
+            membership_sk INTEGER PRIMARY KEY, member_fk INTEGER, grade_fk INTEGER, hub_fk INTEGER,
+            active_date_fk INTEGER, modified_date_fk INTEGER, membership_status_original TEXT,
+            membership_type_original TEXT, is_attrition INTEGER);
+        """)
+
+    def populate(self, n_rows: int = 20000, n_members: int = 2000, seed: int = 7,
+                 start: date = date(2024, 1, 1), end: date = date(2025, 12, 31)) -> "StandInWarehouse":
+        rnd = random.Random(seed)
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO report.dim_date VALUES (?,?,?,?)",
+                [(d.strftime("%Y%m%d"), d.year, d.month, d.strftime("%b-%y")) for d in days])
+            self.conn.executemany("INSERT INTO report.dim_grade VALUES (?,?)",
+                                  list(enumerate(self.GRADES, start=1)))
+            self.conn.executemany("INSERT INTO report.dim_hub VALUES (?,?,?)",
+                                  [(i, lh, rh) for i, (lh, rh) in enumerate(self.HUBS, start=1)])
+            self.conn.executemany("INSERT INTO report.dim_member VALUES (?,?)",
+                                  [(i, rnd.choice(self.GENDERS)) for i in range(1, n_members + 1)])
+            facts = []
+            for sk in range(1, n_rows + 1):
+                d = rnd.choice(days)
+                active_fk = None if rnd.random() < 0.01 else int(d.strftime("%Y%m%d"))
+                facts.append((
+                    sk,
+                    rnd.randint(1, n_members + 20),          # a few members with no dim row
+                    rnd.randint(1, len(self.GRADES) + 1),    # ... and grades
+                    rnd.randint(1, len(self.HUBS) + 1),      # ... and hubs
+                    active_fk, active_fk,
+                    rnd.choice(self.STATUSES), rnd.choice(self.TYPES),
+                    1 if rnd.random() < 0.03 else 0,
+                ))
+            self.conn.executemany("INSERT INTO report.fact_membership VALUES (?,?,?,?,?,?,?,?,?)", facts)
+        return self
+
+    def query_columns(self, sql: str, params: Iterable[Any] = (), max_rows: int | None = None):
+        from .sql_client import fetch_columns
+        delay = _delay(self.latency_s)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            return fetch_columns(self.conn.execute(sql, tuple(params)), max_rows)
+
+    async def aquery_columns(self, sql: str, params: Iterable[Any] = (), max_rows: int | None = None):
+        return await asyncio.to_thread(self.query_columns, sql, params, max_rows)
+
+    def query_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return self.query_columns(sql, params).to_dicts()
+
+    async def aquery_dicts(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.query_dicts, sql, params)
@@ -2,9 +2,15 @@
 
 
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
-from openai import AzureOpenAI
+from typing import List, Dict, Any, Optional, Tuple, Iterator, AsyncIterator
 from .config import get_settings
+from .prompt import Prompt, PromptBuilder
+from .tracing import annotate
+
+def _usage(usage: Any) -> None:
+    # token usage reported by the service, attached to the active trace span (if any)
+    if usage is not None:
+        annotate(usage_prompt_tokens=usage.prompt_tokens, usage_completion_tokens=usage.completion_tokens)
 
 _sys = (
 "You answer membership analytics using two tools: SQL for exact numbers and Azure AI Search for citations. "
@@ -14,49 +20,77 @@ _sys = (
 
 class Synthesizer:
     def __init__(self):
+        from openai import AzureOpenAI, AsyncAzureOpenAI   # heavy; only load when a client is built
         s = get_settings().openai
         self.client = AzureOpenAI(
             api_key=s.api_key,
             api_version=s.api_version,
             azure_endpoint=s.endpoint
         )
+        self.aclient = AsyncAzureOpenAI(
+            api_key=s.api_key,
+            api_version=s.api_version,
+            azure_endpoint=s.endpoint
+        )
         self.deployment = s.chat_deployment
+        self.prompts = PromptBuilder.from_settings(system=_sys)
 
-    def compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]]) -> str:
-        # Build a compact textual table for the model
-        if sql_rows and isinstance(sql_rows[0], dict) and "count" in sql_rows[0]:
-            headers = [k for k in sql_rows[0].keys()]
-            lines = [", ".join(headers)]
-            for r in sql_rows:
-                lines.append(", ".join(str(r[h]) for h in headers))
-            table_csv = "\n".join(lines)
-        else:
-            table_csv = "count\n0"
-
-        cites = "\n".join([f"- {doc}: {snippet}" for doc, snippet in citations])
-
-        prompt = f"""
-User query:
-{user_query}
-
-SQL results (CSV):
-{table_csv}
-
-Citations (snippets from Azure AI Search):
-{cites}
-
-Rules:
-- Report the number(s) directly from SQL results.
-- If multiple rows exist, summarize patterns and mention the grouping column name.
-- End with “Sources: Azure SQL, Azure AI Search”.
-"""
+    def build_prompt(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]],
+                     sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                     sql_truncated: bool = False) -> Prompt:
+        """Messages within the AGENT_PROMPT_BUDGET_TOKENS budget, plus their token count."""
+        return self.prompts.build(user_query, sql_rows, citations, sql_tables, sql_truncated)
+
+    def build_messages(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]],
+                       sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, str]]:
+        return self.build_prompt(user_query, sql_rows, citations, sql_tables).messages
+
+    def compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]],
+                sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Optional[Prompt] = None) -> str:
         resp = self.client.chat.completions.create(
             model=self.deployment,
-            messages=[
-                {"role": "system", "content": _sys},
-                {"role": "user", "content": prompt}
-            ],
+            messages=(prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)).messages,
             # temperature=0.2,
             # max_tokens=350,
         )
+        _usage(resp.usage)
         return resp.choices[0].message.content.strip()
+
+    async def acompose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]],
+                       sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Optional[Prompt] = None) -> str:
+        resp = await self.aclient.chat.completions.create(
+            model=self.deployment,
+            messages=(prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)).messages,
+        )
+        _usage(resp.usage)
+        return resp.choices[0].message.content.strip()
+
+    def stream_compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]],
+                       sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Optional[Prompt] = None) -> Iterator[str]:
+        """Yields answer text deltas as the model produces them."""
+        stream = self.client.chat.completions.create(
+            model=self.deployment,
+            messages=(prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)).messages,
+            stream=True,
+            stream_options={"include_usage": True},     # a last, choice-less chunk carries usage
+        )
+        for chunk in stream:
+            # Azure sends a leading chunk with only content-filter results (no choices)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            elif getattr(chunk, "usage", None) is not None:
+                _usage(chunk.usage)
+
+    async def astream_compose(self, user_query: str, sql_rows: List[Dict[str, Any]], citations: List[Tuple[str,str]],
+                              sql_tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, prompt: Optional[Prompt] = None) -> AsyncIterator[str]:
+        stream = await self.aclient.chat.completions.create(
+            model=self.deployment,
+            messages=(prompt or self.build_prompt(user_query, sql_rows, citations, sql_tables)).messages,
+            stream=True,
+            stream_options={"include_usage": True},     # a last, choice-less chunk carries usage
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            elif getattr(chunk, "usage", None) is not None:
+                _usage(chunk.usage)
@@ -0,0 +1,441 @@
+# Per-turn traces: a span per graph node and per client call
+#
+# Off by default (AGENT_TRACE=false). Then build_graph wraps nothing and each
+# node pays one extra dict lookup; timings_ms is filled as before.
+#
+# On: the router starts a trace for a sampled turn (AGENT_TRACE_SAMPLE). Each
+# node and each client call inside it (hybrid_semantic, query_columns /
+# query_dicts, compose / stream_compose) records a span with its duration and
+# attributes. Attributes cover payload bytes, row and hit counts, cache hit or
+# miss, and token usage. The last node adds a "turn" span that parents the
+# nodes and carries the turn's ttft/total. Finished spans go to an exporter:
+#
+#   JsonlExporter   one JSON object per span (AGENT_TRACE_PATH)
+#   OtlpExporter    OTLP/HTTP via opentelemetry-sdk + opentelemetry-exporter-otlp
+#   MemoryExporter  kept in memory (bench, ad-hoc analysis)
+#
+# Profiling (AGENT_PROFILE_SAMPLE > 0, tracing on): a sampled share of traced
+# turns also runs each node under cProfile (or pyinstrument) and writes
+# <AGENT_PROFILE_DIR>/<trace_id>-<node>.prof (.html). One node is profiled at
+# a time per process, so nodes running concurrently are skipped, not mixed.
+
+from __future__ import annotations
+import atexit, contextlib, json, os, random, threading, time, uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str                     # 32 hex chars
+    span_id: str                      # 16 hex chars
+    parent_id: Optional[str]
+    start_ns: int                     # epoch nanoseconds
+    duration_ms: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    _t0: float = 0.0                  # perf_counter at start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start_ns": self.start_ns, "duration_ms": round(self.duration_ms, 3), "attrs": self.attrs,
+                "error": self.error}
+
+def root_span_id(trace_id: str) -> str:
+    """The turn span's id; node spans parent to it before it is recorded."""
+    return trace_id[:16]
+
+_current: ContextVar[Optional[Span]] = ContextVar("rag_agent_span", default=None)
+
+def annotate(**attrs: Any) -> None:
+    """Adds attributes to the active span, if any (cheap no-op when not tracing)."""
+    span = _current.get()
+    if span is not None:
+        span.attrs.update(attrs)
+
+# ---- exporters ----
+class MemoryExporter:
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def by_name(self) -> Dict[str, List[Span]]:
+        out: Dict[str, List[Span]] = {}
+        with self._lock:
+            for s in self.spans:
+                out.setdefault(s.name, []).append(s)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+    def close(self) -> None:
+        pass
+
+class JsonlExporter:
+    """Appends one line per span; flushed every flush_every spans and at exit."""
+
+    def __init__(self, path: str, flush_every: int = 64):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self._f = open(path, "a", encoding="utf-8")
+        self._pending = 0
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(line + "\n")
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._f.flush()
+                self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+class OtlpExporter:
+    """
+    Sends spans to an OTLP/HTTP collector (endpoint default: OTEL_EXPORTER_OTLP_*
+    env) through the SDK's BatchSpanProcessor. export() only converts and queues
+    the span; a background thread posts batches, so a slow collector never holds
+    up a node. When the queue is full, spans are dropped instead of blocking.
+    """
+
+    def __init__(self, endpoint: Optional[str] = None, service_name: str = "membership-rag-agent",
+                 batch: int = 256):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError as e:
+            raise ImportError("AGENT_TRACE_EXPORTER=otlp needs opentelemetry-sdk and "
+                              "opentelemetry-exporter-otlp-proto-http") from e
+        exporter = OTLPSpanExporter(endpoint=endpoint) if endpoint else OTLPSpanExporter()
+        self._processor = BatchSpanProcessor(exporter, max_queue_size=max(2048, 8 * batch),
+                                             max_export_batch_size=batch)
+        self._resource = Resource.create({"service.name": service_name})
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _convert(self, span: Span) -> Any:
+        from opentelemetry.sdk.trace import ReadableSpan
+        from opentelemetry.trace import SpanContext, TraceFlags
+        from opentelemetry.trace.status import Status, StatusCode
+
+        def ctx(span_id: str) -> SpanContext:
+            return SpanContext(int(span.trace_id, 16), int(span_id, 16), is_remote=False,
+                               trace_flags=TraceFlags(TraceFlags.SAMPLED))
+        attrs = {k: v if isinstance(v, (bool, int, float, str)) else str(v) for k, v in span.attrs.items()}
+        return ReadableSpan(
+            name=span.name, context=ctx(span.span_id),
+            parent=ctx(span.parent_id) if span.parent_id else None,
+            resource=self._resource, attributes=attrs,
+            status=Status(StatusCode.ERROR, span.error) if span.error else Status(StatusCode.OK),
+            start_time=span.start_ns, end_time=span.start_ns + int(span.duration_ms * 1e6),
+        )
+
+    def export(self, span: Span) -> None:
+        if not self._closed:
+            self._processor.on_end(self._convert(span))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._processor.shutdown()          # flushes the queue, then shuts the exporter down
+
+# ---- tracer ----
+class Tracer:
+    def __init__(self, exporter: Any, sample: float = 1.0, profile_sample: float = 0.0,
+                 profile_dir: str = "data/profiles", profiler: str = "cprofile"):
+        self.exporter = exporter
+        self.sample = sample
+        self.profile_sample = profile_sample
+        self.profile_dir = profile_dir
+        self.profiler = profiler
+        self._profiling = threading.Lock()      # one active profiler per process
+
+    @classmethod
+    def from_settings(cls) -> Optional["Tracer"]:
+        """None unless AGENT_TRACE is on."""
+        from .config import get_settings
+        a = get_settings().agent
+        if not a.trace:
+            return None
+        if a.trace_exporter == "otlp":
+            exporter: Any = OtlpExporter(a.trace_otlp_endpoint)
+        else:
+            exporter = JsonlExporter(a.trace_path)
+        return cls(exporter, a.trace_sample, a.profile_sample, a.profile_dir, a.profiler)
+
+    def new_trace(self) -> Optional[str]:
+        """A trace id for a sampled turn, else None."""
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return None
+        return uuid.uuid4().hex
+
+    # ---- spans ----
+    def start(self, name: str, trace_id: Optional[str] = None, **attrs: Any) -> Optional[Span]:
+        """
+        A span under the active one, or a top-level span of trace_id (parented
+        to the turn span). None when neither is given: the turn is not traced.
+        """
+        parent = _current.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif trace_id is not None:
+            parent_id = root_span_id(trace_id)
+        else:
+            return None
+        return Span(name, trace_id, uuid.uuid4().hex[:16], parent_id, time.time_ns(), attrs=attrs,
+                    _t0=time.perf_counter())
+
+    def end(self, span: Optional[Span], error: Optional[BaseException] = None) -> None:
+        if span is None:
+            return
+        span.duration_ms = (time.perf_counter() - span._t0) * 1000.0
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        self.exporter.export(span)
+
+    @contextlib.contextmanager
+    def activate(self, span: Optional[Span]) -> Iterator[Optional[Span]]:
+        """Makes span the parent of spans (and target of annotate()) started inside."""
+        if span is None:
+            yield None
+            return
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **attrs: Any) -> Iterator[Optional[Span]]:
+        span = self.start(name, trace_id, **attrs)
+        if span is None:
+            yield None
+            return
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, e)
+            raise
+        else:
+            self.end(span)
+        finally:
+            _current.reset(token)
+
+    def record_turn(self, trace_id: str, started_s: float, **attrs: Any) -> None:
+        """The turn span, from turn start (perf_counter) to now."""
+        elapsed = time.perf_counter() - started_s
+        span = Span("turn", trace_id, root_span_id(trace_id), None, time.time_ns() - int(elapsed * 1e9),
+                    duration_ms=elapsed * 1000.0, attrs=attrs)
+        self.exporter.export(span)
+
+    # ---- profiling ----
+    def profiles(self, trace_id: str) -> bool:
+        # derived from the id, so every node of a turn agrees without extra state
+        return self.profile_sample > 0 and int(trace_id[:8], 16) / 0x100000000 < self.profile_sample
+
+    @contextlib.contextmanager
+    def profile(self, name: str, trace_id: str) -> Iterator[None]:
+        if not self._profiling.acquire(blocking=False):
+            yield                           # another node is being profiled
+            return
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{trace_id}-{name}")
+            if self.profiler == "pyinstrument":
+                from pyinstrument import Profiler
+                p = Profiler(async_mode="enabled")
+                p.start()
+                try:
+                    yield
+                finally:
+                    p.stop()
+                    with open(path + ".html", "w", encoding="utf-8") as f:
+                        f.write(p.output_html())
+            else:
+                import cProfile
+                p = cProfile.Profile()
+                p.enable()
+                try:
+                    yield
+                finally:
+                    p.disable()
+                    p.dump_stats(path + ".prof")
+        finally:
+            self._profiling.release()
+
+    def close(self) -> None:
+        self.exporter.close()
+
+# ---- client wrappers ----
+def _size(value: Any) -> int:
+    from .cache import _approx_size
+    return _approx_size(value)
+
+class TracedSearch:
+    """hybrid_semantic / ahybrid_semantic as 'search' spans (hits, response bytes, cache)."""
+
+    def __init__(self, search: Any, tracer: Tracer):
+        self.search = search
+        self.tracer = tracer
+
+    def hybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        with self.tracer.span("search.hybrid_semantic", top=top) as span:
+            resp = self.search.hybrid_semantic(query=query, top=top, select=select)
+            if span is not None:
+                span.attrs.update(hits=len(resp.get("value", [])), bytes=_size(resp))
+            return resp
+
+    async def ahybrid_semantic(self, query: str, top: int = 5, select: str | None = None) -> Dict[str, Any]:
+        with self.tracer.span("search.hybrid_semantic", top=top) as span:
+            resp = await self.search.ahybrid_semantic(query=query, top=top, select=select)
+            if span is not None:
+                span.attrs.update(hits=len(resp.get("value", [])), bytes=_size(resp))
+            return resp
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.search, name)
+
+class TracedSQL:
+    """query_columns / query_dicts (sync and async) as 'sql' spans (rows, truncation, cache)."""
+
+    def __init__(self, sql: Any, tracer: Tracer):
+        self.sql = sql
+        self.tracer = tracer
+
+    def query_columns(self, sql: str, params: Any = (), max_rows: Optional[int] = None):
+        with self.tracer.span("sql.query_columns", sql_chars=len(sql)) as span:
+            res = self.sql.query_columns(sql, params, max_rows)
+            if span is not None:
+                span.attrs.update(rows=len(res), truncated=res.truncated)
+            return res
+
+    async def aquery_columns(self, sql: str, params: Any = (), max_rows: Optional[int] = None):
+        with self.tracer.span("sql.query_columns", sql_chars=len(sql)) as span:
+            res = await self.sql.aquery_columns(sql, params, max_rows)
+            if span is not None:
+                span.attrs.update(rows=len(res), truncated=res.truncated)
+            return res
+
+    def query_dicts(self, sql: str, params: Any = ()) -> List[Dict[str, Any]]:
+        with self.tracer.span("sql.query_dicts", sql_chars=len(sql)) as span:
+            rows = self.sql.query_dicts(sql, params)
+            if span is not None:
+                span.attrs["rows"] = len(rows)
+            return rows
+
+    async def aquery_dicts(self, sql: str, params: Any = ()) -> List[Dict[str, Any]]:
+        with self.tracer.span("sql.query_dicts", sql_chars=len(sql)) as span:
+            rows = await self.sql.aquery_dicts(sql, params)
+            if span is not None:
+                span.attrs["rows"] = len(rows)
+            return rows
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sql, name)
+
+class TracedSynth:
+    """compose / stream_compose (sync and async) as 'llm' spans (prompt tokens, ttft, output size, usage)."""
+
+    def __init__(self, synth: Any, tracer: Tracer):
+        self.synth = synth
+        self.tracer = tracer
+
+    def _start(self, name: str, prompt: Any) -> Optional[Span]:
+        return self.tracer.start(name, prompt_tokens=getattr(prompt, "tokens", None))
+
+    def compose(self, *args: Any, prompt: Any = None, **kwargs: Any) -> str:
+        with self.tracer.span("llm.compose", prompt_tokens=getattr(prompt, "tokens", None)) as span:
+            out = self.synth.compose(*args, prompt=prompt, **kwargs)
+            if span is not None:
+                span.attrs["chars"] = len(out)
+            return out
+
+    async def acompose(self, *args: Any, prompt: Any = None, **kwargs: Any) -> str:
+        with self.tracer.span("llm.compose", prompt_tokens=getattr(prompt, "tokens", None)) as span:
+            out = await self.synth.acompose(*args, prompt=prompt, **kwargs)
+            if span is not None:
+                span.attrs["chars"] = len(out)
+            return out
+
+    # Streams: the span is only active while the wrapped generator runs, never
+    # across a yield, so the consumer's own spans are not parented to it.
+    def stream_compose(self, *args: Any, prompt: Any = None, **kwargs: Any) -> Iterator[str]:
+        span = self._start("llm.stream_compose", prompt)
+        it = self.synth.stream_compose(*args, prompt=prompt, **kwargs)
+        chunks, chars, err = 0, 0, None
+        try:
+            while True:
+                with self.tracer.activate(span):
+                    try:
+                        token = next(it)
+                    except StopIteration:
+                        break
+                if span is not None and chunks == 0:
+                    span.attrs["ttft_ms"] = round((time.perf_counter() - span._t0) * 1000.0, 3)
+                chunks, chars = chunks + 1, chars + len(token)
+                yield token
+        except GeneratorExit:
+            raise                           # consumer stopped early: not an error
+        except BaseException as e:
+            err = e
+            raise
+        finally:
+            if span is not None:
+                span.attrs.update(chunks=chunks, chars=chars)
+            self.tracer.end(span, err)
+
+    async def astream_compose(self, *args: Any, prompt: Any = None, **kwargs: Any) -> AsyncIterator[str]:
+        span = self._start("llm.stream_compose", prompt)
+        it = self.synth.astream_compose(*args, prompt=prompt, **kwargs)
+        chunks, chars, err = 0, 0, None
+        try:
+            while True:
+                with self.tracer.activate(span):
+                    try:
+                        token = await it.__anext__()
+                    except StopAsyncIteration:
+                        break
+                if span is not None and chunks == 0:
+                    span.attrs["ttft_ms"] = round((time.perf_counter() - span._t0) * 1000.0, 3)
+                chunks, chars = chunks + 1, chars + len(token)
+                yield token
+        except GeneratorExit:
+            raise                           # consumer stopped early: not an error
+        except BaseException as e:
+            err = e
+            raise
+        finally:
+            if span is not None:
+                span.attrs.update(chunks=chunks, chars=chars)
+            self.tracer.end(span, err)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.synth, name)
+
+def traced(obj: Any, wrapper: Callable[[Any, Tracer], Any], tracer: Optional[Tracer]) -> Any:
+    """obj wrapped for tracing, or obj itself when tracing is off (idempotent)."""
+    if tracer is None or isinstance(obj, wrapper):     # type: ignore[arg-type]
+        return obj
+    return wrapper(obj, tracer)
@@ -1,17 +1,30 @@
  # CLI to test queries
 
 from __future__ import annotations
-from rag_agent.graph import build_graph
+import uuid
+from rag_agent.graph import get_graph
 
 if __name__ == "__main__":
-    graph = build_graph()
+    graph = get_graph()
+    session_id = uuid.uuid4().hex     # one conversation per run: follow-ups like "and by gender?" work
     print("LangGraph Agent. Ctrl+C to exit.")
     while True:
         try:
             q = input("\n> ")
-            state = {"user_query": q}
-            out = graph.invoke(state)
-            print("\n" + out.get("answer", "(no answer)"))
+            state = {"user_query": q, "session_id": session_id}
+            print()
+            out = {}
+            # print answer tokens as the synthesizer produces them
+            for mode, chunk in graph.stream(state, stream_mode=["custom", "values"]):
+                if mode == "custom" and "token" in chunk:
+                    print(chunk["token"], end="", flush=True)
+                elif mode == "values":
+                    out = chunk
+            if not out.get("answer"):
+                print("(no answer)", end="")
+            print(f"\n\n[first token {out.get('ttft_ms', 0):.0f} ms, total {out.get('total_ms', 0):.0f} ms, "
+                  f"prompt {out.get('prompt_tokens', 0)} tokens"
+                  f"{', follow-up' if out.get('follow_up') else ''}]")
         except KeyboardInterrupt:
             print("\nbye")
             break